@@ -0,0 +1,50 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from framing import LineFramer
+
+#The framer has to keep up with raids, so anything below this is a failure.
+MIN_LINES_PER_SECOND = 10000
+
+#Builds a stream of chat lines, some with multi-byte characters, and cuts it into reads of random size.
+def make_chunks(line_count, seed=0):
+    rng = random.Random(seed)
+    texts = ['hello chat', 'PogChamp PogChamp', 'héllo wörld', 'こんにちは', 'gg 🎉🎉', '$query_get_stats']
+    lines = []
+    for number in range(line_count):
+        user = f'viewer{number % 5000}'
+        lines.append(f':{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #channel :{rng.choice(texts)} {number}')
+    data = ('\r\n'.join(lines) + '\r\n').encode()
+    chunks = []
+    start = 0
+    while start < len(data):
+        size = rng.randint(1, 4096)
+        chunks.append(data[start:start + size])
+        start += size
+    return lines, chunks
+
+#Feeds every chunk through a framer, checks the output, and returns the lines per second.
+def run(line_count=200000):
+    lines, chunks = make_chunks(line_count)
+    framer = LineFramer()
+    output = []
+    start = time.perf_counter()
+    for chunk in chunks:
+        output.extend(framer.feed(chunk))
+    elapsed = time.perf_counter() - start
+    if output != lines:
+        raise AssertionError('Framer output does not match the input lines.')
+    return line_count / elapsed
+
+def main():
+    lines_per_second = run()
+    print(f'framing: {lines_per_second:,.0f} lines/sec')
+    if lines_per_second < MIN_LINES_PER_SECOND:
+        print(f'framing: below the {MIN_LINES_PER_SECOND:,} lines/sec target')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import redirect_stdout
+
+#The replay bench sets up the config, the working folder, and the in-memory backend, so this bench uses its helpers.
+from bench_replay import ROOT, make_bot, close_backend, privmsg_flood, percentile, get_commit
+import transport
+from transport import IrcTransport
+
+RESULTS_FILE = os.path.join(ROOT, 'benchmarks', 'results', 'keepalive.jsonl')
+
+#A fake socket writer. Records when each PONG is written.
+class FakeWriter:
+    def __init__(self):
+        self.pongs = []
+        self.lines = 0
+
+    def write(self, data):
+        self.lines += 1
+        if data.startswith(b'PONG'):
+            self.pongs.append(time.perf_counter())
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+#Makes a real IrcTransport that reads from a StreamReader the bench feeds, and writes to a FakeWriter. Must be called from the event loop.
+def make_transport():
+    irc = IrcTransport('bench', 0)
+    irc.loop = asyncio.get_running_loop()
+    irc.loop_thread = threading.get_ident()
+    irc.reader = asyncio.StreamReader()
+    irc.writer = FakeWriter()
+    irc.incoming = asyncio.Queue()
+    irc.control = asyncio.Queue()
+    irc.outgoing = asyncio.PriorityQueue()
+    irc.is_open = True
+    return irc
+
+#Builds a flood of commands with a PING every interval lines.
+def make_lines(count, interval):
+    lines = privmsg_flood(count, command_share=0.8, seed=5)
+    for index in range(len(lines) - 1, 0, -interval):
+        lines.insert(index, 'PING :tmi.twitch.tv')
+    return lines
+
+#Feeds the lines to the bot's real read loop in 4 KB reads, and returns how long each PING waited for its PONG to be written.
+async def replay(bot, lines):
+    bot.transport = make_transport()
+    loops = [asyncio.create_task(coroutine) for coroutine in (
+        bot.transport.read_loop(),
+        bot.transport.write_loop(),
+        bot.loop_for_control(),
+        bot.dispatcher.run(),
+        bot.loop_for_messages(),
+        bot.onboarder.run(),
+    )]
+    data = ('\r\n'.join(lines) + '\r\n').encode()
+    pings = []
+    start = time.perf_counter()
+    for offset in range(0, len(data), 4096):
+        chunk = data[offset:offset + 4096]
+        now = time.perf_counter()
+        pings.extend([now] * chunk.count(b'PING :'))
+        bot.transport.reader.feed_data(chunk)
+        await asyncio.sleep(0)
+    while len(bot.transport.writer.pongs) < len(pings) or bot.transport.incoming.qsize() or bot.dispatcher.get_pending():
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    for task in loops:
+        task.cancel()
+    await asyncio.gather(*loops, return_exceptions=True)
+    return [pong - ping for ping, pong in zip(pings, bot.transport.writer.pongs)], elapsed
+
+#Runs the flood once with PING on the control queue, and once with PING read through the chat queue as it was before the control lane.
+def run(lines, latency_ms, lane):
+    control_commands = transport.CONTROL_COMMANDS
+    if not lane:
+        transport.CONTROL_COMMANDS = control_commands - {b'PING'}
+    try:
+        bot = make_bot(latency_ms)
+        with redirect_stdout(io.StringIO()):
+            latencies, elapsed = asyncio.run(replay(bot, lines))
+        close_backend(bot)
+    finally:
+        transport.CONTROL_COMMANDS = control_commands
+    return {
+        'mode': 'control_lane' if lane else 'chat_queue',
+        'lines': len(lines),
+        'pings': len(latencies),
+        'messages_per_second': len(lines) / elapsed,
+        'pong_p50_ms': percentile(latencies, 0.5),
+        'pong_p99_ms': percentile(latencies, 0.99),
+        'pong_max_ms': max(latencies) * 1000 if latencies else 0.0,
+        'backend_latency_ms': latency_ms,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Floods the bot with commands and PINGs and reports how long each PONG takes to be written.')
+    parser.add_argument('--size', type=int, default=5000, help='Number of chat lines in the flood.')
+    parser.add_argument('--interval', type=int, default=250, help='Number of chat lines between PINGs.')
+    parser.add_argument('--latency-ms', type=float, default=5, help='Latency added to every in-memory backend transaction.')
+    parser.add_argument('--no-store', action='store_true', help=f'Do not add the results to {RESULTS_FILE}.')
+    args = parser.parse_args()
+
+    lines = make_lines(args.size, args.interval)
+    commit = get_commit()
+    results = []
+    for lane in (True, False):
+        result = run(lines, args.latency_ms, lane)
+        result.update({'commit': commit, 'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')})
+        results.append(result)
+        print(f"{result['mode']}: {result['lines']} lines, {result['pings']} PINGs, {result['messages_per_second']:,.0f} msgs/sec, PONG p50 {result['pong_p50_ms']:.2f} ms, p99 {result['pong_p99_ms']:.2f} ms, max {result['pong_max_ms']:.2f} ms")
+    if not args.no_store:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, 'a') as file:
+            for result in results:
+                file.write(json.dumps(result) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from irc_parser import parse_message
+
+COMMAND_PREFIX = '$'
+
+#The string based parser that Bot.parse_message used before irc_parser. Kept here to compare against.
+def remove_prefix(string, prefix):
+    if not string.startswith(prefix):
+        return string
+    else:
+        return string[len(prefix):]
+
+def legacy_get_user_from_prefix(prefix):
+    domain = prefix.split('!')[0]
+    if domain.endswith('.tmi.twitch.tv'):
+        return domain.replace('.tmi.twitch.tv', '')
+    if '.tmi.twitch.tv' not in domain:
+        return domain
+
+def legacy_parse_message(received_msg):
+    parts = received_msg.split(' ')
+    prefix = None
+    user = None
+    channel = None
+    text = None
+    text_command = None
+    text_args = None
+    if parts[0].startswith(':'):
+        prefix = remove_prefix(parts[0], ':')
+        user = legacy_get_user_from_prefix(prefix)
+        parts = parts[1:]
+    text_start = next(
+        (idx for idx, part in enumerate(parts) if part.startswith(':')),
+        None
+    )
+    if text_start is not None:
+        text_parts = parts[text_start:]
+        text_parts[0] = text_parts[0][1:]
+        text = ' '.join(text_parts)
+        if text_parts[0].startswith(COMMAND_PREFIX):
+            text_command = remove_prefix(text_parts[0], COMMAND_PREFIX)
+            text_args = text_parts[1:]
+        parts = parts[:text_start]
+    irc_command = parts[0]
+    irc_args = parts[1:]
+    hash_start = next(
+        (idx for idx, part in enumerate(irc_args) if part.startswith('#')),
+        None
+    )
+    if hash_start is not None:
+        channel = irc_args[hash_start][1:]
+    return (prefix, user, channel, irc_command, irc_args, text, text_command, text_args)
+
+#Untagged lines that both parsers understand.
+LINES = [
+    ':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :hello chat how is everyone doing',
+    ':viewer2!viewer2@viewer2.tmi.twitch.tv PRIVMSG #channel :$query_get_stats viewer1',
+    ':viewer3!viewer3@viewer3.tmi.twitch.tv JOIN #channel',
+    ':viewer4!viewer4@viewer4.tmi.twitch.tv PART #channel',
+    'PING :tmi.twitch.tv',
+    ':tmi.twitch.tv 001 bot :Welcome, GLHF!',
+]
+
+#A tagged line, as twitch sends it once twitch.tv/tags is requested. Only the new parser can read these.
+TAGGED_LINE = '@badge-info=;badges=moderator/1,subscriber/12;color=#1E90FF;display-name=Viewer1;emotes=25:0-4;id=b34ccfc7-4977-403a-8a94-33c6bac34fb8;mod=1;user-id=1337;user-type=mod :viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :Kappa $gamble 50'
+
+#Checks that the new parser gives the same fields as the legacy parser.
+def check():
+    for line in LINES:
+        message = parse_message(line.encode(), COMMAND_PREFIX)
+        new = (message.prefix, message.user, message.channel, message.irc_command, message.irc_args, message.text, message.text_command, message.text_args)
+        if new != legacy_parse_message(line):
+            raise AssertionError(f'Parsers disagree on: {line}')
+    message = parse_message(TAGGED_LINE.encode(), COMMAND_PREFIX)
+    if message.user_id != '1337' or message.badges != {'moderator': '1', 'subscriber': '12'} or message.emotes != {'25': [(0, 4)]}:
+        raise AssertionError('Tags were not parsed.')
+
+#Times a parser over the given lines and returns messages per second.
+def time_parser(parser, lines, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line in lines:
+            parser(line)
+    return rounds * len(lines) / (time.perf_counter() - start)
+
+def main(rounds=20000):
+    check()
+    byte_lines = [line.encode() for line in LINES]
+    legacy = time_parser(legacy_parse_message, LINES, rounds)
+    new = time_parser(lambda line: parse_message(line, COMMAND_PREFIX), byte_lines, rounds)
+    tagged_line = TAGGED_LINE.encode()
+    #The same PRIVMSG without its tags, so the cost of the tag section can be seen on its own.
+    untagged = time_parser(lambda line: parse_message(line, COMMAND_PREFIX), [tagged_line.split(b' ', 1)[1]], rounds)
+    tagged = time_parser(lambda line: parse_message(line, COMMAND_PREFIX), [tagged_line], rounds)
+    print(f'legacy parser: {legacy:,.0f} messages/sec')
+    print(f'irc_parser: {new:,.0f} messages/sec ({new / legacy:.2f}x)')
+    print(f'irc_parser PRIVMSG without tags: {untagged:,.0f} messages/sec')
+    print(f'irc_parser same PRIVMSG with tags: {tagged:,.0f} messages/sec ({tagged / untagged:.2f}x)')
+
+if __name__ == '__main__':
+    main()
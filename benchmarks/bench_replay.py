@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#The bench serves one busy channel and two quiet ones, to show whether the busy one slows the others down.
+CHANNELS = ['benchstreamer', 'quietstreamer1', 'quietstreamer2']
+
+#The bench never uses the real config.py, so it cannot connect to a real chat or database by accident. Queries run on the in-memory backend.
+BENCH_CONFIG = {
+    'OAUTH_TOKEN': 'oauth:bench',
+    'USERNAME': 'benchbot',
+    'CHANNEL': CHANNELS[0],
+    'CHANNELS': CHANNELS,
+    'DB': 'neo4j://localhost:7687',
+    'DB_USER': 'bench',
+    'DB_PASS': 'bench',
+    'QUERY_BACKEND': 'memory',
+    'JOKES_FILE': os.path.join(ROOT, 'Other', 'Random_Texts', 'jokes.txt'),
+    'EIGHT_BALL_FILE': os.path.join(ROOT, 'Other', 'Random_Texts', '8ball.txt'),
+    'LOG_LEVELS': {name: 'WARNING' for name in ('botfunctions', 'commands', 'queries', 'viewer', 'streamer', 'games')},
+}
+sys.modules['config'] = types.SimpleNamespace(**BENCH_CONFIG)
+
+#The bot writes its logs and state relative to the working folder, so the bench runs in a temporary one.
+WORK_DIR = tempfile.mkdtemp(prefix='chatbot-bench-')
+os.chdir(WORK_DIR)
+os.makedirs('Chatbot\\logs\\', exist_ok=True)
+
+import chat4j_queries
+import memory_queries
+from chatbot import Bot
+from irc_parser import parse_message
+
+RESULTS_FILE = os.path.join(ROOT, 'benchmarks', 'results', 'replay.jsonl')
+CHANNEL = BENCH_CONFIG['CHANNEL']
+COMMANDS = ['boop {other}', 'so {other}', 'headpat {other}', 'joke', '8ball will this be fast?', 'query_get_stats', 'query_get_friends', 'query_countleader', 'query_get_genres', 'help']
+
+#A fake socket. Lines the bot sends straight away, such as PONG, are counted instead of sent.
+class FakeTransport:
+    def __init__(self):
+        self.sent = 0
+        self.incoming = asyncio.Queue()
+
+    def send(self, line):
+        self.sent += 1
+
+    def send_priority(self, line):
+        self.sent += 1
+
+    async def close(self):
+        pass
+
+#Takes chat messages in place of the rate limited scheduler, so the bench measures the bot and not twitch's limits.
+class FakeScheduler:
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, channel, line):
+        self.submitted += 1
+        return True
+
+def privmsg(user, text, channel=None):
+    return f':{user}!{user}@{user}.tmi.twitch.tv PRIVMSG #{channel or CHANNEL} :{text}'
+
+#Builds a transcript of chat from the given number of users, a mix of chatter and commands.
+def privmsg_flood(count, users=200, command_share=0.3, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for index in range(count):
+        user = f'viewer{rng.randrange(users)}'
+        if rng.random() < command_share:
+            text = '$' + rng.choice(COMMANDS).format(other=f'viewer{rng.randrange(users)}')
+        else:
+            text = f'hello chat message number {index} PogChamp'
+        lines.append(privmsg(user, text))
+    return lines
+
+#Builds a flood in the busy channel with a little chat in the quiet ones, to see how long the quiet channels wait.
+def hot_channel(count, quiet_share=0.05, seed=4):
+    rng = random.Random(seed)
+    lines = privmsg_flood(count, seed=seed)
+    for index in range(len(lines) - 1, 0, -int(1 / quiet_share)):
+        user = f'viewer{rng.randrange(200)}'
+        lines.insert(index, privmsg(user, '$' + rng.choice(COMMANDS).format(other=user), rng.choice(CHANNELS[1:])))
+    return lines
+
+#Builds a raid: a burst of JOINs from new viewers, each followed now and then by a first message.
+def join_raid(count, seed=2):
+    rng = random.Random(seed)
+    lines = []
+    for index in range(count):
+        user = f'raider{index}'
+        lines.append(f':{user}!{user}@{user}.tmi.twitch.tv JOIN #{CHANNEL}')
+        if rng.random() < 0.2:
+            lines.append(privmsg(user, 'hype! raid incoming'))
+    return lines
+
+#Builds chat with a PING every interval lines, to show whether keepalives wait behind chat.
+def ping_interleave(count, interval=50):
+    lines = privmsg_flood(count, seed=3)
+    for index in range(len(lines) - 1, 0, -interval):
+        lines.insert(index, 'PING :tmi.twitch.tv')
+    return lines
+
+#Reads a recorded transcript, one raw IRC line per line.
+def read_transcript(path):
+    with open(path, 'rb') as file:
+        return [line.rstrip(b'\r\n').decode('utf-8', errors='replace') for line in file if line.strip()]
+
+SCENARIOS = {
+    'privmsg_flood': lambda size: privmsg_flood(size),
+    'join_raid': lambda size: join_raid(size // 4),
+    'ping_interleave': lambda size: ping_interleave(size),
+    'hot_channel': lambda size: hot_channel(size),
+}
+
+#Fills the in-memory graph with the streamers, the chatters in the synthetic scenarios, and some genres they like, as in a channel the bot has been in before.
+def seed_graph(graph, known_users=200):
+    genres = ['Action', 'Puzzle', 'Racing', 'Horror', 'Strategy']
+    viewers = [f'viewer{index}' for index in range(known_users)]
+    graph.clear()
+    graph.load({
+        'people': {username: {'created_on': '2024-01-01', 'query_count': 1} for username in CHANNELS + viewers},
+        'genres': genres,
+        'views': [[username, channel, 100] for channel in CHANNELS for username in viewers],
+        'friends': [[viewers[index], viewers[(index + 1) % known_users]] for index in range(0, known_users, 2)],
+        'likes': [[username, genres[index % len(genres)]] for index, username in enumerate(viewers)],
+    })
+
+#Makes a Bot that talks to the fake socket and the in-memory backend, with every transaction waiting latency_ms.
+def make_bot(latency_ms):
+    driver = memory_queries.get_memory_driver()
+    seed_graph(driver.graph)
+    driver.set_latency(latency_ms)
+    driver.transactions = 0
+    chat4j_queries.query_cache.clear()
+    bot = Bot()
+    bot.init_driver()
+    bot.init_state()
+    bot.users = bot.QueryDriver.Run_all_user()
+    for name, channel in bot.channel_contexts.items():
+        channel.viewers = bot.QueryDriver.Run_get_viewers(name)
+    bot.transport = FakeTransport()
+    bot.scheduler = FakeScheduler()
+    return bot
+
+#Writes the queued writes and points changes, and stops the state store, so the next run starts clean.
+def close_backend(bot):
+    chat4j_queries.close_write_batcher()
+    chat4j_queries.close_points_ledger()
+    bot.close_channels()
+
+#Replays the lines through handle_message the way the bot's read loop does, and returns the handling latency of each line, in the same order as the lines.
+async def replay(bot, lines):
+    latencies = [0.0] * len(lines)
+    onboarder = asyncio.create_task(bot.onboarder.run())
+
+    async def handle(index, line, queued_at):
+        await bot.handle_message(line)
+        latencies[index] = time.perf_counter() - queued_at
+
+    tasks = []
+    for index, line in enumerate(lines):
+        tasks.append(asyncio.create_task(handle(index, line, time.perf_counter())))
+        #Let the handlers run between reads, as they would between socket reads.
+        if index % 64 == 63:
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    #Let the last JOIN batch finish.
+    while bot.onboarder.get_pending():
+        await asyncio.sleep(bot.onboarder.window)
+    onboarder.cancel()
+    return latencies
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000 if ordered else 0.0
+
+#Runs one scenario: a parse only pass, a timed pass, and a pass under tracemalloc for peak memory.
+def run_scenario(name, lines, latency_ms):
+    start = time.perf_counter()
+    channels = [parse_message(line, '$').channel for line in lines]
+    parse_rate = len(lines) / (time.perf_counter() - start)
+
+    bot = make_bot(latency_ms)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        latencies = asyncio.run(replay(bot, lines))
+    elapsed = time.perf_counter() - start
+    close_backend(bot)
+    transactions = memory_queries.get_memory_driver().transactions
+
+    tracemalloc.start()
+    memory_bot = make_bot(latency_ms)
+    tracemalloc.reset_peak()
+    with redirect_stdout(io.StringIO()):
+        asyncio.run(replay(memory_bot, lines))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    close_backend(memory_bot)
+
+    return {
+        'scenario': name,
+        'lines': len(lines),
+        'parse_per_second': parse_rate,
+        'messages_per_second': len(lines) / elapsed,
+        'p50_ms': percentile(latencies, 0.5),
+        'p99_ms': percentile(latencies, 0.99),
+        'quiet_channel_p99_ms': percentile([latency for latency, channel in zip(latencies, channels) if channel in CHANNELS[1:]], 0.99),
+        'peak_memory_kb': peak / 1024,
+        'backend_transactions': transactions,
+        'replies': bot.scheduler.submitted + bot.transport.sent,
+        'backend_latency_ms': latency_ms,
+    }
+
+#Gets the commit being measured, if the bench is run from a git checkout.
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+#Gets the last stored result for each scenario, to compare against.
+def read_previous():
+    previous = {}
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as file:
+            for line in file:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                previous[(result['scenario'], result['lines'], result['backend_latency_ms'])] = result
+    return previous
+
+def store(results):
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, 'a') as file:
+        for result in results:
+            file.write(json.dumps(result) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays chat through Bot.handle_message and reports throughput, latency, and memory.')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append', help='Scenario to run. Can be given more than once. Defaults to all of them.')
+    parser.add_argument('--transcript', help='A recorded transcript to replay, one raw IRC line per line.')
+    parser.add_argument('--size', type=int, default=5000, help='Number of lines in each synthetic scenario.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency added to every in-memory backend transaction.')
+    parser.add_argument('--no-store', action='store_true', help=f'Do not add the results to {RESULTS_FILE}.')
+    args = parser.parse_args()
+
+    runs = []
+    if args.transcript:
+        runs.append((os.path.basename(args.transcript), read_transcript(args.transcript)))
+    for name in args.scenario or ([] if args.transcript else sorted(SCENARIOS)):
+        runs.append((name, SCENARIOS[name](args.size)))
+
+    previous = read_previous()
+    commit = get_commit()
+    results = []
+    for name, lines in runs:
+        result = run_scenario(name, lines, args.latency_ms)
+        result.update({'commit': commit, 'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')})
+        results.append(result)
+        line = f"{name}: {result['lines']} lines, {result['messages_per_second']:,.0f} msgs/sec, p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, peak {result['peak_memory_kb']:,.0f} KB, parse {result['parse_per_second']:,.0f} lines/sec"
+        if result['quiet_channel_p99_ms']:
+            line += f", quiet channels p99 {result['quiet_channel_p99_ms']:.2f} ms"
+        before = previous.get((name, result['lines'], result['backend_latency_ms']))
+        if before is not None:
+            change = (result['messages_per_second'] / before['messages_per_second'] - 1) * 100
+            line += f" ({change:+.1f}% msgs/sec vs {before.get('commit') or 'last run'})"
+        print(line)
+    if not args.no_store:
+        store(results)
+
+if __name__ == '__main__':
+    main()
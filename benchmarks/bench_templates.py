@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from irc_parser import parse_message
+from templates import compile_template
+
+#The default template commands from Streamer.state_schema.
+TEMPLATES = {
+    'boop': "{message.user} boops {message.text_args[0]}'s snoot!",
+    'so': "Check out {message.text_args[0]}'s stream! Here's a link: https://www.twitch.tv/{message.text_args[0]}",
+    'pizza': "{message.user} will be getting a pizza in the mail in a few years.",
+    'headpat': "{message.user} gives {message.text_args[0]} headpats!",
+}
+
+MESSAGE = parse_message(b':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :$boop viewer2', '$')
+
+#Checks that the compiled plans render the same text as str.format.
+def check():
+    for template in TEMPLATES.values():
+        if compile_template(template).render(MESSAGE) != template.format(message=MESSAGE):
+            raise AssertionError(f'Render differs for: {template}')
+
+#Times a render function over every template and returns renders per second.
+def time_render(render, templates, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for template in templates:
+            render(template)
+    return rounds * len(templates) / (time.perf_counter() - start)
+
+#One run is easily thrown off by other work on the machine, so each side is timed several times and the best run is kept.
+def main(rounds=50000, repeats=5):
+    check()
+    plans = [compile_template(template) for template in TEMPLATES.values()]
+    legacy = max(time_render(lambda template: template.format(**{'message': MESSAGE}), list(TEMPLATES.values()), rounds) for _ in range(repeats))
+    compiled = max(time_render(lambda plan: plan.render(MESSAGE), plans, rounds) for _ in range(repeats))
+    print(f'str.format: {legacy:,.0f} renders/sec')
+    print(f'compiled plans: {compiled:,.0f} renders/sec ({compiled / legacy:.2f}x)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import config
+from log import bot_function_logger
+from streamer import Streamer
+from registry import ViewerRegistry
+from templates import TemplateError, compile_template
+from state_store import StateStore
+
+#Everything the bot keeps for one channel: the Streamer, its state file and template commands, its known viewers, and its Viewer records.
+#Each channel also has its own limit on how many of its messages are handled at once, so a busy channel cannot take every worker thread from the others.
+class Channel:
+    def __init__(self, name, max_concurrency=8):
+        self.logger = bot_function_logger
+        self.name = name
+        self.streamer = Streamer(name)
+        self.viewers = []
+        self.viewer_registry = ViewerRegistry(
+            max_viewers=getattr(config, 'VIEWER_REGISTRY_MAX_VIEWERS', 5000),
+            max_bytes=getattr(config, 'VIEWER_REGISTRY_MAX_BYTES', 16 * 1024 * 1024),
+            ttl_seconds=getattr(config, 'VIEWER_REGISTRY_TTL', 3600),
+        )
+        self.template_plans = {}
+        self.state_store = None
+        self.slots = asyncio.Semaphore(max_concurrency)
+
+    #Ensures the streamer has the required schema in a .JSON file with their twitch name.
+    def ensure_state_schema(self):
+        self.logger.info('Ensuring schema is set for %s.', self.name)
+        is_dirty = False
+        if self.streamer.state_schema == {}:
+            self.logger.info('Schema ensured.')
+            return is_dirty
+        for key in self.streamer.state_schema:
+            if key not in self.streamer.state:
+                self.logger.warning('%s not in state for %s. Setting is_dirty to true.', key, self.name)
+                is_dirty = True
+                self.streamer.state[key] = self.streamer.state_schema[key]
+        if is_dirty == True:
+            self.logger.warning('Schema is not set or improperly set for %s.', self.name)
+        self.logger.debug('%s', is_dirty)
+        return is_dirty
+
+    #Reads the .JSON file for the streamer. Creates it if it does not exist.
+    def read_state(self):
+        if self.state_store is None:
+            self.state_store = StateStore(
+                self.streamer.state_filename,
+                self.reload_state,
+                debounce_ms=getattr(config, 'STATE_SAVE_DELAY_MS', 500),
+                watch_interval_ms=getattr(config, 'STATE_WATCH_INTERVAL_MS', 1000),
+            )
+        self.streamer.state = self.state_store.load()
+        self.logger.debug('%s', self.streamer.state)
+        is_dirty = self.ensure_state_schema()
+        if is_dirty == True:
+            self.logger.warning('Schema improperly set. Overwriting.')
+            self.write_state()
+        self.compile_templates()
+
+    #Uses a state file that was edited while the bot was running. Called from the state store's thread.
+    def reload_state(self, state):
+        self.streamer.state = state
+        if self.ensure_state_schema() == True:
+            self.write_state()
+        self.compile_templates()
+        self.logger.info('State reloaded for %s.', self.name)
+
+    #Compiles every template command in the state. Templates that cannot be compiled are logged and left out, so they cannot be used until they are fixed.
+    def compile_templates(self):
+        template_plans = {}
+        for command_name, template in self.streamer.state['template_commands'].items():
+            try:
+                template_plans[command_name] = compile_template(template)
+            except TemplateError as e:
+                self.logger.error('Template command %s in %s could not be compiled: %s', command_name, self.name, e)
+        #Swap the plans in all at once, since messages may be handled while a reloaded state is compiled.
+        self.template_plans = template_plans
+        self.logger.info('Compiled %s template commands for %s.', len(self.template_plans), self.name)
+
+    #Saves the streamer's state. The write is debounced and done by the state store's thread, so it never blocks the caller.
+    def write_state(self):
+        self.state_store.save(self.streamer.state)
+        self.logger.info('State saved for %s.', self.name)
+
+    #Reads the state and starts watching the state file.
+    def init_state(self):
+        self.read_state()
+        self.state_store.start()
+
+    #Writes any pending state and stops watching the state file.
+    def close(self):
+        if self.state_store is not None:
+            self.state_store.close()
@@ -0,0 +1,288 @@
+from log import query_logger
+from chat4j_queries import QUERY_BACKEND, QUERY_BACKENDS, POOL_SETTINGS, async_pool_metrics, get_write_batcher, query_cache, invalidate_cache
+from contextlib import asynccontextmanager
+from metrics import instrument_class
+import cypher
+import threading
+import time
+import config
+
+#The async driver shared by every AsyncBotQueries object. It is created the first time it is used, inside the running event loop.
+shared_async_driver = None
+#Makes sure only one async driver is created, even when the first handlers start at the same time.
+async_driver_lock = threading.Lock()
+
+#Gets the shared async driver, creating it the first time it is needed.
+async def get_async_driver():
+    global shared_async_driver
+    created = False
+    with async_driver_lock:
+        if shared_async_driver is None:
+            #Imported here, so the memory backend runs without the neo4j package.
+            from neo4j import AsyncGraphDatabase
+            shared_async_driver = AsyncGraphDatabase.driver(config.DB, auth=(config.DB_USER, config.DB_PASS), **POOL_SETTINGS)
+            async_pool_metrics.set_pool_size(POOL_SETTINGS['max_connection_pool_size'])
+            created = True
+        driver = shared_async_driver
+    #The connection is checked outside the lock, since awaiting while holding it would block the loop.
+    if created:
+        try:
+            await driver.verify_connectivity()
+            query_logger.info("Shared Async Driver Initialized. Pool settings: %s", POOL_SETTINGS)
+        except Exception as e:
+            query_logger.critical(e)
+    return driver
+
+#Closes the shared async driver and its connection pool.
+async def close_async_driver():
+    global shared_async_driver
+    with async_driver_lock:
+        driver = shared_async_driver
+        shared_async_driver = None
+        async_pool_metrics.set_pool_size(0)
+    if driver is not None:
+        await driver.close()
+        query_logger.info('Shared Async Driver closed.')
+
+#Gets an AsyncBotQueries object for the backend set in QUERY_BACKEND.
+def create_async_queries():
+    if QUERY_BACKEND not in QUERY_BACKENDS:
+        raise ValueError(f'Unknown QUERY_BACKEND {QUERY_BACKEND}. Use one of: {QUERY_BACKENDS}')
+    if QUERY_BACKEND == 'memory':
+        from memory_queries import AsyncMemoryBotQueries
+        return AsyncMemoryBotQueries()
+    return AsyncBotQueries()
+
+#Async version of BotQueries, for command handlers running on the event loop. It has the same Query and Run functions, and each one is awaited instead of blocking the loop.
+class AsyncBotQueries:
+    #Opens a session on the shared async driver and records its use in the async pool's metrics.
+    @asynccontextmanager
+    async def open_session(self):
+        driver = await get_async_driver()
+        async_pool_metrics.opened()
+        start = time.perf_counter()
+        failed = False
+        try:
+            async with driver.session() as session:
+                yield session
+        except Exception:
+            failed = True
+            raise
+        finally:
+            async_pool_metrics.closed(time.perf_counter() - start, failed)
+
+    #Runs a query in a transaction, and reads its records with the reader if there is one. Returns False if the query fails.
+    async def run_query(self, tx, query, reader=None, **parameters):
+        query_logger.debug('Running query: %s', query)
+        try:
+            result = await tx.run(query, **parameters)
+            if reader is None:
+                return None
+            value = reader([record async for record in result])
+            query_logger.info('%s', value)
+            return value
+        except Exception as e:
+            query_logger.error(e)
+            query_logger.debug('Arguments used: %s', parameters)
+            return False
+
+    #Runs a read only query function in its own session. Returns None if it fails.
+    async def read(self, function, *args):
+        query_logger.info('Command Received. Arguments: %s', args)
+        async with self.open_session() as session:
+            try:
+                result = await session.execute_read(function, *args)
+                #If query fails, raise an error.
+                if result == False:
+                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
+                return result
+            except Exception as e:
+                query_logger.error(e)
+                query_logger.debug('Arguments used: %s', args)
+
+    #Runs a read only query function, or gets its result from the read cache.
+    async def read_cached(self, name, function, *args):
+        hit, result = query_cache.lookup(name, *args)
+        if hit:
+            return result
+        result = await self.read(function, *args)
+        if result is not None:
+            query_cache.store(name, args, result)
+        return result
+
+    #Runs a write query function in its own session, then drops the cached reads it changes. Returns False if it fails.
+    async def write(self, function, *args, invalidates=None):
+        query_logger.info('Command Received. Arguments: %s', args)
+        async with self.open_session() as session:
+            try:
+                result = await session.execute_write(function, *args)
+                #If query fails, raise an error.
+                if result == False:
+                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
+                if invalidates is not None:
+                    invalidate_cache(invalidates)
+            except Exception as e:
+                query_logger.error(e)
+                query_logger.debug('Arguments used: %s', args)
+                return False
+
+
+    #Query functions,to be used by the run functions. They define the transaction used for the run function.
+    #Remove a user's node and all relationships.
+    async def Query_remove_user(self, tx, username):
+        return await self.run_query(tx, cypher.REMOVE_USER, username=username)
+
+    #Adds a user to the database.
+    async def Query_add_user(self, tx, username):
+        return await self.run_query(tx, cypher.ADD_USER, username=username)
+
+    #Adds a friendship between two users.
+    async def Query_add_friendship(self, tx, username1, username2):
+        return await self.run_query(tx, cypher.ADD_FRIENDSHIP, p1name=username1, p2name=username2)
+
+    #Gets all users that the sending user is friends with.
+    async def Query_get_friends(self, tx, username):
+        return await self.run_query(tx, cypher.GET_FRIENDS, cypher.read_friends, username=username)
+
+    #Gets all users currently in the database. (This specifically grabs all nodes with the :Person label)
+    async def Query_all_user(self, tx):
+        return await self.run_query(tx, cypher.ALL_USER, lambda records: cypher.read_usernames(records, 'p'))
+
+    #Gets the personal statistics of the user who sent the command. The streamer has no points in their own channel.
+    async def Query_get_stats(self, tx, username, streamer):
+        if streamer == username:
+            query_logger.info('%s is the streamer.', username)
+            return await self.run_query(tx, cypher.GET_STREAMER_STATS, cypher.read_stats, username=username)
+        return await self.run_query(tx, cypher.GET_VIEWER_STATS, cypher.read_stats, username=username, streamer=streamer)
+
+    #Increase the user's query_count property by 1.
+    async def Query_increase_query_count(self, tx, username):
+        return await self.run_query(tx, cypher.INCREASE_QUERY_COUNT, username=username)
+
+    #Gets all genres.
+    async def Query_get_genres(self, tx):
+        return await self.run_query(tx, cypher.GET_GENRES, cypher.read_genres)
+
+    #Sets a :LIKES_GENRE relationship from the user to the genre.
+    async def Query_set_likes_genre(self, tx, username, genre):
+        return await self.run_query(tx, cypher.SET_LIKES_GENRE, pname=username, genre=genre)
+
+    #Gets all genres the sending user has a :LIKES_GENRE relationship to.
+    async def Query_get_liked_genres(self, tx, username):
+        return await self.run_query(tx, cypher.GET_LIKED_GENRES, cypher.read_genres, username=username)
+
+    #Creates a person node, and a :VIEWS relationship between it and another person node.
+    async def Query_create_user_views(self, tx, username1, username2):
+        return await self.run_query(tx, cypher.CREATE_USER_VIEWS, username1=username1, username2=username2)
+
+    #Creates a :VIEWS relationship between two existing person nodes.
+    async def Query_create_views(self, tx, username1, username2):
+        return await self.run_query(tx, cypher.CREATE_VIEWS, username1=username1, username2=username2)
+
+    #Gets all person nodes that have a :VIEWS relationship to the specified person node.
+    async def Query_viewers(self, tx, username):
+        return await self.run_query(tx, cypher.GET_VIEWERS, lambda records: cypher.read_usernames(records, 'viewer'), username=username)
+
+    #Gets a dictionary where the keys are Genres and the values are the amount of viewers of the specified user who like that genre.
+    async def Query_get_viewer_liked_genres(self, tx, username):
+        return await self.run_query(tx, cypher.GET_VIEWER_LIKED_GENRES, lambda records: cypher.read_dict(records, 'genre', 'pathcount'), username=username)
+
+    #Gets a dictionary where the keys are usernames who view the specified user, and the values are the query counts.
+    async def Query_get_query_count_leader(self, tx, username):
+        return await self.run_query(tx, cypher.GET_QUERY_COUNT_LEADER, lambda records: cypher.read_dict(records, 'username', 'queries'), username=username)
+
+    #Creates a person node and a :VIEWS relationship to the streamer for every username that does not have them yet. Used to onboard a batch of joiners at once.
+    async def Query_onboard_viewers(self, tx, usernames, streamer):
+        return await self.run_query(tx, cypher.ONBOARD_VIEWERS, usernames=usernames, streamer=streamer)
+
+    #Run functions. These are the functions that execute the query functions in the database.
+    #Runs a query that will remove a user's node and relationships from the database.
+    async def Run_remove_user(self, username):
+        return await self.write(self.Query_remove_user, username, invalidates='remove_user')
+
+    #Runs an add node query to create a person node with the username property set to the sending user's username
+    async def Run_add_user(self, username):
+        return await self.write(self.Query_add_user, username)
+
+    #Runs an add IS_FRIENDS relationship query to create a relationship between two users. The relaionship direction is user1->user2
+    async def Run_add_friendship(self, user1, user2):
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.add_friendship(user1, user2) == False:
+                return False
+            return
+        return await self.write(self.Query_add_friendship, user1, user2)
+
+    #Runs a read only query that will return a list of all users the sending user is friends with
+    async def Run_get_friends(self, username):
+        return await self.read(self.Query_get_friends, username)
+
+    #Runs a read only query that will return all users currently in the database. (Specifically all nodes with the Person label)
+    async def Run_all_user(self):
+        return await self.read(self.Query_all_user)
+
+    #Runs a read only query that will return all user stats for the selected user.
+    async def Run_get_stats(self, username, streamer):
+        return await self.read(self.Query_get_stats, username, streamer)
+
+    #Runs a query that will increase the query_count property on the specified node by 1.
+    async def Run_increase_query_count(self, username):
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.increase_query_count(username) == False:
+                return False
+            return
+        return await self.write(self.Query_increase_query_count, username)
+
+    #Runs a read only query that will get all genres.
+    async def Run_get_genres(self):
+        return await self.read_cached('get_genres', self.Query_get_genres)
+
+    #Runs a query that will set a :LIKES_GENRE relationship between the specified user and the specified genre.
+    async def Run_set_likes_genre(self, username, genre):
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.set_likes_genre(username, genre) == False:
+                return False
+            return
+        return await self.write(self.Query_set_likes_genre, username, genre, invalidates='set_likes_genre')
+
+    #Runs a read only query that will retrieve all genres the specified user has a :LIKES GENRE relationship to.
+    async def Run_get_liked_genres(self, username):
+        return await self.read(self.Query_get_liked_genres, username)
+
+    #Runs a query that creates a person node, and creates a views relationship between it and another person node.
+    async def Run_create_user_views(self, username1, username2):
+        return await self.write(self.Query_create_user_views, username1, username2, invalidates='create_user_views')
+
+    #Runs a query that creates a :VIEWS relationship between to person nodes.
+    async def Run_create_views(self, username1, username2):
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.create_views(username1, username2) == False:
+                return False
+            return
+        return await self.write(self.Query_create_views, username1, username2, invalidates='create_views')
+
+    #Runs a query that returns all Person nodes with a :VIEWS relationship to the specified user.
+    async def Run_get_viewers(self, username):
+        return await self.read_cached('get_viewers', self.Query_viewers, username)
+
+    #Runs a read only query that returns a dictionary where the keys are genres and the values are the count of viewers of the specified user who like that genre
+    async def Run_get_viewer_liked_genres(self, username):
+        return await self.read_cached('get_viewer_liked_genres', self.Query_get_viewer_liked_genres, username)
+
+    #Runs a read only query that returns a dict where the keys are viewers of the specified channel, and the values are their query_counts.
+    async def Run_get_query_count_leader(self, username):
+        return await self.read_cached('get_query_count_leader', self.Query_get_query_count_leader, username)
+
+    #Runs a query that onboards a batch of joiners, creating their person nodes and :VIEWS relationships in one transaction.
+    async def Run_onboard_viewers(self, usernames, streamer):
+        return await self.write(self.Query_onboard_viewers, usernames, streamer, invalidates='onboard_viewers')
+
+#Time every Run and Query function.
+instrument_class(AsyncBotQueries, 'async_query')
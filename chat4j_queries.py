@@ -1,520 +1,516 @@
-from neo4j import GraphDatabase
 from  log import query_logger
+from write_behind import WriteBehindBatcher
+from points_ledger import PointsLedger
+from query_cache import QueryCache
+from metrics import instrument_class
+import cypher
+from contextlib import contextmanager
+import threading
+import time
+import os
 import config
 
+#The backend the queries run on. These can be set in config.py. 'neo4j' uses the database in DB, and 'memory' keeps the graph in memory, for benchmarks and offline demos.
+QUERY_BACKEND = getattr(config, 'QUERY_BACKEND', 'neo4j')
+QUERY_BACKENDS = ('neo4j', 'memory')
+
+#Connection pool settings. These can be set in config.py.
+POOL_SETTINGS = {
+    'max_connection_pool_size': getattr(config, 'DB_MAX_POOL_SIZE', 50),
+    'connection_acquisition_timeout': getattr(config, 'DB_ACQUISITION_TIMEOUT', 30),
+    'max_connection_lifetime': getattr(config, 'DB_MAX_CONNECTION_LIFETIME', 3600),
+}
+
+#Write-behind settings. These can be set in config.py. Set WRITE_BEHIND to False to write every change right away.
+WRITE_BEHIND = getattr(config, 'WRITE_BEHIND', True)
+WRITE_BEHIND_SETTINGS = {
+    'flush_interval_ms': getattr(config, 'WRITE_BEHIND_INTERVAL_MS', 250),
+    'max_items': getattr(config, 'WRITE_BEHIND_MAX_ITEMS', 500),
+    'max_retries': getattr(config, 'WRITE_BEHIND_MAX_RETRIES', 3),
+}
+
+#Points ledger settings. These can be set in config.py. Points changes are written to a journal in POINTS_JOURNAL_DIR right away, and added to the database every POINTS_FLUSH_INTERVAL_MS.
+POINTS_LEDGER_SETTINGS = {
+    'name': getattr(config, 'POINTS_LEDGER_NAME', 'points'),
+    'journal_dir': getattr(config, 'POINTS_JOURNAL_DIR', os.path.join('Chatbot', 'ledger')),
+    'flush_interval_ms': getattr(config, 'POINTS_FLUSH_INTERVAL_MS', 1000),
+    'max_items': getattr(config, 'POINTS_FLUSH_MAX_ITEMS', 500),
+    'fsync': getattr(config, 'POINTS_JOURNAL_FSYNC', False),
+}
+
+#How many seconds each cached read is kept. These can be changed with QUERY_CACHE_TTLS in config.py. Set a query's TTL to 0 to stop caching it.
+QUERY_CACHE_TTLS = {
+    'get_genres': 300,
+    'get_viewers': 30,
+    'get_viewer_liked_genres': 60,
+    'get_query_count_leader': 15,
+}
+QUERY_CACHE_TTLS.update(getattr(config, 'QUERY_CACHE_TTLS', {}))
+
+#The cached reads each write changes. Query counts do not invalidate the leader board, which is kept for its TTL instead, because every command changes them.
+CACHE_INVALIDATES = {
+    'remove_user': ('get_viewers', 'get_viewer_liked_genres', 'get_query_count_leader'),
+    'create_user_views': ('get_viewers', 'get_viewer_liked_genres', 'get_query_count_leader'),
+    'create_views': ('get_viewers', 'get_viewer_liked_genres', 'get_query_count_leader'),
+    'onboard_viewers': ('get_viewers', 'get_viewer_liked_genres', 'get_query_count_leader'),
+    'set_likes_genre': ('get_viewer_liked_genres',),
+}
+
+#The read cache shared by every BotQueries and AsyncBotQueries object.
+query_cache = QueryCache({name: ttl for name, ttl in QUERY_CACHE_TTLS.items() if ttl > 0})
+
+#The uniqueness constraints every lookup relies on. Each one also creates the index that MATCH and MERGE use, so finding a Person or Genre does not scan every node with that label.
+#Set SCHEMA_BOOTSTRAP to False in config.py if the database user cannot create constraints.
+SCHEMA_BOOTSTRAP = getattr(config, 'SCHEMA_BOOTSTRAP', True)
+SCHEMA_CONSTRAINTS = (
+    ('person_username', 'Person', 'username'),
+    ('genre_genre', 'Genre', 'genre'),
+)
+
+#The driver shared by every BotQueries object, so every sync query uses one connection pool. AsyncBotQueries has its own driver and pool.
+shared_driver = None
+driver_lock = threading.Lock()
+
+#The write-behind batcher shared by every BotQueries and AsyncBotQueries object.
+write_batcher = None
+batcher_lock = threading.Lock()
+
+#The points ledger shared by every Viewer.
+points_ledger = None
+ledger_lock = threading.Lock()
+
+#Counts of how one connection pool is being used. The sync and async drivers each have their own pool, so each one has its own PoolMetrics.
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        #The most connections the pool can open. It is 0 while the pool's driver is closed, and on the memory backend, which opens no connections.
+        self.pool_size = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.sessions = 0
+        self.failures = 0
+        self.total_session_time = 0.0
+
+    #Sets the size of the pool when its driver is created or closed.
+    def set_pool_size(self, pool_size):
+        with self.lock:
+            self.pool_size = pool_size
+
+    #Records a session being opened.
+    def opened(self):
+        with self.lock:
+            self.in_use += 1
+            self.sessions += 1
+            if self.in_use > self.peak_in_use:
+                self.peak_in_use = self.in_use
+
+    #Records a session being closed after the given number of seconds.
+    def closed(self, seconds, failed=False):
+        with self.lock:
+            self.in_use -= 1
+            self.total_session_time += seconds
+            if failed:
+                self.failures += 1
+
+    #Gets a copy of the current counts.
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'sessions': self.sessions,
+                'failures': self.failures,
+                'average_session_ms': (self.total_session_time / self.sessions * 1000) if self.sessions else 0.0,
+            }
+
+#The metrics for the sync driver's pool, and for the async driver's pool in chat4j_async_queries.py.
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+#Gets the shared driver, creating it the first time it is needed.
+def get_driver():
+    global shared_driver
+    with driver_lock:
+        if shared_driver is None:
+            #Imported here, so the memory backend runs without the neo4j package.
+            from neo4j import GraphDatabase
+            shared_driver = GraphDatabase.driver(config.DB, auth=(config.DB_USER, config.DB_PASS), **POOL_SETTINGS)
+            pool_metrics.set_pool_size(POOL_SETTINGS['max_connection_pool_size'])
+            try:
+                shared_driver.verify_connectivity()
+                query_logger.info("Shared Driver Initialized. Pool settings: %s", POOL_SETTINGS)
+            except Exception as e:
+                query_logger.critical(e)
+        return shared_driver
+
+#Closes the shared driver and its connection pool.
+def close_driver():
+    global shared_driver
+    with driver_lock:
+        if shared_driver is not None:
+            shared_driver.close()
+            shared_driver = None
+            pool_metrics.set_pool_size(0)
+            query_logger.info('Shared Driver closed.')
+
+#Gets the usage counts for each connection pool, and the totals across both. The totals are the connections the whole process can open and is using.
+def get_pool_metrics():
+    pools = {'sync': pool_metrics.snapshot(), 'async': async_pool_metrics.snapshot()}
+    totals = {name: sum(pool[name] for pool in pools.values()) for name in ('pool_size', 'in_use', 'sessions', 'failures')}
+    totals.update(pools)
+    return totals
+
+#Drops the cached reads that the given write changes.
+def invalidate_cache(write):
+    names = CACHE_INVALIDATES.get(write)
+    if names:
+        query_cache.invalidate(*names)
+
+#Gets the hit, miss, and invalidation counts for the read cache.
+def get_query_cache_counters():
+    return query_cache.get_counters()
+
+#Gets a BotQueries object for the backend set in QUERY_BACKEND.
+def create_queries():
+    if QUERY_BACKEND not in QUERY_BACKENDS:
+        raise ValueError(f'Unknown QUERY_BACKEND {QUERY_BACKEND}. Use one of: {QUERY_BACKENDS}')
+    if QUERY_BACKEND == 'memory':
+        from memory_queries import MemoryBotQueries
+        return MemoryBotQueries()
+    return BotQueries()
+
+#Gets the shared write-behind batcher, starting it the first time it is needed. Returns None if write-behind is turned off.
+def get_write_batcher():
+    global write_batcher
+    if not WRITE_BEHIND:
+        return None
+    with batcher_lock:
+        if write_batcher is None:
+            write_batcher = WriteBehindBatcher(create_queries(), **WRITE_BEHIND_SETTINGS)
+            write_batcher.start()
+            query_logger.info('Write-behind batcher started. Settings: %s', WRITE_BEHIND_SETTINGS)
+        return write_batcher
+
+#Flushes and stops the shared write-behind batcher.
+def close_write_batcher():
+    global write_batcher
+    with batcher_lock:
+        batcher = write_batcher
+        write_batcher = None
+    if batcher is not None:
+        batcher.close()
+
+#Gets the shared points ledger, starting it the first time it is needed. Starting it applies any journal left from the last run.
+def get_points_ledger():
+    global points_ledger
+    with ledger_lock:
+        if points_ledger is None:
+            points_ledger = PointsLedger(create_queries(), **POINTS_LEDGER_SETTINGS)
+            points_ledger.start()
+            query_logger.info('Points ledger started. Settings: %s', POINTS_LEDGER_SETTINGS)
+        return points_ledger
+
+#Flushes and stops the shared points ledger.
+def close_points_ledger():
+    global points_ledger
+    with ledger_lock:
+        ledger = points_ledger
+        points_ledger = None
+    if ledger is not None:
+        ledger.close()
+
 #This class handles all queries to the databse. It is divided between functions that have the queries, and functions that create trannsactions for query functions.
+#The Cypher and the record readers are in cypher.py, and are shared with AsyncBotQueries.
 class BotQueries:
     def __init__(self):
-        self.driver = GraphDatabase.driver(config.DB, auth=(config.DB_USER, config.DB_PASS))
+        self.driver = get_driver()
+
+    #Drops the cached reads that the given write changes. The write-behind batcher calls this after each batch is written.
+    def invalidate_cache(self, write):
+        invalidate_cache(write)
+
+    #Opens a session on the shared driver and records its use in the pool metrics.
+    @contextmanager
+    def open_session(self):
+        pool_metrics.opened()
+        start = time.perf_counter()
+        failed = False
         try:
-            self.driver.verify_connectivity()
-            query_logger.info("Bot Queries Driver Initialized.")
+            with self.driver.session() as session:
+                yield session
+        except Exception:
+            failed = True
+            raise
+        finally:
+            pool_metrics.closed(time.perf_counter() - start, failed)
+
+    #Runs a query in a transaction, and reads its records with the reader if there is one. Returns False if the query fails.
+    def run_query(self, tx, query, reader=None, **parameters):
+        query_logger.debug('Running query: %s', query)
+        try:
+            result = tx.run(query, **parameters)
+            if reader is None:
+                return None
+            value = reader(list(result))
+            query_logger.info('%s', value)
+            return value
         except Exception as e:
-            query_logger.critical(e)
+            query_logger.error(e)
+            query_logger.debug('Arguments used: %s', parameters)
+            return False
+
+    #Runs a read only query function in its own session. Returns None if it fails.
+    def read(self, function, *args):
+        query_logger.info('Command Received. Arguments: %s', args)
+        with self.open_session() as session:
+            try:
+                result = session.execute_read(function, *args)
+                #If query fails, raise an error.
+                if result == False:
+                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
+                return result
+            except Exception as e:
+                query_logger.error(e)
+                query_logger.debug('Arguments used: %s', args)
+
+    #Runs a read only query function, or gets its result from the read cache.
+    def read_cached(self, name, function, *args):
+        hit, result = query_cache.lookup(name, *args)
+        if hit:
+            return result
+        result = self.read(function, *args)
+        if result is not None:
+            query_cache.store(name, args, result)
+        return result
+
+    #Runs a write query function in its own session, then drops the cached reads it changes. Returns False if it fails.
+    def write(self, function, *args, invalidates=None):
+        query_logger.info('Command Received. Arguments: %s', args)
+        with self.open_session() as session:
+            try:
+                result = session.execute_write(function, *args)
+                #If query fails, raise an error.
+                if result == False:
+                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
+                if invalidates is not None:
+                    invalidate_cache(invalidates)
+            except Exception as e:
+                query_logger.error(e)
+                query_logger.debug('Arguments used: %s', args)
+                return False
 
 
     #Query functions,to be used by the run functions. They define the transaction used for the run function.
     #Remove a user's node and all relationships.
     def Query_remove_user(self, tx, username):
-        query = ("""MATCH (p:Person) DETACH DELETE p""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, username=username)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        return self.run_query(tx, cypher.REMOVE_USER, username=username)
 
-    #Adds a user to the database. 
+    #Adds a user to the database.
     def Query_add_user(self, tx, username):
-        query = ("MERGE (p:Person {username: $username}) SET p.created_on = date(), p.query_count= 1")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, username=username)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        return self.run_query(tx, cypher.ADD_USER, username=username)
 
     #Adds a friendship between two users.
     def Query_add_friendship(self, tx, username1, username2):
-        query = ("""MATCH (p1:Person)
-            WHERE p1.username = $p1name
-            MATCH (p2:Person)
-            WHERE p2.username = $p2name
-            MERGE (p1)-[r:IS_FRIENDS {start_date: date()}]->(p2)""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, p1name=username1, p2name=username2)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Arguements used: 1. {username1} 2. {username2}')
-            return False
+        return self.run_query(tx, cypher.ADD_FRIENDSHIP, p1name=username1, p2name=username2)
 
     #Gets all users that the sending user is friends with.
     def Query_get_friends(self, tx, username):
-        friends_list=[]
-        query = ("MATCH (n:Person {username: $username})-[:IS_FRIENDS]-(f:Person) RETURN f")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query, username=username)
-            #For each record in results, get the username value from that record.
-            for record in results:
-                node = record["f"]
-                name = node["username"]
-                #If the name is in friends list already, pass.
-                if name in friends_list:
-                    pass
-                #If the above is false, add the name to the list.
-                else:
-                    friends_list.append(name)
-            query_logger.info(friends_list)
-            return friends_list
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        return self.run_query(tx, cypher.GET_FRIENDS, cypher.read_friends, username=username)
 
     #Gets all users currently in the database. (This specifically grabs all nodes with the :Person label)
     def Query_all_user(self, tx):
-        users=[]
-        query=("MATCH (p:Person) RETURN p ORDER BY p.name")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query)
-            #For each record in results, get the username value from that record.
-            for record in results:
-                node = record['p']
-                username = node['username']
-                users.append(username)
-            query_logger.info(users)
-            return users
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug('No arguments used.')
-            return False
+        return self.run_query(tx, cypher.ALL_USER, lambda records: cypher.read_usernames(records, 'p'))
 
-    #Gets the personal statistics of the user who sent the command.
+    #Gets the personal statistics of the user who sent the command. The streamer has no points in their own channel.
     def Query_get_stats(self, tx, username, streamer):
-        stats = {}
-        try:
-            #If the streamer is not the user, get the stats for the user.
-            if streamer != username:
-                query_logger.info(f'{username} is not the streamer.')
-                query = ('''MATCH (p:Person)-[r:VIEWS]->(p2:Person) WHERE p.username = $username AND p2.username=$streamer RETURN p.created_on AS created, p.query_count AS count, r.points AS points''')
-                results = tx.run(query, username=username, streamer=streamer)
-                #For each record in results, get the created, count, and points values from that record.
-                for record in results:
-                    stats['created_on'] = str(record['created'])
-                    stats['query_count'] = record['count']
-                    stats['points'] = record['points']
-                query_logger.info(stats)
-                return stats
-            #If the streamer is the user, get the stats for the streamer.
-            elif streamer == username:
-                query_logger.info('{username} is the streamer.')
-                query =  ('MATCH (p:Person) WHERE p.username = $username RETURN p.created_on AS created, p.query_count as count')
-                query_logger.info(f'Running query: {query}')
-                results = tx.run(query, username=username)
-                #For each record in results, get the created, and count values from that record.
-                for record in results:
-                    stats['created_on'] = str(record['created'])
-                    stats['query_count'] = record['count']
-                query_logger.info(stats)
-                return stats
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        if streamer == username:
+            query_logger.info('%s is the streamer.', username)
+            return self.run_query(tx, cypher.GET_STREAMER_STATS, cypher.read_stats, username=username)
+        return self.run_query(tx, cypher.GET_VIEWER_STATS, cypher.read_stats, username=username, streamer=streamer)
 
     #Increase the user's query_count property by 1.
     def Query_increase_query_count(self, tx, username):
-        query = ("""MATCH (p:Person {username: $username}) SET p.query_count = p.query_count + 1""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, username=username)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
-    
+        return self.run_query(tx, cypher.INCREASE_QUERY_COUNT, username=username)
+
     #Gets all genres.
     def Query_get_genres(self, tx):
-        genres = []
-        query = ("MATCH  (g:Genre) RETURN g")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query)
-            #For each record in results, get the genre value from that record.
-            for record in results:
-                node=record['g']
-                genre = node['genre']
-                genres.append(genre)
-            query_logger.info(genres)
-            return genres
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug('No arguments used.')
-            return False
-            
+        return self.run_query(tx, cypher.GET_GENRES, cypher.read_genres)
+
     #Sets a :LIKES_GENRE relationship from the user to the genre.
     def Query_set_likes_genre(self, tx, username, genre):
-        query = ("""MATCH (p:Person)
-            WHERE p.username = $pname
-            MATCH (g:Genre)
-            WHERE g.genre = $genre
-            MERGE (p)-[r:LIKES_GENRE {start_date: date()}]->(g)""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, pname=username, genre=genre)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.info(f'Arguments used: 1. {username} 2. {genre}')
-            return False
+        return self.run_query(tx, cypher.SET_LIKES_GENRE, pname=username, genre=genre)
 
     #Gets all genres the sending user has a :LIKES_GENRE relationship to.
     def Query_get_liked_genres(self, tx, username):
-        liked_genres = []
-        query = ("""MATCH (p:Person)-[:LIKES_GENRE]->(g) WHERE p.username = $username RETURN g""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query, username=username)
-            #For each record in results, get the genre value from that record and add it to tthe liked genres list.
-            for record in results:
-                node = record['g']
-                genre = node['genre']
-                liked_genres.append(genre)
-            query_logger.info(liked_genres)
-            return liked_genres
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
-            
+        return self.run_query(tx, cypher.GET_LIKED_GENRES, cypher.read_genres, username=username)
+
     #Creates a person node, and a :VIEWS relationship between it and another person node.
-    def Query_create_user_views(self, tx, username1,  username2):
-        query = ("""MERGE (p:Person {username: $username1})
-                    WITH p 
-                    MATCH (s:Person {username: $username2})
-                    MERGE (p)-[r:VIEWS {created_on: date()}]->(s)
-                    SET p.created_on = date()
-                    SET p.query_count = 1
-                    set r.points = 100""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, username1=username1, username2=username2)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Arguements used: 1. {username1} 2. {username2}')
-            return False
+    def Query_create_user_views(self, tx, username1, username2):
+        return self.run_query(tx, cypher.CREATE_USER_VIEWS, username1=username1, username2=username2)
 
     #Creates a :VIEWS relationship between two existing person nodes.
     def Query_create_views(self, tx, username1, username2):
-        query = ("""MATCH (p:Person {username: $username1})
-                    MATCH (s:Person {username: $username2})
-                    MERGE (p)-[r:VIEWS {created_on: date()}]->(s)
-                    SET r.points = 100""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            tx.run(query, username1=username1,  username2=username2)
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Arguements used: 1. {username1} 2. {username2}')
-            return False
+        return self.run_query(tx, cypher.CREATE_VIEWS, username1=username1, username2=username2)
 
     #Gets all person nodes that have a :VIEWS relationship to the specified person node.
     def Query_viewers(self, tx, username):
-        viewers =  []
-        query  = ("""MATCH (p:Person {username: $username})<-[:VIEWS]-(v:Person) RETURN v AS viewer""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results =  tx.run(query, username=username)
-            #For each record in results, get the username value from that record.
-            for record in results:
-                node = record['viewer']
-                viewer = node['username']
-                viewers.append(viewer)
-            query_logger.info(viewers)
-            return viewers
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        return self.run_query(tx, cypher.GET_VIEWERS, lambda records: cypher.read_usernames(records, 'viewer'), username=username)
 
     #Gets a dictionary where the keys are Genres and the values are the amount of viewers of the specified user who like that genre.
     def Query_get_viewer_liked_genres(self, tx, username):
-        genre_suggest_dict = {}
-        query = ("""MATCH path = ((g:Genre)<-[:LIKES_GENRE]-(p:Person)-[:VIEWS]->(s:Person {username: $username}))
-                    RETURN g.genre AS genre, count(path) AS pathcount ORDER BY pathcount DESC""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query, username=username)
-            #For each record in results, get the genre and pathcount value from that record. Thenn add them to a dictionnary where genre is tthe key and pathcount is the value.
-            for record in results:
-                genre_suggest_dict[record['genre']] = record['pathcount']
-            query_logger.info(genre_suggest_dict)
-            return genre_suggest_dict
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
-
+        return self.run_query(tx, cypher.GET_VIEWER_LIKED_GENRES, lambda records: cypher.read_dict(records, 'genre', 'pathcount'), username=username)
 
     #Gets a dictionary where the keys are usernames who view the specified user, and the values are the query counts.
     def Query_get_query_count_leader(self, tx, username):
-        count_leader={}
-        query = ("""MATCH (p:Person)-[:VIEWS]->(s:Person {username: $username})
-                    RETURN p.username AS username, p.query_count AS queries ORDER BY queries DESC LIMIT 1""")
-        query_logger.info(f'Running query: {query}')
-        try:
-            results = tx.run(query, username=username)
-            #For each record in results, get the username and queries values from that record. Then add them to a dictionary with the username as the key and the quieries as the value.
-            for record in results:
-                count_leader[record['username']] = record['queries']
-            query_logger.info(count_leader)
-            return count_leader
-        except Exception as e:
-            query_logger.error(e)
-            query_logger.debug(f'Argument used: {username}')
-            return False
+        return self.run_query(tx, cypher.GET_QUERY_COUNT_LEADER, lambda records: cypher.read_dict(records, 'username', 'queries'), username=username)
+
+    #Creates a person node and a :VIEWS relationship to the streamer for every username that does not have them yet. Used to onboard a batch of joiners at once.
+    def Query_onboard_viewers(self, tx, usernames, streamer):
+        return self.run_query(tx, cypher.ONBOARD_VIEWERS, usernames=usernames, streamer=streamer)
+
+    #Batch query functions, used by the write-behind batcher. Each one writes every row in a single UNWIND transaction.
+    #Increases the query_count of each user by the merged count.
+    def Query_batch_increase_query_count(self, tx, rows):
+        return self.run_query(tx, cypher.BATCH_INCREASE_QUERY_COUNT, rows=rows)
+
+    #Adds an :IS_FRIENDS relationship for each pair of users.
+    def Query_batch_add_friendship(self, tx, rows):
+        return self.run_query(tx, cypher.BATCH_ADD_FRIENDSHIP, rows=rows)
 
+    #Adds a :LIKES_GENRE relationship for each user and genre.
+    def Query_batch_set_likes_genre(self, tx, rows):
+        return self.run_query(tx, cypher.BATCH_SET_LIKES_GENRE, rows=rows)
 
+    #Adds each points delta to the :VIEWS relationship from the user to the streamer, as one batch from the named points ledger. Returns the ledger's last batch id.
+    def Query_batch_add_points(self, tx, rows, batch, ledger):
+        return self.run_query(tx, cypher.BATCH_ADD_POINTS, lambda records: cypher.read_value(records, 'batch'), rows=rows, batch=batch, ledger=ledger)
+
+    #Adds a :VIEWS relationship for each pair of users.
+    def Query_batch_create_views(self, tx, rows):
+        return self.run_query(tx, cypher.BATCH_CREATE_VIEWS, rows=rows)
+
+    #Creates a uniqueness constraint if it does not exist yet.
+    def Query_create_constraint(self, tx, name, label, property):
+        return self.run_query(tx, cypher.CREATE_CONSTRAINT.format(name=name, label=label, property=property))
+
+    #Gets the (label, property) pairs that have a uniqueness constraint.
+    def Query_get_constraints(self, tx):
+        return self.run_query(tx, cypher.GET_CONSTRAINTS, cypher.read_constraints)
 
     #Run functions. These are the functions that execute the query functions in the database.
     #Runs a query that will remove a user's node and relationships from the database.
     def Run_remove_user(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_remove_user, username)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-                return False
-            finally:
-                session.close()
+        return self.write(self.Query_remove_user, username, invalidates='remove_user')
 
     #Runs an add node query to create a person node with the username property set to the sending user's username
     def Run_add_user(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_add_user, username)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-                return False
-            finally:
-                session.close()
-            
+        return self.write(self.Query_add_user, username)
+
     #Runs an add IS_FRIENDS relationship query to create a relationship between two users. The relaionship direction is user1->user2
     def Run_add_friendship(self, user1, user2):
-        query_logger.info(f'Command Received. Arguments: 1. {user1} 2. {user2}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_add_friendship, user1,  user2)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Arguments used: 1. {user1} 2. {user2}')
-            finally:
-                session.close()
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.add_friendship(user1, user2) == False:
+                return False
+            return
+        return self.write(self.Query_add_friendship, user1, user2)
 
     #Runs a read only query that will return a list of all users the sending user is friends with
     def Run_get_friends(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                friends = session.execute_read(self.Query_get_friends, username)
-                #If query fails, raise an error.
-                if friends == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                else: 
-                    return friends
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
-            
+        return self.read(self.Query_get_friends, username)
+
     #Runs a read only query that will return all users currently in the database. (Specifically all nodes with the Person label)
     def Run_all_user(self):
-        query_logger.info(f'Command Received. Argument: None')
-        with self.driver.session() as session:
-            try:
-                users = session.execute_read(self.Query_all_user)
-                #If query fails, raise an error.
-                if users == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                else: 
-                    return users
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug('No arguments used.')
-            finally:
-                session.close()
+        return self.read(self.Query_all_user)
 
     #Runs a read only query that will return all user stats for the selected user.
     def Run_get_stats(self, username, streamer):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                stats = session.execute_read(self.Query_get_stats, username, streamer)
-                #If query fails, raise an error.
-                if stats == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                else: 
-                    return stats
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
+        return self.read(self.Query_get_stats, username, streamer)
 
     #Runs a query that will increase the query_count property on the specified node by 1.
     def Run_increase_query_count(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_increase_query_count, username)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.increase_query_count(username) == False:
+                return False
+            return
+        return self.write(self.Query_increase_query_count, username)
 
     #Runs a read only query that will get all genres.
     def Run_get_genres(self):
-        query_logger.info(f'Command Received. Argument: None')
-        with self.driver.session() as session:
-            try:
-                genres = session.execute_read(self.Query_get_genres)
-                #If query fails, raise an error.
-                if genres == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                return genres
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug('No arguments used.')
-            finally:
-                session.close()
-            
+        return self.read_cached('get_genres', self.Query_get_genres)
+
     #Runs a query that will set a :LIKES_GENRE relationship between the specified user and the specified genre.
     def Run_set_likes_genre(self, username, genre):
-        query_logger.info(f'Command Received. Arguments: 1. {username} 2. {genre}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_set_likes_genre, username, genre)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Arguments used: 1. {username} 2. {genre}')
-            finally:
-                session.close()
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.set_likes_genre(username, genre) == False:
+                return False
+            return
+        return self.write(self.Query_set_likes_genre, username, genre, invalidates='set_likes_genre')
 
     #Runs a read only query that will retrieve all genres the specified user has a :LIKES GENRE relationship to.
     def Run_get_liked_genres(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                liked_genres = session.execute_read(self.Query_get_liked_genres, username)
-                #If query fails, raise an error.
-                if liked_genres == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                return liked_genres
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
-            
+        return self.read(self.Query_get_liked_genres, username)
+
     #Runs a query that creates a person node, and creates a views relationship between it and another person node.
     def Run_create_user_views(self, username1, username2):
-        query_logger.info(f'Command Received. Arguments: 1. {username1}  2. {username2}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_create_user_views, username1, username2)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Arguments used: 1. {username1} 2. {username2}')  
-            finally:   
-                session.close()
+        return self.write(self.Query_create_user_views, username1, username2, invalidates='create_user_views')
 
     #Runs a query that creates a :VIEWS relationship between to person nodes.
     def Run_create_views(self, username1, username2):
-        query_logger.info(f'Command Received. Arguments: 1. {username1} 2. {username2}')
-        with self.driver.session() as session:
-            try:
-                query = session.execute_write(self.Query_create_views, username1, username2)
-                #If query fails, raise an error.
-                if query == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Arguments used: 1. {username1} 2. {username2}')
-            finally:
-                session.close()
+        batcher = get_write_batcher()
+        #If write-behind is on, queue the write and return right away.
+        if batcher is not None:
+            if batcher.create_views(username1, username2) == False:
+                return False
+            return
+        return self.write(self.Query_create_views, username1, username2, invalidates='create_views')
 
     #Runs a query that returns all Person nodes with a :VIEWS relationship to the specified user.
     def Run_get_viewers(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                viewers = session.execute_read(self.Query_viewers, username)
-                #If query fails, raise an error.
-                if viewers == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                return viewers
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
-            
+        return self.read_cached('get_viewers', self.Query_viewers, username)
+
     #Runs a read only query that returns a dictionary where the keys are genres and the values are the count of viewers of the specified user who like that genre
     def Run_get_viewer_liked_genres(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
-            try:
-                genre_suggest_dict = session.execute_read(self.Query_get_viewer_liked_genres, username)
-                #If query fails, raise an error.
-                if genre_suggest_dict == False:
-                    raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                return genre_suggest_dict
-            except Exception as e:
-                query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
+        return self.read_cached('get_viewer_liked_genres', self.Query_get_viewer_liked_genres, username)
 
     #Runs a read only query that returns a dict where the keys are viewers of the specified channel, and the values are their query_counts.
     def Run_get_query_count_leader(self, username):
-        query_logger.info(f'Command Received. Argument: {username}')
-        with self.driver.session() as session:
+        return self.read_cached('get_query_count_leader', self.Query_get_query_count_leader, username)
+
+    #Runs a query that onboards a batch of joiners, creating their person nodes and :VIEWS relationships in one transaction.
+    def Run_onboard_viewers(self, usernames, streamer):
+        return self.write(self.Query_onboard_viewers, usernames, streamer, invalidates='onboard_viewers')
+
+    #Runs queries that create the schema constraints the bot needs, then checks they all exist. Safe to run more than once.
+    #Returns the list of constraints that are still missing, or False if the constraints could not be checked.
+    def Run_bootstrap_schema(self):
+        query_logger.info('Command Received. Argument: None')
+        with self.open_session() as session:
             try:
-                count_leader = session.execute_read(self.Query_get_query_count_leader, username)
+                for name, label, property in SCHEMA_CONSTRAINTS:
+                    #Creating a constraint fails if the label already has duplicate values. The check below reports it.
+                    if session.execute_write(self.Query_create_constraint, name, label, property) == False:
+                        query_logger.warning('Could not create constraint %s. Check for duplicate %s.%s values.', name, label, property)
+                constraints = session.execute_read(self.Query_get_constraints)
                 #If query fails, raise an error.
-                if count_leader == False:
+                if constraints == False:
                     raise ValueError('Failed to execute query. Please check arguments or cypher syntax and try again.')
-                return count_leader
             except Exception as e:
                 query_logger.error(e)
-                query_logger.debug(f'Argument used: {username}')
-            finally:
-                session.close()
+                query_logger.debug('No arguments used.')
+                return False
+        missing = [name for name, label, property in SCHEMA_CONSTRAINTS if (label, property) not in constraints]
+        if missing:
+            query_logger.error('Schema constraints missing: %s', missing)
+        else:
+            query_logger.info('Schema constraints verified.')
+        return missing
+
+#Time every Run and Query function.
+instrument_class(BotQueries, 'query')
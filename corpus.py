@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+from array import array
+from log import bot_function_logger
+
+#A text file of one entry per line, such as the jokes and 8ball answers.
+#The file is indexed once by the byte offset of each line, so picking a random line reads only that line, however large the file is. New lines are appended to the file and the index without reading it again.
+class TextCorpus:
+    def __init__(self, path, chunk_size=1 << 16):
+        self.logger = bot_function_logger
+        self.path = path
+        self.chunk_size = chunk_size
+        self.offsets = array('Q')
+        self.indexed_size = 0
+        self.lock = threading.Lock()
+        self.file = None
+
+    def __len__(self):
+        with self.lock:
+            self.refresh()
+            return len(self.offsets)
+
+    #Indexes the lines after the part of the file that is already indexed. Only lines with text in them are indexed. Must be called with the lock held.
+    def index_from(self, start):
+        offsets = self.offsets
+        with open(self.path, 'rb') as file:
+            file.seek(start)
+            position = start
+            line_start = start
+            has_text = False
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                cursor = 0
+                while True:
+                    newline = chunk.find(b'\n', cursor)
+                    if newline == -1:
+                        has_text = has_text or bool(chunk[cursor:].strip())
+                        break
+                    if has_text or chunk[cursor:newline].strip():
+                        offsets.append(line_start)
+                    line_start = position + newline + 1
+                    has_text = False
+                    cursor = newline + 1
+                position += len(chunk)
+            #A last line without a newline is indexed too. It is indexed again if more is appended to it.
+            if has_text:
+                offsets.append(line_start)
+                self.indexed_size = line_start
+            else:
+                self.indexed_size = position
+
+    #Indexes the file the first time it is used, and picks up lines added by other programs. A file that shrank is indexed again from the start. Must be called with the lock held.
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            self.offsets = array('Q')
+            self.indexed_size = 0
+            return
+        if size < self.indexed_size:
+            self.logger.info('%s got smaller. Indexing it again.', self.path)
+            self.offsets = array('Q')
+            self.indexed_size = 0
+            self.close_file()
+        if size > self.indexed_size:
+            #The last indexed line may not have ended yet, so index from its start.
+            start = self.indexed_size
+            if self.offsets and self.offsets[-1] == start:
+                self.offsets.pop()
+            self.index_from(start)
+
+    #Loads the index now instead of on first use.
+    def load(self):
+        with self.lock:
+            self.refresh()
+            self.logger.info('Indexed %s lines from %s.', len(self.offsets), self.path)
+
+    #Gets a random line, or None if the file has no lines.
+    def random_line(self):
+        with self.lock:
+            self.refresh()
+            if not self.offsets:
+                return None
+            offset = self.offsets[random.randrange(len(self.offsets))]
+            if self.file is None:
+                self.file = open(self.path, 'rb')
+            self.file.seek(offset)
+            return self.file.readline().decode('utf-8', errors='replace').strip()
+
+    #Adds a line to the end of the file and the index.
+    def append(self, text):
+        text = ' '.join(text.split())
+        if not text:
+            return False
+        with self.lock:
+            self.refresh()
+            with open(self.path, 'ab') as file:
+                #Make sure the new line does not join a last line that has no newline.
+                if file.tell() > 0 and self.offsets and self.offsets[-1] == self.indexed_size:
+                    file.write(b'\n')
+                offset = file.tell()
+                file.write(text.encode('utf-8') + b'\n')
+                end = file.tell()
+            self.offsets.append(offset)
+            self.indexed_size = end
+        return True
+
+    #Closes the file used for reading lines. Must be called with the lock held.
+    def close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,174 @@
+#The Cypher for every query, and the functions that turn its records into results. BotQueries and AsyncBotQueries both run these, so a query only has to be changed here.
+
+#Removes a user's node and all relationships.
+REMOVE_USER = "MATCH (p:Person {username: $username}) DETACH DELETE p"
+
+#Adds a user.
+ADD_USER = "MERGE (p:Person {username: $username}) SET p.created_on = date(), p.query_count= 1"
+
+#Adds a friendship between two users.
+ADD_FRIENDSHIP = """MATCH (p1:Person)
+    WHERE p1.username = $p1name
+    MATCH (p2:Person)
+    WHERE p2.username = $p2name
+    MERGE (p1)-[r:IS_FRIENDS {start_date: date()}]->(p2)"""
+
+#Gets all users that the user is friends with.
+GET_FRIENDS = "MATCH (n:Person {username: $username})-[:IS_FRIENDS]-(f:Person) RETURN f"
+
+#Gets all users. (This specifically grabs all nodes with the :Person label)
+ALL_USER = "MATCH (p:Person) RETURN p ORDER BY p.name"
+
+#Gets the stats of a viewer in a streamer's channel.
+GET_VIEWER_STATS = """MATCH (p:Person)-[r:VIEWS]->(p2:Person) WHERE p.username = $username AND p2.username=$streamer
+    RETURN p.created_on AS created, p.query_count AS count, r.points AS points"""
+
+#Gets the stats of a streamer, who has no points in their own channel.
+GET_STREAMER_STATS = "MATCH (p:Person) WHERE p.username = $username RETURN p.created_on AS created, p.query_count as count"
+
+#Increases the user's query_count property by 1.
+INCREASE_QUERY_COUNT = "MATCH (p:Person {username: $username}) SET p.query_count = p.query_count + 1"
+
+#Gets all genres.
+GET_GENRES = "MATCH  (g:Genre) RETURN g"
+
+#Sets a :LIKES_GENRE relationship from the user to the genre.
+SET_LIKES_GENRE = """MATCH (p:Person)
+    WHERE p.username = $pname
+    MATCH (g:Genre)
+    WHERE g.genre = $genre
+    MERGE (p)-[r:LIKES_GENRE {start_date: date()}]->(g)"""
+
+#Gets all genres the user has a :LIKES_GENRE relationship to.
+GET_LIKED_GENRES = "MATCH (p:Person)-[:LIKES_GENRE]->(g) WHERE p.username = $username RETURN g"
+
+#Creates a person node, and a :VIEWS relationship between it and another person node.
+#Both are only set up when they are created, so an existing viewer keeps their query count and the points the ledger has added.
+CREATE_USER_VIEWS = """MERGE (p:Person {username: $username1})
+    ON CREATE SET p.created_on = date(), p.query_count = 1
+    WITH p
+    MATCH (s:Person {username: $username2})
+    MERGE (p)-[r:VIEWS]->(s)
+    ON CREATE SET r.created_on = date(), r.points = 100"""
+
+#Creates a :VIEWS relationship between two existing person nodes. An existing relationship keeps its points.
+CREATE_VIEWS = """MATCH (p:Person {username: $username1})
+    MATCH (s:Person {username: $username2})
+    MERGE (p)-[r:VIEWS]->(s)
+    ON CREATE SET r.created_on = date(), r.points = 100"""
+
+#Gets all person nodes that have a :VIEWS relationship to the specified person node.
+GET_VIEWERS = "MATCH (p:Person {username: $username})<-[:VIEWS]-(v:Person) RETURN v AS viewer"
+
+#Gets each genre and how many viewers of the user like it.
+GET_VIEWER_LIKED_GENRES = """MATCH path = ((g:Genre)<-[:LIKES_GENRE]-(p:Person)-[:VIEWS]->(s:Person {username: $username}))
+    RETURN g.genre AS genre, count(path) AS pathcount ORDER BY pathcount DESC"""
+
+#Gets the viewer of the user with the highest query count.
+GET_QUERY_COUNT_LEADER = """MATCH (p:Person)-[:VIEWS]->(s:Person {username: $username})
+    RETURN p.username AS username, p.query_count AS queries ORDER BY queries DESC LIMIT 1"""
+
+#Creates a person node and a :VIEWS relationship to the streamer for every username that does not have them yet.
+ONBOARD_VIEWERS = """UNWIND $usernames AS username
+    MERGE (p:Person {username: username})
+    ON CREATE SET p.created_on = date(), p.query_count = 1
+    WITH p
+    MATCH (s:Person {username: $streamer})
+    MERGE (p)-[r:VIEWS]->(s)
+    ON CREATE SET r.created_on = date(), r.points = 100"""
+
+#Batch queries, used by the write-behind batcher and the points ledger. Each one writes every row in a single UNWIND transaction.
+#Increases the query_count of each user by the merged count.
+BATCH_INCREASE_QUERY_COUNT = """UNWIND $rows AS row
+    MATCH (p:Person {username: row.username})
+    SET p.query_count = p.query_count + row.count"""
+
+#Adds an :IS_FRIENDS relationship for each pair of users.
+BATCH_ADD_FRIENDSHIP = """UNWIND $rows AS row
+    MATCH (p1:Person {username: row.username1})
+    MATCH (p2:Person {username: row.username2})
+    MERGE (p1)-[r:IS_FRIENDS {start_date: date()}]->(p2)"""
+
+#Adds a :LIKES_GENRE relationship for each user and genre.
+BATCH_SET_LIKES_GENRE = """UNWIND $rows AS row
+    MATCH (p:Person {username: row.username})
+    MATCH (g:Genre {genre: row.genre})
+    MERGE (p)-[r:LIKES_GENRE {start_date: date()}]->(g)"""
+
+#Adds each points delta to the :VIEWS relationship from the user to the streamer.
+#Every points journal has its own ledger node, which keeps the id of the last batch applied from that journal. A batch that is not newer is skipped, so a batch replayed after a crash is only applied once.
+#Returns the ledger's batch id after the query, which is the batch's own id only if the database has it.
+BATCH_ADD_POINTS = """MERGE (l:PointsLedger {name: $ledger})
+    WITH l, coalesce(l.batch, 0) < $batch AS newer
+    CALL {
+        WITH l, newer
+        WITH l WHERE newer
+        SET l.batch = $batch
+        WITH l
+        UNWIND $rows AS row
+        MATCH (p:Person {username: row.username})-[r:VIEWS]->(s:Person {username: row.streamer})
+        SET r.points = coalesce(r.points, 0) + row.delta
+    }
+    RETURN l.batch AS batch"""
+
+#Adds a :VIEWS relationship for each pair of users. An existing relationship keeps its points.
+BATCH_CREATE_VIEWS = """UNWIND $rows AS row
+    MATCH (p:Person {username: row.username1})
+    MATCH (s:Person {username: row.username2})
+    MERGE (p)-[r:VIEWS]->(s)
+    ON CREATE SET r.created_on = date(), r.points = 100"""
+
+#Creates a uniqueness constraint if it does not exist yet. Constraint names, labels, and properties cannot be parameters, so they are filled in with format.
+CREATE_CONSTRAINT = "CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.{property} IS UNIQUE"
+
+#Gets every constraint.
+GET_CONSTRAINTS = "SHOW CONSTRAINTS YIELD type, labelsOrTypes, properties"
+
+
+#Record readers. Each one gets the list of records a query returned.
+#Gets the username of the node under key in each record.
+def read_usernames(records, key):
+    return [record[key]['username'] for record in records]
+
+#Gets the usernames of the friends, once each, since a friendship can go either way.
+def read_friends(records):
+    friends_list = []
+    for record in records:
+        name = record['f']['username']
+        if name not in friends_list:
+            friends_list.append(name)
+    return friends_list
+
+#Gets the genre of the node under g in each record.
+def read_genres(records):
+    return [record['g']['genre'] for record in records]
+
+#Gets the stats. Points are only there for a viewer.
+def read_stats(records):
+    stats = {}
+    for record in records:
+        stats['created_on'] = str(record['created'])
+        stats['query_count'] = record['count']
+        if 'points' in record.keys():
+            stats['points'] = record['points']
+    return stats
+
+#Gets the value of the key column in the first record.
+def read_value(records, key):
+    return records[0][key] if records else None
+
+#Gets a dictionary of the key column to the value column.
+def read_dict(records, key, value):
+    return {record[key]: record[value] for record in records}
+
+#Constraint types that make a node property unique. Neo4j 4 calls them UNIQUENESS and NODE_KEY, and Neo4j 5 calls them NODE_PROPERTY_UNIQUENESS and NODE_KEY.
+UNIQUE_CONSTRAINT_TYPES = ('UNIQUENESS', 'NODE_PROPERTY_UNIQUENESS', 'NODE_KEY')
+
+#Gets the (label, property) pairs that have a single-property uniqueness constraint on nodes.
+def read_constraints(records):
+    constraints = set()
+    for record in records:
+        if record['type'] in UNIQUE_CONSTRAINT_TYPES and len(record['properties']) == 1:
+            for label in record['labelsOrTypes']:
+                constraints.add((label, record['properties'][0]))
+    return constraints
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections import deque
+from log import bot_function_logger
+from metrics import metrics
+
+#Runs handlers for incoming messages on a fixed number of workers.
+#Every key, such as a (channel, user) pair, has its own FIFO queue, and only one of its items runs at a time, so a user's commands always run in the order they were sent.
+#When too much work is waiting, low priority items are dropped and submit waits until there is room for the rest.
+class Dispatcher:
+    def __init__(self, handler, workers=16, max_pending=1000, shed_pending=500, max_key_queue=10):
+        self.logger = bot_function_logger
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.shed_pending = min(shed_pending, max_pending)
+        self.max_key_queue = max_key_queue
+        self.queues = {}
+        self.ready = asyncio.Queue()
+        self.room = asyncio.Semaphore(max_pending)
+        self.pending = 0
+        self.handled = 0
+        self.shed = 0
+        self.delayed = 0
+
+    #Queues an item under its key. Low priority items are dropped once shed_pending items are waiting, and any item is dropped if its key already has max_key_queue waiting.
+    #Once max_pending items are waiting, this waits until one finishes. Returns False if the item was dropped.
+    async def submit(self, key, item, low_priority=False):
+        if low_priority and self.pending >= self.shed_pending:
+            self.shed += 1
+            return False
+        queue = self.queues.get(key)
+        if queue is not None and len(queue) >= self.max_key_queue:
+            self.shed += 1
+            return False
+        if self.room.locked():
+            self.delayed += 1
+            with metrics.timer('dispatch.delay'):
+                await self.room.acquire()
+            #The key's queue may have been emptied and removed while this waited.
+            queue = self.queues.get(key)
+        else:
+            await self.room.acquire()
+        self.pending += 1
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.ready.put_nowait(key)
+        queue.append((time.perf_counter(), item))
+        return True
+
+    #Gets the number of items waiting or running.
+    def get_pending(self):
+        return self.pending
+
+    #Gets the pending, handled, shed, and delayed counts, for health checks.
+    def get_stats(self):
+        return {'pending': self.pending, 'keys': len(self.queues), 'handled': self.handled, 'shed': self.shed, 'delayed': self.delayed}
+
+    #Takes a key that has work, runs its oldest item, and puts the key back at the end of the line if it has more. Runs until cancelled.
+    #A key is either waiting in ready or held by one worker, never both, which is what keeps its items in order.
+    async def work(self):
+        while True:
+            key = await self.ready.get()
+            queue = self.queues[key]
+            queued_at, item = queue.popleft()
+            metrics.observe('dispatch.wait', time.perf_counter() - queued_at)
+            try:
+                await self.handler(item)
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.info('Handling for %s failed.', key)
+            finally:
+                self.pending -= 1
+                self.handled += 1
+                self.room.release()
+                if queue:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.queues[key]
+
+    #Runs the workers. Runs until cancelled.
+    async def run(self):
+        self.logger.info('Starting %s dispatch workers.', self.workers)
+        await asyncio.gather(*(self.work() for _ in range(self.workers)))
@@ -0,0 +1,51 @@
+#Splits the raw byte stream from the server into complete IRC lines.
+#Bytes are kept in one reusable buffer until a full line has arrived, and only complete lines are decoded, so a line or a multi-byte character cut between two reads is never broken.
+class LineFramer:
+    def __init__(self, encoding='utf-8', max_line_length=8192):
+        self.encoding = encoding
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+        self.overflows = 0
+        #Set while the rest of a line that was too long is being thrown away. Nothing is framed until that line ends.
+        self.discarding = False
+
+    #Adds a chunk of bytes to the buffer and returns every complete line in it. Lines are returned as strings, or as bytes if encoding is None.
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        lines = []
+        start = 0
+        if self.discarding:
+            end = buffer.find(b'\n')
+            if end == -1:
+                buffer.clear()
+                return lines
+            start = end + 1
+            self.discarding = False
+        while True:
+            end = buffer.find(b'\n', start)
+            if end == -1:
+                break
+            line_end = end
+            #IRC lines end in \r\n, but a bare \n is accepted as well.
+            if line_end > start and buffer[line_end - 1] == 13:
+                line_end -= 1
+            #Empty lines carry nothing, so they are skipped.
+            if line_end > start:
+                if self.encoding is None:
+                    lines.append(bytes(buffer[start:line_end]))
+                else:
+                    lines.append(buffer[start:line_end].decode(self.encoding, 'replace'))
+            start = end + 1
+        if start:
+            del buffer[:start]
+        #If a line never ends, throw it away instead of letting the buffer grow forever. The rest of it is thrown away when it arrives, so its tail is never read as a line of its own.
+        if len(buffer) > self.max_line_length:
+            self.overflows += 1
+            self.discarding = True
+            buffer.clear()
+        return lines
+
+    #Gets the number of bytes waiting for the rest of their line.
+    def pending(self):
+        return len(self.buffer)
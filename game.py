@@ -10,7 +10,7 @@ class Game:
         self.logger.info('Non-singleplayer game initializing.')
         try:
             self.player_list = [*viewers]
-            self.logger.info(f'Players are: {self.player_list}')
+            self.logger.info('Players are: %s', self.player_list)
             for player in self.player_list:
                 if isinstance(player, Streamer):
                     self.streamer_playing == True
@@ -33,7 +33,7 @@ class Gamble():
             #If the player is a Viewer, create the game.
             if isinstance(player, Viewer):
                 self.player = player
-                self.logger.debug(f'Player is {self.player}.')
+                self.logger.debug('Player is %s.', self.player)
             else:
                 raise TypeError('Player must be an instance of the viewer object.')
         except Exception as e:
@@ -0,0 +1,54 @@
+import threading
+
+#Marks an attribute that has not been loaded from the database yet.
+class NotLoaded:
+    def __repr__(self):
+        return 'NOT_LOADED'
+
+    def __bool__(self):
+        return False
+
+NOT_LOADED = NotLoaded()
+
+#Makes sure only one load runs for a key at a time. Threads that ask for the same key while it is loading wait for that load and get its result.
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.loads = 0
+        self.shared = 0
+
+    #Runs the loader for the key, or waits for the load already running for it.
+    def do(self, key, loader):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = [threading.Event(), None]
+                self.calls[key] = call
+                is_leader = True
+                self.loads += 1
+            else:
+                is_leader = False
+                self.shared += 1
+        if not is_leader:
+            call[0].wait()
+            return call[1]
+        try:
+            call[1] = loader()
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call[0].set()
+        return call[1]
+
+#The loads shared by every Viewer and Streamer.
+shared_loads = SingleFlight()
+
+#Gets a lazily loaded attribute, loading it the first time it is used. Failed loads are not kept, so the next use tries again.
+def hydrate(owner, attribute, key, loader):
+    value = getattr(owner, attribute)
+    if value is NOT_LOADED:
+        value = shared_loads.do(key, loader)
+        if value is not None and value is not False:
+            setattr(owner, attribute, value)
+    return value
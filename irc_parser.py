@@ -0,0 +1,221 @@
+#Single pass IRC message parser. Works on the raw bytes of a line and supports IRCv3 tags, which twitch sends once twitch.tv/tags is requested.
+
+#Escaped characters in IRCv3 tag values.
+TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+#Chat message record used by the parse message functionality. Makes it easy to identify what parts of the message are needed for chat commands.
+#Tags are kept as raw bytes and only parsed the first time they are used.
+class Message:
+    __slots__ = ('raw_tags', '_tags', 'prefix', 'user', 'channel', 'irc_command', 'irc_args', 'text', 'text_command', 'text_args')
+    fields = ('tags', 'prefix', 'user', 'channel', 'irc_command', 'irc_args', 'text', 'text_command', 'text_args')
+
+    def __init__(self, tags=None, prefix=None, user=None, channel=None, irc_command=None, irc_args=None, text=None, text_command=None, text_args=None, raw_tags=None):
+        self.raw_tags = raw_tags
+        self._tags = tags
+        self.prefix = prefix
+        self.user = user
+        self.channel = channel
+        self.irc_command = irc_command
+        self.irc_args = irc_args
+        self.text = text
+        self.text_command = text_command
+        self.text_args = text_args
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)
+        return f'Message({fields})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.fields)
+
+    #Gets the tags as a dictionary, or None if the message has no tags.
+    @property
+    def tags(self):
+        if self._tags is None and self.raw_tags is not None:
+            self._tags = parse_tags(self.raw_tags)
+        return self._tags
+
+    #Gets a tag value, or the default if the message does not have that tag.
+    def get_tag(self, name, default=None):
+        tags = self.tags
+        if not tags:
+            return default
+        return tags.get(name, default)
+
+    #Gets the twitch user id of the sender.
+    @property
+    def user_id(self):
+        return self.get_tag('user-id')
+
+    #Gets the id of this message.
+    @property
+    def msg_id(self):
+        return self.get_tag('id')
+
+    #Gets the sender's badges as a dictionary of badge name to version.
+    @property
+    def badges(self):
+        return parse_badges(self.get_tag('badges'))
+
+    #Gets the emotes in the message as a dictionary of emote id to a list of (start, end) positions.
+    @property
+    def emotes(self):
+        return parse_emotes(self.get_tag('emotes'))
+
+
+#Removes the IRCv3 escapes from a tag value.
+def unescape_tag_value(value):
+    if '\\' not in value:
+        return value
+    result = []
+    index = 0
+    length = len(value)
+    while index < length:
+        character = value[index]
+        if character == '\\' and index + 1 < length:
+            result.append(TAG_ESCAPES.get(value[index + 1], value[index + 1]))
+            index += 2
+        #A lone backslash at the end of a value is dropped.
+        elif character == '\\':
+            index += 1
+        else:
+            result.append(character)
+            index += 1
+    return ''.join(result)
+
+#Parses the tag section of a message, without the leading @, into a dictionary.
+def parse_tags(raw_tags):
+    tags = {}
+    for tag in raw_tags.decode('utf-8', 'replace').split(';'):
+        key, separator, value = tag.partition('=')
+        tags[key] = unescape_tag_value(value) if separator else ''
+    return tags
+
+#Parses a badges tag such as 'moderator/1,subscriber/12' into a dictionary.
+def parse_badges(raw_badges):
+    badges = {}
+    if not raw_badges:
+        return badges
+    for badge in raw_badges.split(','):
+        name, _, version = badge.partition('/')
+        badges[name] = version
+    return badges
+
+#Parses an emotes tag such as '25:0-4,12-16/1902:6-10' into a dictionary.
+def parse_emotes(raw_emotes):
+    emotes = {}
+    if not raw_emotes:
+        return emotes
+    for emote in raw_emotes.split('/'):
+        emote_id, _, positions = emote.partition(':')
+        ranges = []
+        for position in positions.split(','):
+            start, _, end = position.partition('-')
+            if start and end:
+                ranges.append((int(start), int(end)))
+        emotes[emote_id] = ranges
+    return emotes
+
+#Removes unneeded twitch info from the message prefix.
+def get_user_from_prefix(prefix):
+    domain = prefix.split('!', 1)[0]
+    if domain.endswith('.tmi.twitch.tv'):
+        return domain[:-len('.tmi.twitch.tv')]
+    if '.tmi.twitch.tv' not in domain:
+        return domain
+
+#Parses a line into a Message. The line can be bytes, a bytearray, a memoryview, or a string. The command prefix can be a string, or a dict of channel to prefix.
+#A string or memoryview line is copied to bytes first, since the parser needs find. The tag section is sliced off as bytes, and only parsed when a tag is used.
+def parse_message(line, command_prefix):
+    if isinstance(line, str):
+        data = line.encode('utf-8')
+    elif isinstance(line, memoryview):
+        data = line.tobytes()
+    else:
+        data = line
+    length = len(data)
+    position = 0
+    raw_tags = None
+    prefix = None
+    user = None
+
+    #IRCv3 tags come first and start with @.
+    if length and data[0] == 64:
+        end = data.find(b' ', 1)
+        if end == -1:
+            end = length
+        raw_tags = data[1:end]
+        position = end + 1
+        while position < length and data[position] == 32:
+            position += 1
+
+    #The prefix starts with a colon.
+    if position < length and data[position] == 58:
+        end = data.find(b' ', position)
+        if end == -1:
+            end = length
+        prefix = data[position + 1:end].decode('utf-8', 'replace')
+        user = get_user_from_prefix(prefix)
+        position = end + 1
+
+    #The trailing text starts at the first argument that begins with a colon.
+    if position < length and data[position] == 58:
+        text_start = position
+        middle_end = position
+    else:
+        text_start = data.find(b' :', position)
+        middle_end = length if text_start == -1 else text_start
+        if text_start != -1:
+            text_start += 1
+    middle = data[position:middle_end].decode('utf-8', 'replace').split(' ') if middle_end > position else []
+    irc_command = middle[0] if middle else None
+    irc_args = middle[1:]
+
+    channel = None
+    for arg in irc_args:
+        if arg.startswith('#'):
+            channel = arg[1:]
+            break
+
+    #A bot in more than one channel passes a dict of channel to command prefix.
+    if isinstance(command_prefix, dict):
+        command_prefix = command_prefix.get(channel)
+
+    text = None
+    text_command = None
+    text_args = None
+    if text_start != -1:
+        text = data[text_start + 1:].decode('utf-8', 'replace')
+        if command_prefix and text.startswith(command_prefix):
+            text_parts = text.split(' ')
+            text_command = text_parts[0][len(command_prefix):]
+            text_args = text_parts[1:]
+
+    return Message(
+        raw_tags=raw_tags,
+        prefix=prefix,
+        user=user,
+        channel=channel,
+        irc_command=irc_command,
+        irc_args=irc_args,
+        text=text,
+        text_command=text_command,
+        text_args=text_args,
+    )
+
+#Gets the IRC command of a line as bytes, such as b'PING', without parsing the rest of it. Used to find control messages before they are queued.
+def get_command(data):
+    position = 0
+    #Skip the tags and the prefix.
+    if data[:1] == b'@':
+        position = data.find(b' ') + 1
+        if position == 0:
+            return b''
+    if data[position:position + 1] == b':':
+        position = data.find(b' ', position) + 1
+        if position == 0:
+            return b''
+    end = data.find(b' ', position)
+    return data[position:] if end == -1 else data[position:end]
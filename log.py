@@ -1,10 +1,26 @@
 import sys
+import os
+import atexit
 import logging
+import logging.handlers
 import datetime
+import queue
+import time
 
 #Gets the current date for use in logging.
 date_string =  str(datetime.date.today()).replace('-','_')
 
+#Log file settings. A new file is started every day, and a file that reaches LOG_MAX_BYTES is rotated to .1, .2, and so on.
+LOG_PREFIX = 'Chatbot\\logs\\'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+#The loggers that are also printed to the console.
+STREAM_LOGGERS = ('commands',)
+
+#The level every logger starts at. Use set_level or set_levels to change them while the bot runs.
+DEFAULT_LEVEL = logging.INFO
+
 #define loggers
 bot_function_logger = logging.getLogger('botfunctions')
 command_logger =  logging.getLogger('commands')
@@ -13,52 +29,133 @@ viewer_logger = logging.getLogger('viewer')
 streamer_logger = logging.getLogger('streamer')
 game_logger = logging.getLogger('games')
 
-#define file handlers
-bf_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-c_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-q_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-v_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-s_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-g_file_handler = logging.FileHandler(f'Chatbot\logs\{date_string}_Log.log')
-
-#define stream handlers
-bf_stream_handler = logging.StreamHandler(sys.stdout)
-c_stream_handler = logging.StreamHandler(sys.stdout)
-q_stream_handler = logging.StreamHandler(sys.stdout)
-v_stream_handler = logging.StreamHandler(sys.stdout)
-s_stream_handler = logging.StreamHandler(sys.stdout)
-g_stream_handler = logging.StreamHandler(sys.stdout)
+loggers = {logger.name: logger for logger in (bot_function_logger, command_logger, query_logger, viewer_logger, streamer_logger, game_logger)}
+
+#Writes to the log file for the current day, and rotates it when it gets too big.
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, prefix, maxBytes, backupCount, suffix=''):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.date_string = date_string
+        self.next_day = self.get_next_day()
+        super().__init__(self.get_filename(), maxBytes=maxBytes, backupCount=backupCount, encoding='utf-8', delay=True)
+
+    #Gets the file name for the current day.
+    def get_filename(self):
+        return f'{self.prefix}{self.date_string}_Log{self.suffix}.log'
+
+    #Gets the timestamp of the next midnight.
+    def get_next_day(self):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        return time.mktime(tomorrow.timetuple())
+
+    def shouldRollover(self, record):
+        if record.created >= self.next_day:
+            return True
+        return super().shouldRollover(record)
+
+    #Changes the suffix of the file name, and moves to the new file.
+    def set_suffix(self, suffix):
+        self.acquire()
+        try:
+            self.suffix = suffix
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(self.get_filename())
+        finally:
+            self.release()
+
+    #Starts the next day's file, or rotates the current one if it is too big.
+    def doRollover(self):
+        if time.time() >= self.next_day:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.date_string = str(datetime.date.today()).replace('-','_')
+            self.next_day = self.get_next_day()
+            self.baseFilename = os.path.abspath(self.get_filename())
+            return
+        super().doRollover()
+
+#Argument types that cannot change after the logging call, so the writer thread formats them to the same text the caller would have.
+IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+#Puts records on the queue without formatting them. The writer thread formats them, so logging costs the caller only a queue put.
+#Exception text is made right away, since the traceback may be gone by the time the writer gets to it.
+#A message with a mutable argument, such as a list or dict the caller keeps changing, is formatted right away as well, so the log shows the values at the time of the call.
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+        if not is_immutable(record):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+#Checks if a record's message and arguments are all immutable. A single dict argument is kept by logging as the args themselves.
+def is_immutable(record):
+    if not isinstance(record.msg, str):
+        return False
+    args = record.args
+    if not args:
+        return True
+    if not isinstance(args, tuple):
+        return False
+    return all(isinstance(arg, IMMUTABLE_TYPES) for arg in args)
+
+#Only lets through records from the loggers that are printed to the console.
+class StreamLoggerFilter(logging.Filter):
+    def filter(self, record):
+        return record.name in STREAM_LOGGERS
 
 #set formatters
 formatter = logging.Formatter('%(asctime)s\t%(name)s\t%(levelname)s\t%(lineno)d\t%(message)s')
 
-#set formatter to handlers
-bf_file_handler.setFormatter(formatter)
-bf_stream_handler.setFormatter(formatter)
-c_file_handler.setFormatter(formatter)
-c_stream_handler.setFormatter(formatter)
-q_file_handler.setFormatter(formatter)
-q_stream_handler.setFormatter(formatter)
-v_file_handler.setFormatter(formatter)
-v_stream_handler.setFormatter(formatter)
-s_file_handler.setFormatter(formatter)
-s_stream_handler.setFormatter(formatter)
-g_file_handler.setFormatter(formatter)
-g_stream_handler.setFormatter(formatter)
+#One handler per destination, shared by every logger.
+file_handler = DailyRotatingFileHandler(LOG_PREFIX, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+file_handler.setFormatter(formatter)
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(formatter)
+stream_handler.addFilter(StreamLoggerFilter())
+
+#Every logger puts its records on one queue, and one writer thread sends them to the handlers.
+log_queue = queue.SimpleQueue()
+queue_handler = LazyQueueHandler(log_queue)
+listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
 
 #set handlers to loggers
-bot_function_logger.addHandler(bf_file_handler)
-command_logger.addHandler(c_file_handler)
-command_logger.addHandler(c_stream_handler)
-query_logger.addHandler(q_file_handler)
-viewer_logger.addHandler(v_file_handler)
-streamer_logger.addHandler(v_file_handler)
-game_logger.addHandler(g_file_handler)
-
-#set logging levels
-bot_function_logger.setLevel(10)
-command_logger.setLevel(10)
-query_logger.setLevel(10)
-viewer_logger.setLevel(10)
-streamer_logger.setLevel(10)
-game_logger.setLevel(10)
\ No newline at end of file
+for logger in loggers.values():
+    logger.addHandler(queue_handler)
+    logger.setLevel(DEFAULT_LEVEL)
+    logger.propagate = False
+
+#Sets the level of one logger. The level can be a name such as 'DEBUG' or a number. Returns False if there is no such logger or level.
+def set_level(name, level):
+    logger = loggers.get(name)
+    if logger is None:
+        return False
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            return False
+    logger.setLevel(level)
+    return True
+
+#Sets the levels of several loggers from a dict of logger names to levels, such as LOG_LEVELS in config.py.
+def set_levels(levels):
+    for name, level in levels.items():
+        if set_level(name, level) == False:
+            bot_function_logger.warning('Could not set log level %s for %s.', level, name)
+
+#Adds a suffix to the log file name, so processes running at the same time, such as supervisor workers, each rotate their own file.
+def set_file_suffix(suffix):
+    file_handler.set_suffix(f'_{suffix}')
+
+#Gets the current level name of every logger.
+def get_levels():
+    return {name: logging.getLevelName(logger.level) for name, logger in loggers.items()}
+
+#Start the writer thread, and write everything still queued when the process exits.
+listener.start()
+atexit.register(listener.stop)
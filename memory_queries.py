@@ -0,0 +1,434 @@
+import asyncio
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from log import query_logger
+from chat4j_queries import BotQueries, SCHEMA_CONSTRAINTS, async_pool_metrics
+from chat4j_async_queries import AsyncBotQueries
+from metrics import instrument_class
+import config
+
+#In-memory backend settings. These can be set in config.py. Every transaction waits MEMORY_BACKEND_LATENCY_MS plus up to MEMORY_BACKEND_JITTER_MS, to act like a round trip to the database.
+#MEMORY_BACKEND_FILE is an optional JSON file of people, genres, and relationships to start with, in the format MemoryGraph.dump returns.
+MEMORY_BACKEND_SETTINGS = {
+    'latency_ms': getattr(config, 'MEMORY_BACKEND_LATENCY_MS', 0),
+    'jitter_ms': getattr(config, 'MEMORY_BACKEND_JITTER_MS', 0),
+}
+MEMORY_BACKEND_FILE = getattr(config, 'MEMORY_BACKEND_FILE', None)
+
+#The driver shared by every MemoryBotQueries and AsyncMemoryBotQueries object, so the whole process sees one graph.
+shared_memory_driver = None
+memory_driver_lock = threading.Lock()
+
+#Gets today's date the way the queries store it.
+def today():
+    return str(datetime.date.today())
+
+#The graph the in-memory backend keeps. Person and Genre nodes are dicts keyed by username and genre, and each relationship type is kept as adjacency sets in both directions, so every lookup is a dict access instead of a scan.
+#Each method does the same thing as the Cypher in the BotQueries function with the same name.
+class MemoryGraph:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    #Removes every node and relationship.
+    def clear(self):
+        with self.lock:
+            self.people = {}
+            self.genres = set()
+            #views[viewer][streamer] is the :VIEWS relationship, and viewers[streamer] is the set of viewers pointing at the streamer.
+            self.views = {}
+            self.viewers = {}
+            #friends[user] is the users they have an :IS_FRIENDS relationship to, and friended_by[user] is the users who have one to them.
+            self.friends = {}
+            self.friended_by = {}
+            #likes[user] is the genres they like, and liked_by[genre] is the users who like it.
+            self.likes = {}
+            self.liked_by = {}
+            self.ledger_batches = {}
+
+    #Adds people, genres, and relationships from a dict in the format dump returns.
+    def load(self, data):
+        with self.lock:
+            for username, properties in data.get('people', {}).items():
+                self.people[username] = {'created_on': properties.get('created_on'), 'query_count': properties.get('query_count')}
+            self.genres.update(data.get('genres', []))
+            for viewer, streamer, points in data.get('views', []):
+                self.merge_views(viewer, streamer, points)
+            for username1, username2 in data.get('friends', []):
+                self.add_friendship(username1, username2)
+            for username, genre in data.get('likes', []):
+                self.set_likes_genre(username, genre)
+
+    #Gets every node and relationship as a dict that can be saved as JSON and passed to load.
+    def dump(self):
+        with self.lock:
+            return {
+                'people': {username: dict(properties) for username, properties in self.people.items()},
+                'genres': sorted(self.genres),
+                'views': [[viewer, streamer, relationship['points']] for viewer, streamers in self.views.items() for streamer, relationship in streamers.items()],
+                'friends': [[username1, username2] for username1, friends in self.friends.items() for username2 in friends],
+                'likes': [[username, genre] for username, genres in self.likes.items() for genre in genres],
+            }
+
+    #Creates a :VIEWS relationship, or sets the points on the one that exists. Must be called with the lock held.
+    def merge_views(self, viewer, streamer, points):
+        relationship = self.views.setdefault(viewer, {}).get(streamer)
+        if relationship is None:
+            self.views[viewer][streamer] = {'created_on': today(), 'points': points}
+            self.viewers.setdefault(streamer, set()).add(viewer)
+        else:
+            relationship['points'] = points
+
+    def remove_user(self, username):
+        with self.lock:
+            if self.people.pop(username, None) is None:
+                return
+            for streamer in self.views.pop(username, {}):
+                self.viewers[streamer].discard(username)
+            for viewer in self.viewers.pop(username, set()):
+                self.views[viewer].pop(username, None)
+            for friend in self.friends.pop(username, set()):
+                self.friended_by[friend].discard(username)
+            for friend in self.friended_by.pop(username, set()):
+                self.friends[friend].discard(username)
+            for genre in self.likes.pop(username, set()):
+                self.liked_by[genre].discard(username)
+
+    def add_user(self, username):
+        with self.lock:
+            self.people[username] = {'created_on': today(), 'query_count': 1}
+
+    def add_friendship(self, username1, username2):
+        with self.lock:
+            if username1 in self.people and username2 in self.people:
+                self.friends.setdefault(username1, set()).add(username2)
+                self.friended_by.setdefault(username2, set()).add(username1)
+
+    #Friendships are read in both directions, like the undirected MATCH.
+    def get_friends(self, username):
+        with self.lock:
+            friends = list(self.friends.get(username, ()))
+            friends.extend(friend for friend in self.friended_by.get(username, ()) if friend not in self.friends.get(username, ()))
+            return friends
+
+    def all_user(self):
+        with self.lock:
+            return list(self.people)
+
+    def get_stats(self, username, streamer):
+        with self.lock:
+            person = self.people.get(username)
+            if person is None:
+                return {}
+            if streamer != username:
+                relationship = self.views.get(username, {}).get(streamer)
+                if relationship is None:
+                    return {}
+                return {'created_on': str(person['created_on']), 'query_count': person['query_count'], 'points': relationship['points']}
+            return {'created_on': str(person['created_on']), 'query_count': person['query_count']}
+
+    def increase_query_count(self, username, count=1):
+        with self.lock:
+            person = self.people.get(username)
+            if person is not None and person['query_count'] is not None:
+                person['query_count'] += count
+
+    def get_genres(self):
+        with self.lock:
+            return list(self.genres)
+
+    def set_likes_genre(self, username, genre):
+        with self.lock:
+            if username in self.people and genre in self.genres:
+                self.likes.setdefault(username, set()).add(genre)
+                self.liked_by.setdefault(genre, set()).add(username)
+
+    def get_liked_genres(self, username):
+        with self.lock:
+            return list(self.likes.get(username, ()))
+
+    #Creates the person if they do not exist. The :VIEWS relationship and the person's stats are only set if the streamer exists.
+    def create_user_views(self, username1, username2):
+        with self.lock:
+            if username1 not in self.people:
+                self.people[username1] = {'created_on': today(), 'query_count': 1}
+            if username2 in self.people and username2 not in self.views.get(username1, {}):
+                self.merge_views(username1, username2, 100)
+
+    def create_views(self, username1, username2):
+        with self.lock:
+            if username1 in self.people and username2 in self.people and username2 not in self.views.get(username1, {}):
+                self.merge_views(username1, username2, 100)
+
+    def get_viewers(self, username):
+        with self.lock:
+            if username not in self.people:
+                return []
+            return list(self.viewers.get(username, ()))
+
+    #Counts how many viewers of the streamer like each genre, most liked first.
+    def get_viewer_liked_genres(self, username):
+        with self.lock:
+            counts = {}
+            for viewer in self.viewers.get(username, ()):
+                for genre in self.likes.get(viewer, ()):
+                    counts[genre] = counts.get(genre, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def get_query_count_leader(self, username):
+        with self.lock:
+            counts = [(self.people[viewer]['query_count'], viewer) for viewer in self.viewers.get(username, ()) if self.people[viewer]['query_count'] is not None]
+        if not counts:
+            return {}
+        count, viewer = max(counts)
+        return {viewer: count}
+
+    def onboard_viewers(self, usernames, streamer):
+        with self.lock:
+            for username in usernames:
+                if username not in self.people:
+                    self.people[username] = {'created_on': today(), 'query_count': 1}
+                if streamer in self.people and streamer not in self.views.get(username, {}):
+                    self.merge_views(username, streamer, 100)
+
+    #Adds each points delta, unless the batch is not newer than the last batch applied from the same ledger. Returns the ledger's last batch id.
+    def add_points(self, rows, batch, ledger):
+        with self.lock:
+            if self.ledger_batches.get(ledger, 0) >= batch:
+                return self.ledger_batches[ledger]
+            self.ledger_batches[ledger] = batch
+            for row in rows:
+                relationship = self.views.get(row['username'], {}).get(row['streamer'])
+                if relationship is not None:
+                    relationship['points'] = (relationship['points'] or 0) + row['delta']
+            return batch
+
+#A session on the in-memory graph. Each transaction waits for the driver's latency, then runs the query function with no transaction.
+class MemorySession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute_read(self, function, *args):
+        time.sleep(self.driver.get_delay())
+        return function(None, *args)
+
+    def execute_write(self, function, *args):
+        time.sleep(self.driver.get_delay())
+        return function(None, *args)
+
+    def close(self):
+        pass
+
+#The async version of MemorySession. The latency is awaited, so other handlers run while a transaction waits.
+class AsyncMemorySession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def execute_read(self, function, *args):
+        await asyncio.sleep(self.driver.get_delay())
+        return await function(None, *args)
+
+    async def execute_write(self, function, *args):
+        await asyncio.sleep(self.driver.get_delay())
+        return await function(None, *args)
+
+    async def close(self):
+        pass
+
+#Stands in for the Neo4j driver. Holds the graph and the latency every transaction waits for.
+class MemoryDriver:
+    def __init__(self, latency_ms=0, jitter_ms=0):
+        self.graph = MemoryGraph()
+        self.transactions = 0
+        self.set_latency(latency_ms, jitter_ms)
+
+    #Sets the latency every transaction waits for. The jitter is a random extra wait of up to jitter_ms.
+    def set_latency(self, latency_ms, jitter_ms=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+
+    #Gets how long the next transaction waits, and counts it.
+    def get_delay(self):
+        self.transactions += 1
+        if self.jitter:
+            return self.latency + random.uniform(0, self.jitter)
+        return self.latency
+
+    def session(self):
+        return MemorySession(self)
+
+#Gets the shared in-memory driver, creating it the first time it is needed.
+def get_memory_driver():
+    global shared_memory_driver
+    with memory_driver_lock:
+        if shared_memory_driver is None:
+            shared_memory_driver = MemoryDriver(**MEMORY_BACKEND_SETTINGS)
+            if MEMORY_BACKEND_FILE and os.path.exists(MEMORY_BACKEND_FILE):
+                with open(MEMORY_BACKEND_FILE, 'r') as file:
+                    shared_memory_driver.graph.load(json.load(file))
+                query_logger.info('Loaded in-memory graph from %s.', MEMORY_BACKEND_FILE)
+            query_logger.info('In-memory backend initialized. Settings: %s', MEMORY_BACKEND_SETTINGS)
+        return shared_memory_driver
+
+#BotQueries on the in-memory graph instead of Neo4j. Only the Query functions are replaced, so the Run functions, the read cache, and the write-behind batcher work the same on both backends.
+class MemoryBotQueries(BotQueries):
+    def __init__(self):
+        self.driver = get_memory_driver()
+        self.graph = self.driver.graph
+
+    def Query_remove_user(self, tx, username):
+        self.graph.remove_user(username)
+
+    def Query_add_user(self, tx, username):
+        self.graph.add_user(username)
+
+    def Query_add_friendship(self, tx, username1, username2):
+        self.graph.add_friendship(username1, username2)
+
+    def Query_get_friends(self, tx, username):
+        return self.graph.get_friends(username)
+
+    def Query_all_user(self, tx):
+        return self.graph.all_user()
+
+    def Query_get_stats(self, tx, username, streamer):
+        return self.graph.get_stats(username, streamer)
+
+    def Query_increase_query_count(self, tx, username):
+        self.graph.increase_query_count(username)
+
+    def Query_get_genres(self, tx):
+        return self.graph.get_genres()
+
+    def Query_set_likes_genre(self, tx, username, genre):
+        self.graph.set_likes_genre(username, genre)
+
+    def Query_get_liked_genres(self, tx, username):
+        return self.graph.get_liked_genres(username)
+
+    def Query_create_user_views(self, tx, username1, username2):
+        self.graph.create_user_views(username1, username2)
+
+    def Query_create_views(self, tx, username1, username2):
+        self.graph.create_views(username1, username2)
+
+    def Query_viewers(self, tx, username):
+        return self.graph.get_viewers(username)
+
+    def Query_get_viewer_liked_genres(self, tx, username):
+        return self.graph.get_viewer_liked_genres(username)
+
+    def Query_get_query_count_leader(self, tx, username):
+        return self.graph.get_query_count_leader(username)
+
+    def Query_onboard_viewers(self, tx, usernames, streamer):
+        self.graph.onboard_viewers(usernames, streamer)
+
+    def Query_batch_increase_query_count(self, tx, rows):
+        for row in rows:
+            self.graph.increase_query_count(row['username'], row['count'])
+
+    def Query_batch_add_friendship(self, tx, rows):
+        for row in rows:
+            self.graph.add_friendship(row['username1'], row['username2'])
+
+    def Query_batch_set_likes_genre(self, tx, rows):
+        for row in rows:
+            self.graph.set_likes_genre(row['username'], row['genre'])
+
+    def Query_batch_add_points(self, tx, rows, batch, ledger):
+        return self.graph.add_points(rows, batch, ledger)
+
+    def Query_batch_create_views(self, tx, rows):
+        for row in rows:
+            self.graph.create_views(row['username1'], row['username2'])
+
+    #The graph is always keyed by username and genre, so it has every constraint.
+    def Query_create_constraint(self, tx, name, label, property):
+        return None
+
+    def Query_get_constraints(self, tx):
+        return {(label, property) for name, label, property in SCHEMA_CONSTRAINTS}
+
+#AsyncBotQueries on the in-memory graph. It shares the graph with MemoryBotQueries.
+class AsyncMemoryBotQueries(AsyncBotQueries):
+    def __init__(self):
+        self.driver = get_memory_driver()
+        self.graph = self.driver.graph
+
+    #Opens a session on the in-memory graph and records its use in the async pool's metrics.
+    @asynccontextmanager
+    async def open_session(self):
+        async_pool_metrics.opened()
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield AsyncMemorySession(self.driver)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            async_pool_metrics.closed(time.perf_counter() - start, failed)
+
+    async def Query_remove_user(self, tx, username):
+        self.graph.remove_user(username)
+
+    async def Query_add_user(self, tx, username):
+        self.graph.add_user(username)
+
+    async def Query_add_friendship(self, tx, username1, username2):
+        self.graph.add_friendship(username1, username2)
+
+    async def Query_get_friends(self, tx, username):
+        return self.graph.get_friends(username)
+
+    async def Query_all_user(self, tx):
+        return self.graph.all_user()
+
+    async def Query_get_stats(self, tx, username, streamer):
+        return self.graph.get_stats(username, streamer)
+
+    async def Query_increase_query_count(self, tx, username):
+        self.graph.increase_query_count(username)
+
+    async def Query_get_genres(self, tx):
+        return self.graph.get_genres()
+
+    async def Query_set_likes_genre(self, tx, username, genre):
+        self.graph.set_likes_genre(username, genre)
+
+    async def Query_get_liked_genres(self, tx, username):
+        return self.graph.get_liked_genres(username)
+
+    async def Query_create_user_views(self, tx, username1, username2):
+        self.graph.create_user_views(username1, username2)
+
+    async def Query_create_views(self, tx, username1, username2):
+        self.graph.create_views(username1, username2)
+
+    async def Query_viewers(self, tx, username):
+        return self.graph.get_viewers(username)
+
+    async def Query_get_viewer_liked_genres(self, tx, username):
+        return self.graph.get_viewer_liked_genres(username)
+
+    async def Query_get_query_count_leader(self, tx, username):
+        return self.graph.get_query_count_leader(username)
+
+    async def Query_onboard_viewers(self, tx, usernames, streamer):
+        self.graph.onboard_viewers(usernames, streamer)
+
+#Time every Query function. The Run functions are timed by the classes they come from.
+instrument_class(MemoryBotQueries, 'query')
+instrument_class(AsyncMemoryBotQueries, 'async_query')
@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+#The upper edges of the latency buckets, in seconds. Each one is double the one before, from 50 microseconds to about 3.5 minutes.
+BUCKETS = tuple(0.00005 * 2 ** exponent for exponent in range(23))
+
+#Counts and a bucketed histogram of latencies for one name. Recording is a bisect and a few additions, so it can stay on in production.
+class LatencyHistogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    #Gets the latency that the given fraction of the recordings are at or under. Accurate to the bucket it falls in.
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+#Keeps a histogram for every name that has been recorded, such as 'command.gamble' or 'query.Run_get_stats'.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.started = time.monotonic()
+        self.last_summary = self.started
+        self.last_counts = {}
+
+    #Records one latency for a name.
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    #Times a block of code and records it under the name.
+    def timer(self, name):
+        return Timer(self, name)
+
+    #Gets the count, throughput, and latencies in milliseconds for every name.
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {name: {
+                'count': histogram.count,
+                'per_second': histogram.count / elapsed,
+                'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                'p50_ms': histogram.percentile(0.5) * 1000,
+                'p90_ms': histogram.percentile(0.9) * 1000,
+                'p99_ms': histogram.percentile(0.99) * 1000,
+                'max_ms': histogram.max * 1000,
+            } for name, histogram in self.histograms.items()}
+
+    #Gets one line with the count and rate of each name since the last summary, and its latencies since the start, busiest names first.
+    def summary(self, limit=15):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = max(now - self.last_summary, 1e-9)
+            self.last_summary = now
+            rows = []
+            for name, histogram in self.histograms.items():
+                new = histogram.count - self.last_counts.get(name, 0)
+                self.last_counts[name] = histogram.count
+                if new:
+                    rows.append((new, name, histogram))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        parts = [f'{name} n={new} {new / elapsed:.1f}/s p50={histogram.percentile(0.5) * 1000:.1f}ms p99={histogram.percentile(0.99) * 1000:.1f}ms' for new, name, histogram in rows[:limit]]
+        return f'Metrics over {elapsed:.0f}s: ' + ('; '.join(parts) if parts else 'no activity')
+
+    #Clears every histogram.
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.last_counts = {}
+            self.started = self.last_summary = time.monotonic()
+
+#Context manager that records how long its block took.
+class Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+#The metrics shared by the whole bot.
+metrics = Metrics()
+
+#Gets the count, throughput, and latencies for everything recorded.
+def get_metrics_snapshot():
+    return metrics.snapshot()
+
+#Wraps a function so every call is timed under the name. Works for plain functions and coroutine functions.
+def timed(name, function):
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+    return wrapper
+
+#Times every method of a class whose name starts with one of the prefixes, such as the Run_ and Query_ functions.
+def instrument_class(cls, label, prefixes=('Run_', 'Query_')):
+    for name, function in list(vars(cls).items()):
+        if callable(function) and name.startswith(prefixes):
+            setattr(cls, name, timed(f'{label}.{name}', function))
+    return cls
+
+#Logs a summary line on the interval. Runs until cancelled.
+async def report_loop(logger, interval):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info('%s', metrics.summary())
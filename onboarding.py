@@ -0,0 +1,43 @@
+import asyncio
+from log import bot_function_logger
+
+#Collects JOIN messages for a short window and hands them to process_batch together, so a burst of joiners costs a few queries instead of several per viewer.
+class JoinOnboarder:
+    def __init__(self, process_batch, window_ms=250, max_batch=200):
+        self.logger = bot_function_logger
+        self.process_batch = process_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.batches = 0
+        self.joins = 0
+
+    #Adds a JOIN message to the current batch. Must be called from the event loop.
+    def submit(self, message):
+        self.pending.append(message)
+        self.wakeup.set()
+
+    #Gets the number of JOIN messages waiting for the next batch.
+    def get_pending(self):
+        return len(self.pending)
+
+    #Waits for JOIN messages, lets the window fill up, and processes them as one batch. Runs until cancelled.
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            #Give the rest of the burst time to arrive, unless the batch is already full.
+            if len(self.pending) < self.max_batch:
+                await asyncio.sleep(self.window)
+            batch = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+            if not self.pending:
+                self.wakeup.clear()
+            self.batches += 1
+            self.joins += len(batch)
+            self.logger.info('Onboarding batch of %s JOIN messages.', len(batch))
+            try:
+                await self.process_batch(batch)
+            except Exception as e:
+                self.logger.error(e)
+                self.logger.info('Onboarding batch of %s failed.', len(batch))
@@ -0,0 +1,212 @@
+import atexit
+import json
+import os
+import threading
+import time
+from log import query_logger
+
+#Keeps every points change in an append-only journal on disk, and adds the changes to the database in batches.
+#Each batch of changes is a journal segment with its own batch id. A segment is deleted once the database has it, and segments left over from a crash are applied again on start.
+#The database keeps the id of the last batch it applied under the ledger's name, so a segment that was applied just before a crash is not applied twice. Every journal needs its own name.
+class PointsLedger:
+    def __init__(self, queries, journal_dir, name='points', flush_interval_ms=1000, max_items=500, fsync=False):
+        self.logger = query_logger
+        self.queries = queries
+        self.name = name
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_items = max_items
+        self.fsync = fsync
+        self.pending = {}
+        self.pending_records = 0
+        #Segments that have been closed but are not in the database yet, oldest first. Each one is [batch, path, deltas].
+        self.segments = []
+        self.journal = None
+        self.journal_batch = None
+        self.journal_path = None
+        self.last_batch = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        #Held while a batch is applied to the database, and while a viewer's saved points are read with the changes not saved yet.
+        self.commit_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.counters = {'records': 0, 'transfers': 0, 'written': 0, 'batches': 0, 'failed': 0, 'skipped': 0, 'recovered': 0}
+
+    #Loads any segments left from the last run, opens a new journal, and starts the flush thread.
+    def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.recover()
+        with self.lock:
+            self.open_journal()
+        self.thread = threading.Thread(target=self.flush_loop, name='points-ledger', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    #Gets a batch id that is newer than every batch before it, even across restarts.
+    def next_batch(self):
+        self.last_batch = max(time.time_ns(), self.last_batch + 1)
+        return self.last_batch
+
+    #Opens a new journal segment. Must be called with the lock held.
+    def open_journal(self):
+        self.journal_batch = self.next_batch()
+        self.journal_path = os.path.join(self.journal_dir, f'points_{self.journal_batch}.journal')
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    #Reads the deltas from a journal segment. A line cut off by a crash is skipped.
+    def read_segment(self, path):
+        deltas = {}
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.logger.warning('Skipping unreadable line in %s.', path)
+                    continue
+                for username, delta in record['d']:
+                    key = (username, record['s'])
+                    deltas[key] = deltas.get(key, 0) + delta
+        return deltas
+
+    #Queues the segments left from the last run so the next flush applies them.
+    def recover(self):
+        for name in os.listdir(self.journal_dir):
+            if not (name.startswith('points_') and name.endswith('.journal')):
+                continue
+            batch = int(name[len('points_'):-len('.journal')])
+            path = os.path.join(self.journal_dir, name)
+            self.segments.append([batch, path, self.read_segment(path)])
+            self.last_batch = max(self.last_batch, batch)
+            self.counters['recovered'] += 1
+        #Batches have to be applied in order.
+        self.segments.sort(key=lambda segment: segment[0])
+        if self.segments:
+            self.logger.info('Recovered %s points journal segments.', len(self.segments))
+            self.flush()
+
+    #Writes one record to the journal and adds it to the pending changes. Every change in a record is applied in the same transaction.
+    def record(self, streamer, changes):
+        with self.lock:
+            if self.journal is None:
+                self.logger.error('Points ledger is closed. Points change was not saved.')
+                return False
+            self.journal.write(json.dumps({'s': streamer, 'd': changes}) + '\n')
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+            for username, delta in changes:
+                key = (username, streamer)
+                self.pending[key] = self.pending.get(key, 0) + delta
+            self.pending_records += 1
+            self.counters['records'] += 1
+            if self.pending_records >= self.max_items:
+                self.wakeup.set()
+        return True
+
+    #Adds delta points to a viewer of a streamer. Use a negative delta to take points away.
+    def add(self, username, streamer, delta):
+        return self.record(streamer, [[username, delta]])
+
+    #Moves points from one viewer to another as one record, so both sides are saved together or not at all.
+    def transfer(self, from_user, to_user, streamer, amount):
+        with self.lock:
+            self.counters['transfers'] += 1
+        return self.record(streamer, [[from_user, -amount], [to_user, amount]])
+
+    #Gets the points change for a viewer that is not in the database yet.
+    def get_unsaved(self, username, streamer):
+        key = (username, streamer)
+        with self.lock:
+            return self.pending.get(key, 0) + sum(segment[2].get(key, 0) for segment in self.segments)
+
+    #Reads a viewer's stats from the database with read, and adds the points changes the database does not have yet.
+    #No batch is applied between the read and the count of unsaved changes, so a batch is never counted twice or missed.
+    def load_stats(self, read, username, streamer):
+        with self.commit_lock:
+            stats = read()
+            if stats and stats.get('points') is not None:
+                stats['points'] += self.get_unsaved(username, streamer)
+            return stats
+
+    #Gets a copy of the counters.
+    def get_counters(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters['pending'] = self.pending_records
+            counters['segments'] = len(self.segments)
+            return counters
+
+    #Closes the current journal segment and applies every closed segment to the database, oldest first. Stops at the first one that fails, so batches are never applied out of order.
+    #A segment the database skipped, because its ledger already has a newer batch, is kept on disk as a .skipped file instead of being deleted.
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if self.pending_records and self.journal is not None:
+                    self.journal.close()
+                    self.segments.append([self.journal_batch, self.journal_path, self.pending])
+                    self.pending = {}
+                    self.pending_records = 0
+                    self.open_journal()
+                segments = list(self.segments)
+            for batch, path, deltas in segments:
+                rows = [{'username': username, 'streamer': streamer, 'delta': delta} for (username, streamer), delta in deltas.items() if delta]
+                #A batch is written and taken off the unsaved changes while the commit lock is held, so load_stats never sees it in both places or in neither.
+                with self.commit_lock:
+                    applied = True
+                    try:
+                        if rows:
+                            with self.queries.open_session() as session:
+                                result = session.execute_write(self.queries.Query_batch_add_points, rows, batch, self.name)
+                            #Query functions return False when the query fails.
+                            if result == False:
+                                raise ValueError(f'Points batch {batch} query returned false.')
+                            #The ledger's last batch is this one only if the database has it.
+                            applied = result == batch
+                        if applied:
+                            os.remove(path)
+                        else:
+                            self.logger.warning('Points batch %s was not applied, since ledger %s already has batch %s. Keeping it as a .skipped file.', batch, self.name, result)
+                            os.replace(path, path[:-len('.journal')] + '.skipped')
+                    except Exception as e:
+                        self.logger.error(e)
+                        with self.lock:
+                            self.counters['failed'] += 1
+                        return False
+                    with self.lock:
+                        self.segments.pop(0)
+                        if applied:
+                            self.counters['written'] += len(rows)
+                            self.counters['batches'] += 1
+                        else:
+                            self.counters['skipped'] += 1
+        return True
+
+    #Flushes on the interval, or early when enough records are waiting.
+    def flush_loop(self):
+        while not self.stopped:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(e)
+
+    #Stops the flush thread and tries one last flush. Anything that could not be saved stays in the journal for the next start. Safe to call more than once.
+    def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+                #Do not leave an empty segment behind.
+                if not self.pending_records:
+                    os.remove(self.journal_path)
+        self.logger.info('Points ledger closed. Counters: %s', self.get_counters())
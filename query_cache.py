@@ -0,0 +1,61 @@
+import copy
+import threading
+import time
+
+#A read-through cache for read queries. Results are kept by query name and arguments for that query's TTL, or until a write that changes them invalidates the query.
+#Results are copied in and out, so callers can change the lists and dicts they get back without changing the cache.
+class QueryCache:
+    def __init__(self, ttls, max_entries=1024, clock=time.monotonic):
+        self.ttls = dict(ttls)
+        self.clock = clock
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.counters = {name: {'hits': 0, 'misses': 0, 'invalidations': 0} for name in self.ttls}
+
+    #Looks up a cached result. Returns a tuple of whether it was found and the result.
+    def lookup(self, name, *args):
+        if name not in self.ttls:
+            return False, None
+        with self.lock:
+            entry = self.entries.get((name, args))
+            if entry is None or entry[0] <= self.clock():
+                self.counters[name]['misses'] += 1
+                return False, None
+            self.counters[name]['hits'] += 1
+            return True, copy.copy(entry[1])
+
+    #Stores a result. Failed results (None or False) are not cached.
+    def store(self, name, args, value):
+        if name not in self.ttls or value is None or value is False:
+            return
+        now = self.clock()
+        with self.lock:
+            #Drop expired results before going over the limit, then the oldest ones if that is not enough.
+            if len(self.entries) >= self.max_entries:
+                for key in [key for key, entry in self.entries.items() if entry[0] <= now]:
+                    del self.entries[key]
+                while len(self.entries) >= self.max_entries:
+                    del self.entries[next(iter(self.entries))]
+            self.entries[(name, args)] = (now + self.ttls[name], copy.copy(value))
+
+    #Drops every cached result for the given queries.
+    def invalidate(self, *names):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] in names]:
+                del self.entries[key]
+            for name in names:
+                if name in self.counters:
+                    self.counters[name]['invalidations'] += 1
+
+    #Drops every cached result.
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    #Gets a copy of the hit, miss, and invalidation counts for each query, and the number of cached results.
+    def get_counters(self):
+        with self.lock:
+            counters = {name: dict(counts) for name, counts in self.counters.items()}
+            counters['entries'] = len(self.entries)
+            return counters
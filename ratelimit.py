@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from metrics import metrics
+
+#Message limits as (messages, seconds). The account limit is shared by every channel, the channel limit applies to each channel on its own.
+RATE_LIMIT_TIERS = {
+    'normal': {'account': (20, 30), 'channel': (1, 1)},
+    'moderator': {'account': (100, 30), 'channel': (100, 30)},
+    'verified': {'account': (7500, 30), 'channel': (100, 30)},
+}
+
+#A sliding window limit. Allows at most limit sends in any period seconds, by keeping the time of every send in the last period.
+#A token bucket that starts full can send its whole burst and then refill it within one period, which is up to twice the limit, so twitch's limits are kept this way instead.
+class SendWindow:
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+
+    #Forgets the sends that are older than one period.
+    def expire(self, now):
+        sent = self.sent
+        while sent and sent[0] <= now - self.period:
+            sent.popleft()
+
+    #Gets the number of seconds until another send is allowed. Returns 0 if one is allowed now.
+    def wait_time(self, now):
+        self.expire(now)
+        if len(self.sent) < self.limit:
+            return 0
+        return self.sent[0] + self.period - now
+
+    #Records a send. Only call this after wait_time returned 0.
+    def take(self, now):
+        self.sent.append(now)
+
+#Gets the (messages, seconds) account limit for a share of the account. The share is rounded down to whole messages, and a share smaller than one message is sent as one message over a longer period.
+def get_account_limit(tier, share=1):
+    messages, seconds = RATE_LIMIT_TIERS[tier]['account']
+    messages *= share
+    if messages < 1:
+        return 1, seconds / messages
+    return int(messages), seconds
+
+#Queues outgoing chat messages and sends them as fast as the account and channel send windows allow.
+#When several processes send as the same account, each one gets account_share of the account limit, so together they stay under it.
+class OutboundScheduler:
+    def __init__(self, transport, tier='normal', max_queue=500, max_channel_queue=None, account_share=1, clock=time.monotonic):
+        self.transport = transport
+        self.clock = clock
+        self.tier = tier
+        self.max_queue = max_queue
+        #The most lines one channel can have waiting, so a busy channel cannot fill the queue for every other channel.
+        self.max_channel_queue = max_channel_queue or max_queue
+        self.account_window = SendWindow(*get_account_limit(tier, account_share))
+        self.channel_tiers = {}
+        self.channel_windows = {}
+        self.channel_queues = {}
+        self.depth = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.loop = None
+        self.wakeup = None
+
+    #Sets the tier used for a channel's send window. Used for channels the bot moderates.
+    def set_channel_tier(self, channel, tier):
+        with self.lock:
+            self.channel_tiers[channel] = tier
+            self.channel_windows[channel] = SendWindow(*RATE_LIMIT_TIERS[tier]['channel'])
+
+    #Gets the number of queued messages, for every channel or for the given channel.
+    def get_depth(self, channel=None):
+        with self.lock:
+            if channel is None:
+                return self.depth
+            return len(self.channel_queues.get(channel, ()))
+
+    #Queues a line for the given channel and returns right away. Returns False if the queue is full and the line was dropped.
+    def submit(self, channel, line):
+        with self.lock:
+            if self.depth >= self.max_queue:
+                self.dropped += 1
+                return False
+            if channel not in self.channel_queues:
+                self.channel_queues[channel] = deque()
+            if len(self.channel_queues[channel]) >= self.max_channel_queue:
+                self.dropped += 1
+                return False
+            if channel not in self.channel_windows:
+                tier = self.channel_tiers.get(channel, self.tier)
+                self.channel_windows[channel] = SendWindow(*RATE_LIMIT_TIERS[tier]['channel'])
+            #The time is kept with the line so the send loop can record how long it waited.
+            self.channel_queues[channel].append((self.clock(), line))
+            self.depth += 1
+        self.wake()
+        return True
+
+    #Wakes the send loop. This can be called from the event loop or from a worker thread.
+    def wake(self):
+        loop, wakeup = self.loop, self.wakeup
+        if loop is None or wakeup is None:
+            return
+        loop.call_soon_threadsafe(wakeup.set)
+
+    #Takes the next line that the send windows allow, going through the channels in turn. Returns the line, or the number of seconds to wait.
+    def next_line(self):
+        now = self.clock()
+        with self.lock:
+            if self.depth == 0:
+                return None, None
+            account_wait = self.account_window.wait_time(now)
+            if account_wait > 0:
+                return None, account_wait
+            wait = None
+            for channel in list(self.channel_queues):
+                queue = self.channel_queues[channel]
+                if not queue:
+                    continue
+                window = self.channel_windows[channel]
+                channel_wait = window.wait_time(now)
+                if channel_wait > 0:
+                    wait = channel_wait if wait is None else min(wait, channel_wait)
+                    continue
+                window.take(now)
+                self.account_window.take(now)
+                queued_at, line = queue.popleft()
+                self.depth -= 1
+                metrics.observe('send.queue_wait', now - queued_at)
+                #Move the channel to the back so the other channels get a turn.
+                del self.channel_queues[channel]
+                self.channel_queues[channel] = queue
+                return line, None
+            return None, wait
+
+    #Sends queued lines as the send windows allow. Runs until cancelled.
+    async def run(self):
+        #The event is made before the loop is set, since wake checks the loop from other threads.
+        self.wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        while True:
+            line, wait = self.next_line()
+            if line is not None:
+                self.transport.send(line)
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,122 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from log import bot_function_logger
+
+#Estimates the memory used by a Viewer record, including whichever of its stats, friends, and liked genres are loaded.
+def estimate_size(viewer):
+    size = sys.getsizeof(viewer) + sys.getsizeof(viewer.username)
+    for values in viewer.get_loaded_state():
+        if isinstance(values, dict):
+            size += sys.getsizeof(values)
+            for key, value in values.items():
+                size += sys.getsizeof(key) + sys.getsizeof(value)
+        elif isinstance(values, list):
+            size += sys.getsizeof(values)
+            for value in values:
+                size += sys.getsizeof(value)
+    return size
+
+
+#Maps usernames straight to Viewer records. Records that have not been used for ttl_seconds, or the least recently used records once the registry is over max_viewers or max_bytes, are evicted.
+#Viewers keep no unsaved changes, since points go through the points ledger and other writes are queued or written right away, so evicting one only drops it from memory.
+#Records are measured when added, and again by the Viewer whenever its stats, friends, or liked genres are loaded or change.
+class ViewerRegistry:
+    def __init__(self, max_viewers=5000, max_bytes=16 * 1024 * 1024, ttl_seconds=3600):
+        self.logger = bot_function_logger
+        self.max_viewers = max_viewers
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.records = OrderedDict()
+        self.sizes = {}
+        self.last_seen = {}
+        self.total_bytes = 0
+        self.evictions = 0
+        self.last_sweep = time.monotonic()
+        self.lock = threading.RLock()
+
+    def __contains__(self, username):
+        with self.lock:
+            return username in self.records
+
+    def __len__(self):
+        with self.lock:
+            return len(self.records)
+
+    #Gets the Viewer record for the username and marks it as recently used. Returns None if there is no record.
+    def get(self, username):
+        with self.lock:
+            viewer = self.records.get(username)
+            if viewer is None:
+                return None
+            self.records.move_to_end(username)
+            self.last_seen[username] = time.monotonic()
+            return viewer
+
+    #Adds a Viewer record, then evicts records until the registry is back within its limits.
+    def add(self, viewer):
+        with self.lock:
+            username = viewer.username
+            if username in self.records:
+                self.total_bytes -= self.sizes[username]
+            size = estimate_size(viewer)
+            self.records[username] = viewer
+            self.records.move_to_end(username)
+            self.sizes[username] = size
+            self.last_seen[username] = time.monotonic()
+            self.total_bytes += size
+            viewer.registry = self
+            self.evict()
+        return viewer
+
+    #Removes a record.
+    def remove(self, username):
+        with self.lock:
+            viewer = self.records.pop(username, None)
+            if viewer is not None:
+                self.total_bytes -= self.sizes.pop(username)
+                del self.last_seen[username]
+                viewer.registry = None
+            return viewer
+
+    #Measures a record again after it has changed size, such as after its friends were loaded, then evicts records if the registry is now over its limits.
+    def resize(self, username):
+        with self.lock:
+            viewer = self.records.get(username)
+            if viewer is None:
+                return
+            size = estimate_size(viewer)
+            self.total_bytes += size - self.sizes[username]
+            self.sizes[username] = size
+            self.evict()
+
+    #Evicts expired records, then the least recently used records while the registry is over its limits.
+    def evict(self):
+        now = time.monotonic()
+        with self.lock:
+            #Expired records are swept at most once a minute.
+            if now - self.last_sweep >= min(60, self.ttl):
+                self.last_sweep = now
+                expired = [username for username, seen in self.last_seen.items() if now - seen > self.ttl]
+                for username in expired:
+                    self.evict_one(username)
+            while self.records and (len(self.records) > self.max_viewers or self.total_bytes > self.max_bytes):
+                self.evict_one(next(iter(self.records)))
+
+    #Removes a record and counts the eviction.
+    def evict_one(self, username):
+        self.remove(username)
+        self.evictions += 1
+        self.logger.debug('Evicted %s from the viewer registry.', username)
+
+    #Gets the size of the registry and its estimated memory footprint.
+    def get_footprint(self):
+        with self.lock:
+            return {
+                'viewers': len(self.records),
+                'bytes': self.total_bytes,
+                'max_viewers': self.max_viewers,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,60 @@
+#Twitch drops chat messages longer than this many characters.
+MAX_MESSAGE_LENGTH = 500
+
+#Collects the output of a command and packs it into as few chat messages as possible, since every message costs a turn of the rate limit.
+#Parts are joined in order and only split on word boundaries. No message is ever longer than the limit.
+class ResponseBuilder:
+    def __init__(self, limit=MAX_MESSAGE_LENGTH):
+        self.limit = limit
+        self.parts = []
+
+    #Adds a part, joined to the part before it with the separator.
+    def add(self, text, separator=' '):
+        text = str(text)
+        if text:
+            self.parts.append((separator, text))
+        return self
+
+    #Adds a list of items, such as genres or stats. The first item follows the part before it after a space, and the rest are joined with the separator.
+    def add_list(self, items, separator=', '):
+        for index, item in enumerate(items):
+            self.add(item, ' ' if index == 0 else separator)
+        return self
+
+    def __len__(self):
+        return len(self.parts)
+
+    #Gets the chat messages. A message is started only when the next part does not fit in the current one.
+    def build(self):
+        messages = []
+        current = ''
+        for separator, text in self.get_pieces():
+            if not current:
+                current = text
+            elif len(current) + len(separator) + len(text) <= self.limit:
+                current += separator + text
+            else:
+                messages.append(current)
+                current = text
+        if current:
+            messages.append(current)
+        return messages
+
+    #Gets the parts as (separator, text) pairs that each fit in a message. A part that is too long is broken into words, and a word that is too long is cut.
+    def get_pieces(self):
+        for separator, text in self.parts:
+            if len(text) <= self.limit:
+                yield separator, text
+                continue
+            for index, word in enumerate(word for word in text.split(' ') if word):
+                word_separator = separator if index == 0 else ' '
+                while len(word) > self.limit:
+                    yield word_separator, word[:self.limit]
+                    word = word[self.limit:]
+                    word_separator = ''
+                if word:
+                    yield word_separator, word
+
+#Splits text into chat messages on word boundaries.
+def pack_text(text, limit=MAX_MESSAGE_LENGTH):
+    return ResponseBuilder(limit).add(text).build()
@@ -0,0 +1,172 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from log import bot_function_logger
+
+#Keeps a JSON state file in sync with the state in memory.
+#Saves are debounced, so several changes close together are written once, and each write goes to a temporary file that is renamed over the old one, so a crash never leaves a half-written file.
+#A background thread does the writing, and also watches the file so edits made while the bot is running are loaded without a restart.
+class StateStore:
+    def __init__(self, path, on_reload=None, debounce_ms=500, watch_interval_ms=1000):
+        self.logger = bot_function_logger
+        self.path = path
+        self.on_reload = on_reload
+        self.debounce = debounce_ms / 1000
+        self.watch_interval = watch_interval_ms / 1000
+        self.pending = None
+        self.due = None
+        self.signature = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.counters = {'saves': 0, 'writes': 0, 'reloads': 0, 'failed': 0}
+
+    #Starts the background thread, and makes sure pending changes are written when the process exits.
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='state-store', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    #Gets the modified time and size of the file, or None if it does not exist.
+    def get_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    #Reads the state from the file. Creates an empty one if it does not exist. A file that cannot be read is moved aside and an empty state is used.
+    def load(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.path):
+            self.write({})
+        try:
+            with open(self.path, 'r') as file:
+                state = json.load(file)
+        except ValueError as e:
+            self.logger.error(e)
+            self.logger.error('%s could not be read. Moving it to %s.corrupt and starting with an empty state.', self.path, self.path)
+            os.replace(self.path, f'{self.path}.corrupt')
+            state = {}
+            self.write(state)
+        self.signature = self.get_signature()
+        return state
+
+    #Queues the state to be written. The state is copied now, so later changes are not written until they are saved too.
+    def save(self, state):
+        data = json.dumps(state)
+        with self.lock:
+            self.pending = data
+            self.due = time.monotonic() + self.debounce
+            self.counters['saves'] += 1
+        self.wakeup.set()
+
+    #Writes the state to a temporary file in the same folder, then renames it over the state file.
+    def write(self, state):
+        data = state if isinstance(state, str) else json.dumps(state)
+        with self.write_lock:
+            directory = os.path.dirname(self.path) or '.'
+            descriptor, temp_path = tempfile.mkstemp(prefix='.state-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(descriptor, 'w') as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            #Remember what our own write looks like, so the watcher does not reload it.
+            self.signature = self.get_signature()
+            self.counters['writes'] += 1
+
+    #Writes the pending state right away, if there is one.
+    def flush(self):
+        with self.lock:
+            data = self.pending
+            self.pending = None
+            self.due = None
+        if data is None:
+            return True
+        try:
+            self.write(data)
+            self.logger.info('State written to %s.', self.path)
+            return True
+        except Exception as e:
+            self.logger.error(e)
+            with self.lock:
+                self.counters['failed'] += 1
+                #Keep the state for the next try, unless a newer one was saved in the meantime.
+                if self.pending is None:
+                    self.pending = data
+                    self.due = time.monotonic() + self.debounce
+            return False
+
+    #Reloads the file if it was changed by something other than this store.
+    def check_for_changes(self):
+        signature = self.get_signature()
+        if signature is None or signature == self.signature:
+            return
+        with self.lock:
+            has_pending = self.pending is not None
+        #Changes waiting to be written win over the edit, since they are newer.
+        if has_pending:
+            self.logger.warning('%s was changed, but there are unsaved changes. The file will be overwritten.', self.path)
+            return
+        try:
+            with open(self.path, 'r') as file:
+                state = json.load(file)
+        except ValueError as e:
+            #The file may be half way through being saved by an editor. Try again on the next check.
+            self.logger.warning('%s was changed but could not be read: %s', self.path, e)
+            return
+        self.signature = signature
+        self.counters['reloads'] += 1
+        self.logger.info('%s was changed. Reloading state.', self.path)
+        if self.on_reload is not None:
+            try:
+                self.on_reload(state)
+            except Exception as e:
+                self.logger.error(e)
+
+    #Writes saved states once their debounce time has passed, and checks the file for changes on the watch interval.
+    def run(self):
+        next_check = time.monotonic() + self.watch_interval
+        while not self.stopped:
+            with self.lock:
+                due = self.due
+            now = time.monotonic()
+            timeout = next_check - now
+            if due is not None:
+                timeout = min(timeout, due - now)
+            self.wakeup.wait(max(timeout, 0))
+            self.wakeup.clear()
+            now = time.monotonic()
+            with self.lock:
+                due = self.due
+            if due is not None and now >= due:
+                self.flush()
+            if now >= next_check:
+                next_check = now + self.watch_interval
+                try:
+                    self.check_for_changes()
+                except Exception as e:
+                    self.logger.error(e)
+
+    #Stops the background thread and writes any pending state. Safe to call more than once.
+    def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
@@ -1,16 +1,17 @@
 import chat4j_queries
 from log import streamer_logger
+from hydration import NOT_LOADED, hydrate
 
-#Class for the Streamer. A new instance is m ade when the bot starts.
+#Class for the Streamer. A new instance is m ade when the bot starts. Stats, friends, and liked genres are loaded the first time they are used.
 class Streamer():
     #Initialize the object and all its required vairables.
     def __init__(self, username):
-        self.QueryDriver = chat4j_queries.BotQueries()
+        self.QueryDriver = chat4j_queries.create_queries()
         self.logger = streamer_logger
         self.username = str(username)
-        self.stats = self.QueryDriver.Run_get_stats(self.username, streamer=self.username)
-        self.friends_list = self.QueryDriver.Run_get_friends(username)
-        self.liked_genres = self.QueryDriver.Run_get_liked_genres(username)
+        self._stats = NOT_LOADED
+        self._friends_list = NOT_LOADED
+        self._liked_genres = NOT_LOADED
         self.command_prefix = '$'
         self.points_name = 'points'
         self.state = {'template_commands', 'reminders'}
@@ -23,6 +24,19 @@ class Streamer():
             'reminders' : {}
         }
 
+    #Lazily loaded state. Each one is loaded the first time it is used, and concurrent first uses share one query.
+    @property
+    def stats(self):
+        return hydrate(self, '_stats', ('stats', self.username, self.username), lambda: self.QueryDriver.Run_get_stats(self.username, streamer=self.username))
+
+    @property
+    def friends_list(self):
+        return hydrate(self, '_friends_list', ('friends', self.username), lambda: self.QueryDriver.Run_get_friends(self.username))
+
+    @property
+    def liked_genres(self):
+        return hydrate(self, '_liked_genres', ('liked_genres', self.username), lambda: self.QueryDriver.Run_get_liked_genres(self.username))
+
     #getters
     #Gets the usernname.
     def get_username(self):
@@ -65,8 +79,10 @@ class Streamer():
     def update_stat(self, stat):
         if stat == 'query_count':
             self.QueryDriver.Run_increase_query_count(self.username)
-            self.stats['query_count'] += 1
-            self.logger.info('Query_count for {user} updated to {query_count}.'.format(user = self.username, query_count=self.stats['query_count']))
+            #If the stats have not been loaded, there is nothing to update. They will include the new count when they are loaded.
+            if self._stats:
+                self._stats['query_count'] += 1
+                self.logger.info('Query_count for %s updated to %s.', self.username, self._stats['query_count'])
         elif stat == 'created_on':
             self.logger.error('Cannot change created_on date.')
             return False
@@ -74,7 +90,7 @@ class Streamer():
     #Adds a user to the friends list.
     def update_friends_list(self, new_friend):
         if new_friend in self.friends_list:
-            self.logger.warning(f"{new_friend} is already on {self.username}'s friend list. Ignoring")
+            self.logger.warning("%s is already on %s's friend list. Ignoring", new_friend, self.username)
             return False
         else:
             try:
@@ -82,22 +98,22 @@ class Streamer():
                 if query == False:
                     raise ValueError('Runn function returned false.')
                 self.update_stat('query_count')
-                self.logger.info(f"{new_friend} added to friend list for {self.username}")
+                self.logger.info('%s added to friend list for %s', new_friend, self.username)
                 self.friends_list.append(new_friend)
             except Exception as e:
                 self.logger.error(e)
-                self.logger.debug(f'Argument used: {new_friend}')
+                self.logger.debug('Argument used: %s', new_friend)
                 return False
 
     #Adds a genre to the liked genres.
     def update_liked_genres(self, new_genre):
         if new_genre in self.liked_genres:
-            self.logger.warning(f'{new_genre} is already in liked genres. Ignnoring.')
+            self.logger.warning('%s is already in liked genres. Ignnoring.', new_genre)
             return False
         else:
             self.QueryDriver.Run_set_likes_genre(self.username, new_genre)
             self.update_stat('query_count')
-            self.logger.info(f"{new_genre} added to liked genres for {self.username}")
+            self.logger.info('%s added to liked genres for %s', new_genre, self.username)
             self.liked_genres.append(new_genre)
 
     #Sets a new command prefix.
@@ -0,0 +1,353 @@
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import time
+import config
+from log import bot_function_logger, set_file_suffix
+
+#Supervisor settings. These can be set in config.py.
+SUPERVISOR_SETTINGS = {
+    'workers': getattr(config, 'SUPERVISOR_WORKERS', os.cpu_count() or 1),
+    'replicas': getattr(config, 'SUPERVISOR_HASH_REPLICAS', 100),
+    'heartbeat_interval': getattr(config, 'SUPERVISOR_HEARTBEAT_INTERVAL', 5),
+    'heartbeat_timeout': getattr(config, 'SUPERVISOR_HEARTBEAT_TIMEOUT', 30),
+    'restart_delay': getattr(config, 'SUPERVISOR_RESTART_DELAY', 5),
+    'report_interval': getattr(config, 'SUPERVISOR_REPORT_INTERVAL', 60),
+}
+
+#Maps channels to workers by consistent hashing. Each worker has many points on the ring, so channels spread evenly, and adding or removing a worker only moves the channels that worker gains or loses.
+class HashRing:
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self.keys = []
+        self.owners = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+    #Gets the point on the ring for a key. The hash is stable across processes and runs, unlike hash().
+    def get_point(self, key):
+        return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node):
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            point = self.get_point(f'{node}#{replica}')
+            if point not in self.owners:
+                bisect.insort(self.keys, point)
+                self.owners[point] = node
+
+    def remove(self, node):
+        self.nodes.discard(node)
+        for replica in range(self.replicas):
+            point = self.get_point(f'{node}#{replica}')
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.keys.pop(bisect.bisect_left(self.keys, point))
+
+    #Gets the node that owns a key, or None if the ring is empty.
+    def get(self, key):
+        if not self.keys:
+            return None
+        index = bisect.bisect(self.keys, self.get_point(key)) % len(self.keys)
+        return self.owners[self.keys[index]]
+
+    #Gets a dictionary of node to the set of keys it owns. Nodes with no keys are left out.
+    def assign(self, keys):
+        assignment = {}
+        for key in keys:
+            node = self.get(key)
+            if node is not None:
+                assignment.setdefault(node, set()).add(key)
+        return assignment
+
+#What the supervisor knows about one worker process.
+class WorkerHandle:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.commands = None
+        self.channels = set()
+        self.health = {}
+        self.last_seen = None
+        self.started = None
+        self.restarts = 0
+        self.restart_at = None
+        self.messages_per_second = 0.0
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+#Runs one Bot in a worker process. The supervisor sends it channels to join and leave on its command queue, and it sends heartbeats with its health on the status queue.
+#Every worker sends as the same account, so each one gets account_share of the account limit.
+def run_worker(worker_id, channels, commands, status, heartbeat_interval, account_share=1):
+    #Each worker writes its own log file, since rotating one file from several processes loses records.
+    set_file_suffix(f'worker{worker_id}')
+    #Each worker keeps its own points journal and ledger node, so workers never apply each other's journal on start or skip each other's batches.
+    import chat4j_queries
+    chat4j_queries.POINTS_LEDGER_SETTINGS['journal_dir'] = os.path.join(chat4j_queries.POINTS_LEDGER_SETTINGS['journal_dir'], f'worker{worker_id}')
+    chat4j_queries.POINTS_LEDGER_SETTINGS['name'] = f"{chat4j_queries.POINTS_LEDGER_SETTINGS['name']}_worker{worker_id}"
+    from chatbot import Bot
+    bot = Bot(channels)
+    bot.account_share = account_share
+    bot.init_state()
+    bot.init_driver()
+    asyncio.run(run_worker_bot(bot, worker_id, commands, status, heartbeat_interval))
+
+#Runs the bot next to the heartbeat and command loops, until the bot stops or the supervisor says to stop.
+async def run_worker_bot(bot, worker_id, commands, status, heartbeat_interval):
+    bot_task = asyncio.create_task(bot.run())
+    helpers = [
+        asyncio.create_task(send_heartbeats(bot, worker_id, status, heartbeat_interval)),
+        asyncio.create_task(follow_commands(bot, worker_id, commands, status, bot_task)),
+    ]
+    try:
+        await bot_task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        for helper in helpers:
+            helper.cancel()
+
+#Sends the bot's health to the supervisor on the interval.
+async def send_heartbeats(bot, worker_id, status, interval):
+    while True:
+        status.put(('health', worker_id, os.getpid(), bot.get_health()))
+        await asyncio.sleep(interval)
+
+#Joins and leaves channels when the supervisor says to, and tells it when channels have been left so they can be handed to another worker.
+async def follow_commands(bot, worker_id, commands, status, bot_task):
+    #Wait until the bot has connected, since joining a channel sends to the chat.
+    while bot.scheduler is None:
+        await asyncio.sleep(0.1)
+    while True:
+        try:
+            command, channels = await asyncio.to_thread(commands.get, True, 1)
+        except queue.Empty:
+            continue
+        if command == 'stop':
+            bot_task.cancel()
+            return
+        for channel in channels:
+            try:
+                if command == 'join':
+                    await bot.join_channel(channel)
+                elif command == 'part':
+                    await bot.part_channel(channel)
+            except Exception as e:
+                bot.bot_logger.error(e)
+                bot.bot_logger.error('Worker %s could not %s %s.', worker_id, command, channel)
+        if command == 'part':
+            status.put(('parted', worker_id, os.getpid(), list(channels)))
+
+#Starts worker processes and splits the channels between them by consistent hashing.
+#When a worker dies or stops sending heartbeats, its channels move to the other workers and it is restarted. Once it is back, the channels that hash to it move back to it.
+#A channel is only joined by its new worker after the old worker has left it and written its state, so no two workers serve a channel at once.
+#Every worker uses the same database from config.py. The memory query backend is not shared between processes, so use Neo4j with more than one worker.
+class Supervisor:
+    def __init__(self, channels, workers=1, replicas=100, heartbeat_interval=5, heartbeat_timeout=30, restart_delay=5, report_interval=60, worker_target=run_worker):
+        self.logger = bot_function_logger
+        self.worker_target = worker_target
+        self.channels = list(dict.fromkeys(channels))
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_delay = restart_delay
+        self.report_interval = report_interval
+        #Spawned workers start with a fresh interpreter, so they do not inherit the supervisor's threads or locks.
+        self.context = multiprocessing.get_context('spawn')
+        self.status = self.context.Queue()
+        self.workers = {worker_id: WorkerHandle(worker_id) for worker_id in range(max(1, workers))}
+        self.ring = HashRing(replicas=replicas)
+        #Channels waiting for their old worker to leave them. Each one is mapped to the worker that gets it next.
+        self.handoffs = {}
+        self.stopped = False
+        self.last_report = time.monotonic()
+
+    #Starts every worker with its share of the channels.
+    def start(self):
+        for worker_id in self.workers:
+            self.ring.add(worker_id)
+        assignment = self.ring.assign(self.channels)
+        for worker_id, worker in self.workers.items():
+            self.start_worker(worker, assignment.get(worker_id, set()))
+        self.logger.info('Supervisor started %s workers for %s channels.', len(self.workers), len(self.channels))
+
+    #Starts a worker process that joins the given channels.
+    def start_worker(self, worker, channels):
+        worker.commands = self.context.Queue()
+        worker.channels = set(channels)
+        worker.process = self.context.Process(
+            target=self.worker_target,
+            args=(worker.worker_id, sorted(channels), worker.commands, self.status, self.heartbeat_interval, 1 / len(self.workers)),
+            name=f'chatbot-worker-{worker.worker_id}',
+            daemon=False,
+        )
+        worker.process.start()
+        worker.started = worker.last_seen = time.monotonic()
+        worker.health = {}
+        self.logger.info('Worker %s started with pid %s and %s channels.', worker.worker_id, worker.process.pid, len(channels))
+
+    #Moves channels so every worker serves the channels that hash to it. Channels a live worker is losing are left first, and joined by their new worker once the old one says they are gone.
+    def rebalance(self):
+        assignment = self.ring.assign(self.channels)
+        for worker_id, worker in self.workers.items():
+            target = assignment.get(worker_id, set())
+            if not worker.is_alive():
+                continue
+            leaving = worker.channels - target
+            if leaving:
+                for channel in leaving:
+                    self.handoffs[channel] = self.ring.get(channel)
+                worker.commands.put(('part', sorted(leaving)))
+                self.logger.info('Moving %s channels off worker %s.', len(leaving), worker_id)
+        #Channels nobody is serving can be joined right away.
+        served = set()
+        for worker in self.workers.values():
+            if worker.is_alive():
+                served |= worker.channels
+        for worker_id, channels in assignment.items():
+            worker = self.workers[worker_id]
+            joining = channels - worker.channels - served
+            if joining and worker.is_alive():
+                worker.channels |= joining
+                worker.commands.put(('join', sorted(joining)))
+                self.logger.info('Worker %s joining %s channels.', worker_id, len(joining))
+
+    #Hands channels a worker has left to the workers that own them now.
+    def finish_handoff(self, worker_id, channels):
+        self.workers[worker_id].channels -= set(channels)
+        joins = {}
+        for channel in channels:
+            target = self.handoffs.pop(channel, None)
+            #The ring may have changed again since the handoff started.
+            target = self.ring.get(channel) if target is None or target not in self.ring else target
+            if target is not None and self.workers[target].is_alive():
+                joins.setdefault(target, []).append(channel)
+        for target, channels in joins.items():
+            self.workers[target].channels |= set(channels)
+            self.workers[target].commands.put(('join', sorted(channels)))
+            self.logger.info('Worker %s joining %s channels from worker %s.', target, len(channels), worker_id)
+
+    #Reads every heartbeat and handoff message waiting on the status queue.
+    def read_status(self):
+        while True:
+            try:
+                kind, worker_id, pid, data = self.status.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers.get(worker_id)
+            #Messages from a worker process that has since been replaced are ignored.
+            if worker is None or worker.process is None or worker.process.pid != pid:
+                continue
+            worker.last_seen = time.monotonic()
+            if kind == 'health':
+                previous = worker.health
+                if previous and data['messages'] >= previous.get('messages', 0):
+                    elapsed = max(worker.last_seen - previous['received'], 1e-9)
+                    worker.messages_per_second = (data['messages'] - previous['messages']) / elapsed
+                data['received'] = worker.last_seen
+                worker.health = data
+            elif kind == 'parted':
+                self.finish_handoff(worker_id, data)
+
+    #Finds workers that died or stopped sending heartbeats, moves their channels to the other workers, and restarts them after restart_delay.
+    def check_workers(self):
+        now = time.monotonic()
+        changed = False
+        for worker_id, worker in self.workers.items():
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    worker.restart_at = None
+                    worker.restarts += 1
+                    #The worker starts with no channels, and gets its share back through a rebalance.
+                    self.start_worker(worker, set())
+                    self.ring.add(worker_id)
+                    changed = True
+                continue
+            if worker.is_alive() and now - worker.last_seen <= self.heartbeat_timeout:
+                continue
+            if worker.is_alive():
+                self.logger.error('Worker %s sent no heartbeat for %.0fs. Stopping it.', worker_id, now - worker.last_seen)
+                worker.process.terminate()
+                worker.process.join(5)
+            else:
+                self.logger.error('Worker %s exited with code %s.', worker_id, worker.process.exitcode)
+            self.ring.remove(worker_id)
+            #Channels the worker was handing off are free now, so the rebalance gives them out right away.
+            for channel in worker.channels:
+                self.handoffs.pop(channel, None)
+            worker.channels = set()
+            worker.restart_at = now + self.restart_delay
+            changed = True
+        if changed:
+            self.rebalance()
+
+    #Gets the health of every worker.
+    def get_status(self):
+        return {worker_id: {
+            'alive': worker.is_alive(),
+            'pid': worker.process.pid if worker.process is not None else None,
+            'channels': len(worker.channels),
+            'restarts': worker.restarts,
+            'last_seen': time.monotonic() - worker.last_seen if worker.last_seen is not None else None,
+            'messages_per_second': worker.messages_per_second,
+            'messages': worker.health.get('messages', 0),
+            'commands': worker.health.get('commands', 0),
+            'send_queue': worker.health.get('send_queue', 0),
+            'cpu_seconds': worker.health.get('cpu_seconds', 0.0),
+        } for worker_id, worker in self.workers.items()}
+
+    #Logs one line with the health of every worker.
+    def report(self):
+        parts = []
+        for worker_id, status in self.get_status().items():
+            state = 'up' if status['alive'] else 'down'
+            parts.append(f"worker {worker_id} {state} channels={status['channels']} {status['messages_per_second']:.1f} msg/s cpu={status['cpu_seconds']:.0f}s queue={status['send_queue']} restarts={status['restarts']}")
+        self.logger.info('Supervisor: ' + '; '.join(parts))
+
+    #Watches the workers until stopped.
+    def run(self):
+        self.start()
+        try:
+            while not self.stopped:
+                self.read_status()
+                self.check_workers()
+                if time.monotonic() - self.last_report >= self.report_interval:
+                    self.last_report = time.monotonic()
+                    self.report()
+                time.sleep(min(1, self.heartbeat_interval))
+        finally:
+            self.stop()
+
+    #Tells every worker to stop, and ends the ones that do not stop in time.
+    def stop(self, timeout=15):
+        self.stopped = True
+        for worker in self.workers.values():
+            if worker.is_alive():
+                worker.commands.put(('stop', []))
+        deadline = time.monotonic() + timeout
+        for worker in self.workers.values():
+            if worker.process is not None:
+                worker.process.join(max(0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        self.logger.info('Supervisor stopped.')
+
+#Starts the supervisor with the channels and settings in config.py.
+def main():
+    channels = getattr(config, 'CHANNELS', None) or [config.CHANNEL]
+    supervisor = Supervisor(channels, **SUPERVISOR_SETTINGS)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+
+#Start the supervisor.
+if __name__ == '__main__':
+    main()
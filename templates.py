@@ -0,0 +1,87 @@
+import re
+import string
+
+#The Message fields a template can use. Only text_args can be indexed.
+TEMPLATE_FIELDS = ('user', 'channel', 'text', 'text_command', 'text_args')
+TEMPLATE_CONVERSIONS = (None, 's', 'r', 'a')
+
+#The widest padding or precision a template can ask for. Chat messages are limited to 500 characters.
+MAX_FORMAT_WIDTH = 500
+
+field_pattern = re.compile(r'message\.([a-z_]+)(?:\[(\d+)\])?')
+formatter = string.Formatter()
+
+#Raised when a template cannot be compiled, or a message does not have what a template needs.
+class TemplateError(ValueError):
+    pass
+
+#A template compiled into its literal text and the Message fields between them.
+#Compiling checks every placeholder once, so rendering never runs str.format on user-written text, and placeholders like {message.__class__} are rejected before they are saved.
+class TemplatePlan:
+    __slots__ = ('template', 'pieces', 'static', 'required_args')
+
+    def __init__(self, template, pieces, required_args):
+        self.template = template
+        self.pieces = pieces
+        self.required_args = required_args
+        #Templates without placeholders render to the same text every time.
+        self.static = ''.join(pieces) if all(piece.__class__ is str for piece in pieces) else None
+
+    #Renders the template for a message. Raises TemplateError if the message does not have enough arguments.
+    def render(self, message):
+        if self.static is not None:
+            return self.static
+        if len(message.text_args) < self.required_args:
+            raise TemplateError(f'{message.text_command} requires at least {self.required_args} argument(s).')
+        parts = []
+        for piece in self.pieces:
+            if piece.__class__ is str:
+                parts.append(piece)
+                continue
+            field, index, conversion, spec = piece
+            value = getattr(message, field)
+            if index is not None:
+                value = value[index]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            parts.append(format(str(value), spec) if spec else str(value))
+        return ''.join(parts)
+
+#Compiles a template. Raises TemplateError if it uses anything other than the allowed Message fields, or a format spec that is invalid or too wide.
+def compile_template(template):
+    pieces = []
+    required_args = 0
+    try:
+        parsed = list(formatter.parse(template))
+    except ValueError as e:
+        raise TemplateError(f'Template is not valid: {e}')
+    for literal, field_name, spec, conversion in parsed:
+        if literal:
+            pieces.append(literal)
+        if field_name is None:
+            continue
+        match = field_pattern.fullmatch(field_name)
+        if match is None or match.group(1) not in TEMPLATE_FIELDS:
+            raise TemplateError(f'{{{field_name}}} is not allowed. Use one of: ' + ', '.join(f'{{message.{field}}}' for field in TEMPLATE_FIELDS))
+        field, index = match.group(1), match.group(2)
+        if index is not None:
+            if field != 'text_args':
+                raise TemplateError('Only message.text_args can be indexed.')
+            index = int(index)
+            required_args = max(required_args, index + 1)
+        if conversion not in TEMPLATE_CONVERSIONS:
+            raise TemplateError(f'!{conversion} is not a valid conversion.')
+        if spec:
+            #Nested placeholders in a format spec would be filled in at render time, so they are not allowed.
+            if '{' in spec or '}' in spec:
+                raise TemplateError('Placeholders cannot be nested.')
+            if any(int(width) > MAX_FORMAT_WIDTH for width in re.findall(r'\d+', spec)):
+                raise TemplateError(f'Format widths cannot be larger than {MAX_FORMAT_WIDTH}.')
+            try:
+                format('', spec)
+            except ValueError as e:
+                raise TemplateError(f'Format spec {spec} is not valid: {e}')
+        pieces.append((field, index, conversion, spec))
+    return TemplatePlan(template, tuple(pieces), required_args)
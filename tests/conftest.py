@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import types
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#The tests never use the real config.py, so they cannot connect to a real chat or database by accident. Queries run on the in-memory backend.
+TEST_CONFIG = {
+    'OAUTH_TOKEN': 'oauth:test',
+    'USERNAME': 'testbot',
+    'CHANNEL': 'teststreamer',
+    'DB': 'neo4j://localhost:7687',
+    'DB_USER': 'test',
+    'DB_PASS': 'test',
+    'QUERY_BACKEND': 'memory',
+}
+sys.modules['config'] = types.SimpleNamespace(**TEST_CONFIG)
+
+#The bot writes its logs relative to the working folder, so the tests run in a temporary one.
+os.chdir(tempfile.mkdtemp(prefix='chatbot-tests-'))
+os.makedirs('Chatbot\\logs\\', exist_ok=True)
+
+
+
+#Closes the shared points ledger while the test folder is still the working folder, instead of at exit.
+@pytest.fixture(autouse=True, scope='session')
+def close_shared_ledger():
+    yield
+    import chat4j_queries
+    chat4j_queries.close_points_ledger()
@@ -0,0 +1,70 @@
+from corpus import TextCorpus
+
+
+#Gets every indexed line, in order.
+def get_lines(corpus):
+    with open(corpus.path, 'rb') as file:
+        lines = []
+        for offset in corpus.offsets:
+            file.seek(offset)
+            lines.append(file.readline().decode('utf-8').strip())
+        return lines
+
+
+def make_corpus(tmp_path, data, chunk_size=1 << 16):
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(data)
+    return TextCorpus(str(path), chunk_size=chunk_size)
+
+
+def test_index_skips_blank_lines(tmp_path):
+    #A small chunk size makes lines cross chunk boundaries.
+    corpus = make_corpus(tmp_path, b'first joke\n\n   \nsecond joke\r\nthird\n', chunk_size=4)
+    assert len(corpus) == 3
+    assert get_lines(corpus) == ['first joke', 'second joke', 'third']
+    assert corpus.random_line() in ('first joke', 'second joke', 'third')
+
+
+def test_append_adds_to_file_and_index(tmp_path):
+    corpus = make_corpus(tmp_path, b'one\ntwo\n')
+    assert len(corpus) == 2
+    assert corpus.append('  three   words  here ')
+    assert corpus.append('   ') == False
+    assert len(corpus) == 3
+    assert get_lines(corpus) == ['one', 'two', 'three words here']
+    assert (tmp_path / 'lines.txt').read_bytes() == b'one\ntwo\nthree words here\n'
+
+
+def test_external_append_is_indexed(tmp_path):
+    corpus = make_corpus(tmp_path, b'one\n')
+    assert len(corpus) == 1
+    with open(corpus.path, 'ab') as file:
+        file.write(b'two\nthree\n')
+    assert len(corpus) == 3
+    assert get_lines(corpus) == ['one', 'two', 'three']
+
+
+def test_last_line_without_newline(tmp_path):
+    corpus = make_corpus(tmp_path, b'one\ntw')
+    assert len(corpus) == 2
+    assert get_lines(corpus) == ['one', 'tw']
+    #Another program finishes the line, so it is indexed again instead of twice.
+    with open(corpus.path, 'ab') as file:
+        file.write(b'o\nthree')
+    assert len(corpus) == 3
+    assert get_lines(corpus) == ['one', 'two', 'three']
+    #An appended line is not joined to the unfinished last line.
+    assert corpus.append('four')
+    assert get_lines(corpus) == ['one', 'two', 'three', 'four']
+    assert (tmp_path / 'lines.txt').read_bytes() == b'one\ntwo\nthree\nfour\n'
+
+
+def test_shrunk_or_missing_file_is_indexed_again(tmp_path):
+    corpus = make_corpus(tmp_path, b'one\ntwo\nthree\n')
+    assert len(corpus) == 3
+    assert corpus.random_line() is not None
+    (tmp_path / 'lines.txt').write_bytes(b'new\n')
+    assert len(corpus) == 1
+    assert corpus.random_line() == 'new'
+    (tmp_path / 'lines.txt').unlink()
+    assert len(corpus) == 0
@@ -0,0 +1,80 @@
+import asyncio
+import random
+from dispatch import Dispatcher
+
+
+#Runs the dispatcher on the given submissions and returns the items it accepted and the items it handled, in order, for each key.
+async def run_dispatcher(submissions, **settings):
+    handled = {}
+    running = set()
+
+    async def handler(item):
+        key, _ = item
+        #Only one item of a key runs at a time.
+        assert key not in running
+        running.add(key)
+        await asyncio.sleep(random.uniform(0, 0.002))
+        running.discard(key)
+        handled.setdefault(key, []).append(item)
+
+    dispatcher = Dispatcher(handler, **settings)
+    task = asyncio.create_task(dispatcher.run())
+    accepted = {}
+    for key, item, low_priority in submissions:
+        if await dispatcher.submit(key, (key, item), low_priority):
+            accepted.setdefault(key, []).append((key, item))
+    while dispatcher.get_pending():
+        await asyncio.sleep(0.001)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return dispatcher, accepted, handled
+
+
+def test_each_key_runs_in_order():
+    random.seed(1)
+    submissions = [(f'user{index % 7}', index, False) for index in range(300)]
+    dispatcher, accepted, handled = asyncio.run(run_dispatcher(submissions, workers=4, max_pending=1000, max_key_queue=1000))
+    assert handled == accepted
+    assert dispatcher.get_stats()['shed'] == 0
+
+
+def test_order_is_kept_when_items_are_shed():
+    random.seed(2)
+    #Every other item is low priority, so some of them are shed once the dispatcher falls behind.
+    submissions = [(f'user{index % 5}', index, index % 2 == 1) for index in range(400)]
+    dispatcher, accepted, handled = asyncio.run(run_dispatcher(submissions, workers=3, max_pending=40, shed_pending=10, max_key_queue=8))
+    stats = dispatcher.get_stats()
+    assert stats['shed'] > 0
+    assert stats['handled'] == sum(len(items) for items in accepted.values())
+    #Every accepted item ran, in the order it was submitted for its key.
+    assert handled == accepted
+    for items in handled.values():
+        assert [item for _, item in items] == sorted(item for _, item in items)
+
+
+def test_full_key_queue_drops_new_items():
+    async def main():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def handler(item):
+            started.set()
+            await release.wait()
+
+        dispatcher = Dispatcher(handler, workers=1, max_pending=100, max_key_queue=2)
+        task = asyncio.create_task(dispatcher.run())
+        assert await dispatcher.submit('user', 0)
+        await started.wait()
+        #The running item is off the queue, so two more fit and the third is dropped.
+        results = [await dispatcher.submit('user', index) for index in range(1, 4)]
+        release.set()
+        while dispatcher.get_pending():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return results, dispatcher.get_stats()
+
+    results, stats = asyncio.run(main())
+    assert results == [True, True, False]
+    assert stats['shed'] == 1
+    assert stats['handled'] == 3
@@ -0,0 +1,38 @@
+from framing import LineFramer
+
+
+def test_lines_split_across_reads():
+    framer = LineFramer()
+    assert framer.feed(b'PING :tmi.twi') == []
+    assert framer.pending() == 13
+    assert framer.feed(b'tch.tv\r\nPRIVMSG #a :hi\r\n\r\nJOIN #a\n') == ['PING :tmi.twitch.tv', 'PRIVMSG #a :hi', 'JOIN #a']
+    assert framer.pending() == 0
+
+
+def test_multibyte_character_split_across_reads():
+    framer = LineFramer()
+    data = 'PRIVMSG #a :caf\u00e9\r\n'.encode('utf-8')
+    cut = data.index(b'\xc3') + 1
+    assert framer.feed(data[:cut]) == []
+    assert framer.feed(data[cut:]) == ['PRIVMSG #a :caf\u00e9']
+
+
+def test_bytes_lines_when_no_encoding():
+    framer = LineFramer(encoding=None)
+    assert framer.feed(b'PING :x\r\n') == [b'PING :x']
+
+
+def test_line_that_never_ends_is_dropped():
+    framer = LineFramer(max_line_length=16)
+    assert framer.feed(b'x' * 20) == []
+    assert framer.overflows == 1
+    assert framer.feed(b'\r\nPING :x\r\n') == ['PING :x']
+
+
+def test_tail_of_overlong_line_is_not_returned():
+    framer = LineFramer(max_line_length=16)
+    assert framer.feed(b'x' * 20) == []
+    assert framer.feed(b'yyyy') == []
+    assert framer.feed(b' :evil PRIVMSG #c :$addpoints\r\nPING :x\r\n') == ['PING :x']
+    assert framer.overflows == 1
+    assert framer.pending() == 0
@@ -0,0 +1,85 @@
+from irc_parser import parse_message, get_command, unescape_tag_value, parse_tags
+
+TAGGED_LINE = b'@badge-info=;badges=moderator/1,subscriber/12;display-name=Viewer1;emotes=25:0-4,6-10/1902:12-16;user-id=1337 :viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :Kappa Kappa Keepo $gamble 50'
+
+
+def test_untagged_privmsg():
+    message = parse_message(b':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :$query_get_stats viewer2', '$')
+    assert message.user == 'viewer1'
+    assert message.channel == 'channel'
+    assert message.irc_command == 'PRIVMSG'
+    assert message.irc_args == ['#channel']
+    assert message.text == '$query_get_stats viewer2'
+    assert message.text_command == 'query_get_stats'
+    assert message.text_args == ['viewer2']
+    assert message.tags is None
+
+
+def test_tags_are_parsed_on_first_use():
+    message = parse_message(TAGGED_LINE, '$')
+    assert message.raw_tags.startswith(b'badge-info=;')
+    assert message._tags is None
+    assert message.user_id == '1337'
+    assert message.get_tag('display-name') == 'Viewer1'
+    assert message.get_tag('badge-info') == ''
+    assert message.get_tag('missing', 'default') == 'default'
+    assert message.badges == {'moderator': '1', 'subscriber': '12'}
+    assert message.emotes == {'25': [(0, 4), (6, 10)], '1902': [(12, 16)]}
+    assert message.user == 'viewer1'
+    assert message.text == 'Kappa Kappa Keepo $gamble 50'
+    #The command prefix has to start the text.
+    assert message.text_command is None
+
+
+def test_escaped_tag_values():
+    assert unescape_tag_value(r'hello\sworld\:\\\r\n') == 'hello world;\\\r\n'
+    #An unknown escape keeps the character, and a lone backslash at the end is dropped.
+    assert unescape_tag_value('a\\b') == 'ab'
+    assert unescape_tag_value('trailing\\') == 'trailing'
+    assert parse_tags(b'system-msg=5\\sraiders\\sfrom\\sViewer1;flag') == {'system-msg': '5 raiders from Viewer1', 'flag': ''}
+
+
+def test_missing_trailing_part():
+    message = parse_message(b':viewer3!viewer3@viewer3.tmi.twitch.tv JOIN #channel', '$')
+    assert message.irc_command == 'JOIN'
+    assert message.channel == 'channel'
+    assert message.text is None
+    assert message.text_command is None
+    assert message.text_args is None
+
+
+def test_empty_trailing_part():
+    message = parse_message(b':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :', '$')
+    assert message.text == ''
+    assert message.text_command is None
+
+
+def test_no_prefix_and_tags_only():
+    message = parse_message(b'PING :tmi.twitch.tv', '$')
+    assert message.prefix is None
+    assert message.irc_command == 'PING'
+    assert message.text == 'tmi.twitch.tv'
+    message = parse_message(b'@only=tags', '$')
+    assert message.get_tag('only') == 'tags'
+    assert message.irc_command is None
+
+
+def test_input_types_parse_the_same():
+    line = ':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :$boop viewer2'
+    expected = parse_message(line.encode(), '$')
+    assert parse_message(line, '$') == expected
+    assert parse_message(bytearray(line.encode()), '$') == expected
+    assert parse_message(memoryview(line.encode()), '$') == expected
+
+
+def test_command_prefix_per_channel():
+    line = b':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :!boop viewer2'
+    assert parse_message(line, {'channel': '!'}).text_command == 'boop'
+    assert parse_message(line, {'other': '!'}).text_command is None
+
+
+def test_get_command():
+    assert get_command(b'PING :tmi.twitch.tv') == b'PING'
+    assert get_command(TAGGED_LINE) == b'PRIVMSG'
+    assert get_command(b':tmi.twitch.tv RECONNECT') == b'RECONNECT'
+    assert get_command(b'@only=tags') == b''
@@ -0,0 +1,29 @@
+import logging
+from log import LazyQueueHandler, is_immutable
+
+
+def make_record(msg, *args):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_immutable_arguments_are_left_for_the_writer():
+    record = make_record('%s has %s points', 'viewer', 10)
+    assert is_immutable(record)
+    prepared = LazyQueueHandler(None).prepare(record)
+    assert prepared.args == ('viewer', 10)
+    assert prepared.getMessage() == 'viewer has 10 points'
+
+
+def test_mutable_arguments_are_formatted_right_away():
+    viewers = ['a']
+    settings = {'latency_ms': 0}
+    handler = LazyQueueHandler(None)
+    list_record = handler.prepare(make_record('Viewers: %s', viewers))
+    dict_record = handler.prepare(make_record('Settings: %s', settings))
+    message_record = handler.prepare(make_record(viewers))
+    viewers.append('b')
+    settings['latency_ms'] = 5
+    assert list_record.getMessage() == "Viewers: ['a']"
+    assert dict_record.getMessage() == "Settings: {'latency_ms': 0}"
+    assert message_record.getMessage() == "['a']"
+    assert list_record.args is None
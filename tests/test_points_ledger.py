@@ -0,0 +1,105 @@
+import os
+import threading
+import chat4j_queries
+from points_ledger import PointsLedger
+
+
+def make_queries():
+    queries = chat4j_queries.create_queries()
+    queries.Run_add_user('streamer')
+    queries.Run_onboard_viewers(['viewer'], 'streamer')
+    return queries
+
+
+def get_points(queries):
+    return queries.Run_get_stats('viewer', 'streamer')['points']
+
+
+def test_workers_with_their_own_ledgers_never_skip_each_other(tmp_path):
+    queries = make_queries()
+    start = get_points(queries)
+    first = PointsLedger(queries, str(tmp_path / 'worker0'), name='test_worker0')
+    second = PointsLedger(queries, str(tmp_path / 'worker1'), name='test_worker1')
+    first.start()
+    second.start()
+    #The first ledger's batch is older, but it is still applied after the second ledger's.
+    first.add('viewer', 'streamer', 7)
+    second.add('viewer', 'streamer', 5)
+    assert second.flush()
+    assert first.flush()
+    assert get_points(queries) == start + 12
+    assert first.get_counters()['skipped'] == 0
+    first.close()
+    second.close()
+
+
+def test_skipped_batch_is_kept(tmp_path):
+    queries = make_queries()
+    start = get_points(queries)
+    ledger = PointsLedger(queries, str(tmp_path / 'journal'), name='test_shared')
+    ledger.start()
+    #Another journal under the same name has already applied a newer batch.
+    queries.driver.graph.add_points([], ledger.journal_batch + 10**9, 'test_shared')
+    ledger.add('viewer', 'streamer', 100)
+    assert ledger.flush()
+    assert get_points(queries) == start
+    assert ledger.get_counters()['skipped'] == 1
+    ledger.close()
+    assert [name for name in os.listdir(tmp_path / 'journal') if name.endswith('.skipped')]
+
+
+#Queries that stop right after a points batch is in the database, until the test lets them go on.
+class PausingQueries:
+    def __init__(self, queries):
+        self.queries = queries
+        self.committed = threading.Event()
+        self.resume = threading.Event()
+
+    def open_session(self):
+        return self.queries.open_session()
+
+    def Query_batch_add_points(self, tx, rows, batch, ledger):
+        result = self.queries.Query_batch_add_points(tx, rows, batch, ledger)
+        self.committed.set()
+        self.resume.wait(5)
+        return result
+
+
+def test_stats_loaded_during_a_commit_count_the_batch_once(tmp_path):
+    queries = make_queries()
+    start = get_points(queries)
+    pausing = PausingQueries(queries)
+    ledger = PointsLedger(pausing, str(tmp_path / 'journal'), name='test_commit')
+    ledger.start()
+    ledger.add('viewer', 'streamer', 40)
+    flush = threading.Thread(target=ledger.flush)
+    flush.start()
+    assert pausing.committed.wait(5)
+    #The batch is in the database but the flush has not finished, so the stats must wait for it instead of also counting the batch as unsaved.
+    loaded = []
+    load = threading.Thread(target=lambda: loaded.append(ledger.load_stats(lambda: queries.Run_get_stats('viewer', 'streamer'), 'viewer', 'streamer')))
+    load.start()
+    load.join(0.2)
+    assert load.is_alive()
+    pausing.resume.set()
+    flush.join(5)
+    load.join(5)
+    assert loaded[0]['points'] == start + 40
+    ledger.add('viewer', 'streamer', 2)
+    assert ledger.load_stats(lambda: queries.Run_get_stats('viewer', 'streamer'), 'viewer', 'streamer')['points'] == start + 42
+    ledger.close()
+
+
+def test_creating_views_again_keeps_saved_points(tmp_path):
+    queries = make_queries()
+    start = get_points(queries)
+    ledger = PointsLedger(queries, str(tmp_path / 'journal'), name='test_views')
+    ledger.start()
+    ledger.add('viewer', 'streamer', 30)
+    assert ledger.flush()
+    queries.Run_create_views('viewer', 'streamer')
+    queries.Run_create_user_views('viewer', 'streamer')
+    queries.Query_batch_create_views(None, [{'username1': 'viewer', 'username2': 'streamer'}])
+    assert get_points(queries) == start + 30
+    assert queries.Run_get_viewers('streamer').count('viewer') == 1
+    ledger.close()
@@ -0,0 +1,53 @@
+import asyncio
+import chat4j_queries
+from chat4j_async_queries import create_async_queries
+from chat4j_queries import PoolMetrics
+
+
+def use_fresh_metrics(monkeypatch):
+    monkeypatch.setattr(chat4j_queries, 'pool_metrics', PoolMetrics())
+    monkeypatch.setattr(chat4j_queries, 'async_pool_metrics', PoolMetrics())
+    return chat4j_queries.pool_metrics, chat4j_queries.async_pool_metrics
+
+
+def test_each_pool_is_counted_on_its_own(monkeypatch):
+    sync_metrics, async_metrics = use_fresh_metrics(monkeypatch)
+    sync_metrics.opened()
+    sync_metrics.opened()
+    sync_metrics.closed(0.01)
+    async_metrics.opened()
+    async_metrics.closed(0.01, failed=True)
+    metrics = chat4j_queries.get_pool_metrics()
+    assert metrics['sync']['in_use'] == 1
+    assert metrics['sync']['sessions'] == 2
+    assert metrics['async']['in_use'] == 0
+    assert metrics['async']['failures'] == 1
+    assert metrics['in_use'] == 1
+    assert metrics['sessions'] == 3
+    assert metrics['failures'] == 1
+
+
+def test_total_pool_size_counts_both_pools(monkeypatch):
+    sync_metrics, async_metrics = use_fresh_metrics(monkeypatch)
+    #Pools whose driver is not open have no connections.
+    assert chat4j_queries.get_pool_metrics()['pool_size'] == 0
+    sync_metrics.set_pool_size(50)
+    assert chat4j_queries.get_pool_metrics()['pool_size'] == 50
+    async_metrics.set_pool_size(50)
+    metrics = chat4j_queries.get_pool_metrics()
+    assert metrics['pool_size'] == 100
+    assert metrics['sync']['pool_size'] == 50
+    assert metrics['async']['pool_size'] == 50
+
+
+def test_sync_and_async_sessions_go_to_their_own_pool():
+    #Write everything still queued, so the background flushes do not open sessions during the test.
+    chat4j_queries.get_write_batcher().flush()
+    chat4j_queries.get_points_ledger().flush()
+    before = chat4j_queries.get_pool_metrics()
+    queries = chat4j_queries.create_queries()
+    queries.Run_all_user()
+    asyncio.run(create_async_queries().Run_all_user())
+    after = chat4j_queries.get_pool_metrics()
+    assert after['sync']['sessions'] == before['sync']['sessions'] + 1
+    assert after['async']['sessions'] == before['async']['sessions'] + 1
@@ -0,0 +1,72 @@
+import chat4j_queries
+from query_cache import QueryCache
+
+
+#A clock the test moves by hand.
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_results_expire_after_their_query_ttl():
+    clock = FakeClock()
+    cache = QueryCache({'short': 10, 'long': 60}, clock=clock)
+    cache.store('short', ('streamer',), ['viewer'])
+    cache.store('long', ('streamer',), ['viewer'])
+    clock.now += 9.9
+    assert cache.lookup('short', 'streamer') == (True, ['viewer'])
+    clock.now += 0.1
+    #Each query keeps its results for its own TTL.
+    assert cache.lookup('short', 'streamer') == (False, None)
+    assert cache.lookup('long', 'streamer') == (True, ['viewer'])
+    clock.now += 50
+    assert cache.lookup('long', 'streamer') == (False, None)
+    assert cache.get_counters()['short'] == {'hits': 1, 'misses': 1, 'invalidations': 0}
+
+
+def test_queries_without_a_ttl_and_failed_results_are_not_cached():
+    cache = QueryCache({'cached': 10}, clock=FakeClock())
+    cache.store('uncached', ('streamer',), ['viewer'])
+    cache.store('cached', ('streamer',), False)
+    cache.store('cached', ('other',), None)
+    assert cache.lookup('uncached', 'streamer') == (False, None)
+    assert cache.lookup('cached', 'streamer') == (False, None)
+    assert cache.lookup('cached', 'other') == (False, None)
+    assert cache.get_counters()['entries'] == 0
+
+
+def test_cached_results_are_copies():
+    cache = QueryCache({'cached': 10}, clock=FakeClock())
+    viewers = ['viewer']
+    cache.store('cached', ('streamer',), viewers)
+    viewers.append('changed')
+    cache.lookup('cached', 'streamer')[1].append('changed')
+    assert cache.lookup('cached', 'streamer') == (True, ['viewer'])
+
+
+def test_write_drops_the_reads_it_changes():
+    queries = chat4j_queries.create_queries()
+    queries.Run_add_user('cachestreamer')
+    queries.Run_onboard_viewers(['cacheviewer1'], 'cachestreamer')
+    assert queries.Run_get_viewers('cachestreamer') == ['cacheviewer1']
+    #A change made behind the cache's back is not seen until the cached read is dropped.
+    queries.graph.onboard_viewers(['hidden'], 'cachestreamer')
+    assert queries.Run_get_viewers('cachestreamer') == ['cacheviewer1']
+    queries.Run_onboard_viewers(['cacheviewer2'], 'cachestreamer')
+    assert sorted(queries.Run_get_viewers('cachestreamer')) == ['cacheviewer1', 'cacheviewer2', 'hidden']
+
+
+def test_write_behind_batch_drops_the_reads_it_changes():
+    queries = chat4j_queries.create_queries()
+    queries.Run_add_user('batchstreamer')
+    queries.Run_add_user('batchviewer')
+    assert queries.Run_get_viewers('batchstreamer') == []
+    invalidations = chat4j_queries.get_query_cache_counters()['get_viewers']['invalidations']
+    queries.Run_create_views('batchviewer', 'batchstreamer')
+    #The batcher's own thread may have flushed already, which drops the reads the same way.
+    chat4j_queries.get_write_batcher().flush()
+    assert chat4j_queries.get_query_cache_counters()['get_viewers']['invalidations'] == invalidations + 1
+    assert queries.Run_get_viewers('batchstreamer') == ['batchviewer']
@@ -0,0 +1,73 @@
+import bisect
+from ratelimit import OutboundScheduler, SendWindow, get_account_limit
+
+
+#A clock the test moves by hand.
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+#Drives next_line like the send loop does, waiting as long as it says to, and returns the time of every send.
+def drain(scheduler, clock, until):
+    sends = []
+    while clock.now < until:
+        line, wait = scheduler.next_line()
+        if line is not None:
+            sends.append(clock.now)
+        elif wait is None:
+            break
+        else:
+            clock.now += wait
+    return sends
+
+
+#Gets the most sends in any window of the given length.
+def most_in_window(sends, period):
+    return max(bisect.bisect_left(sends, start + period) - index for index, start in enumerate(sends))
+
+
+def test_account_limit_holds_in_every_window():
+    clock = FakeClock()
+    scheduler = OutboundScheduler(None, 'normal', max_queue=1000, clock=clock)
+    #Many channels, so the account limit is the one that is reached.
+    for index in range(200):
+        scheduler.set_channel_tier(f'channel{index % 50}', 'moderator')
+        assert scheduler.submit(f'channel{index % 50}', f'PRIVMSG #channel{index % 50} :{index}')
+    sends = drain(scheduler, clock, clock.now + 120)
+    assert len(sends) >= 70
+    assert most_in_window(sends, 30) <= 20
+
+
+def test_channel_limit_holds_in_every_window():
+    clock = FakeClock()
+    scheduler = OutboundScheduler(None, 'normal', max_queue=1000, clock=clock)
+    for index in range(10):
+        scheduler.submit('channel', f'PRIVMSG #channel :{index}')
+    sends = drain(scheduler, clock, clock.now + 60)
+    assert len(sends) == 10
+    assert most_in_window(sends, 1) <= 1
+
+
+def test_account_share_holds_in_every_window():
+    clock = FakeClock()
+    scheduler = OutboundScheduler(None, 'normal', max_queue=1000, account_share=1 / 3, clock=clock)
+    for index in range(60):
+        scheduler.set_channel_tier(f'channel{index}', 'moderator')
+        scheduler.submit(f'channel{index}', f'PRIVMSG #channel{index} :{index}')
+    sends = drain(scheduler, clock, clock.now + 120)
+    assert most_in_window(sends, 30) <= 20 / 3
+
+
+def test_send_window():
+    window = SendWindow(2, 10)
+    assert window.wait_time(0) == 0
+    window.take(0)
+    window.take(1)
+    assert window.wait_time(5) == 5
+    assert window.wait_time(10) == 0
+    assert get_account_limit('normal', 1 / 40) == (1, 60.0)
+    assert get_account_limit('normal', 1 / 3) == (6, 30)
@@ -0,0 +1,40 @@
+import random
+from responses import ResponseBuilder, pack_text
+
+
+def test_short_text_is_one_message():
+    assert pack_text('hello chat') == ['hello chat']
+    assert pack_text('') == []
+
+
+def test_splits_on_word_boundaries():
+    words = [f'word{index}' for index in range(300)]
+    messages = pack_text(' '.join(words), limit=50)
+    assert all(len(message) <= 50 for message in messages)
+    assert ' '.join(messages).split(' ') == words
+    #Each message is only ended when the next word does not fit.
+    for message, next_message in zip(messages, messages[1:]):
+        assert len(message) + 1 + len(next_message.split(' ')[0]) > 50
+
+
+def test_long_word_is_cut():
+    messages = pack_text('a ' + 'x' * 25 + ' b', limit=10)
+    assert messages == ['a', 'xxxxxxxxxx', 'xxxxxxxxxx', 'xxxxx b']
+
+
+#A separator is dropped where a new message starts.
+def test_parts_and_lists_are_packed_together():
+    builder = ResponseBuilder(limit=40)
+    builder.add('The current genres are:').add_list(['Action', 'RPG', 'Horror', 'Puzzle', 'Racing'])
+    assert len(builder) == 6
+    assert builder.build() == ['The current genres are: Action, RPG', 'Horror, Puzzle, Racing']
+
+
+def test_random_text_is_never_lost_or_too_long():
+    rng = random.Random(3)
+    for _ in range(200):
+        limit = rng.randint(5, 60)
+        words = [''.join(rng.choice('abc') for _ in range(rng.randint(1, 80))) for _ in range(rng.randint(1, 40))]
+        messages = pack_text(' '.join(words), limit=limit)
+        assert all(0 < len(message) <= limit for message in messages)
+        assert ''.join(messages).replace(' ', '') == ''.join(words)
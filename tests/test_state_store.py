@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from state_store import StateStore
+
+
+#Waits up to a few seconds for a condition, since the store writes on its own thread.
+def wait_for(condition, timeout=3):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def read(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def test_saves_are_debounced_and_written_atomically(tmp_path):
+    path = str(tmp_path / 'state.JSON')
+    store = StateStore(path, debounce_ms=50, watch_interval_ms=1000)
+    assert store.load() == {}
+    store.start()
+    for count in range(5):
+        store.save({'count': count})
+    assert wait_for(lambda: store.counters['writes'] == 2)
+    time.sleep(0.1)
+    assert read(path) == {'count': 4}
+    #The five saves were written once, after the empty state load created.
+    assert store.counters['saves'] == 5
+    assert store.counters['writes'] == 2
+    assert os.listdir(tmp_path) == ['state.JSON']
+    store.close()
+
+
+def test_flush_writes_right_away(tmp_path):
+    path = str(tmp_path / 'state.JSON')
+    store = StateStore(path, debounce_ms=60000)
+    store.load()
+    store.save({'commands': ['boop']})
+    #The state is copied when it is saved.
+    state = {'commands': ['boop']}
+    store.save(state)
+    state['commands'].append('later')
+    assert store.flush()
+    assert read(path) == {'commands': ['boop']}
+    assert store.flush()
+    assert os.listdir(tmp_path) == ['state.JSON']
+
+
+def test_failed_write_leaves_no_temp_file_and_keeps_the_state(tmp_path, monkeypatch):
+    path = str(tmp_path / 'state.JSON')
+    store = StateStore(path, debounce_ms=60000)
+    store.load()
+    store.save({'count': 1})
+
+    def fail(source, target):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(os, 'replace', fail)
+    assert store.flush() == False
+    monkeypatch.undo()
+    assert os.listdir(tmp_path) == ['state.JSON']
+    assert read(path) == {}
+    assert store.counters['failed'] == 1
+    #The state is written on the next try.
+    assert store.flush()
+    assert read(path) == {'count': 1}
+
+
+def test_corrupt_file_is_moved_aside(tmp_path):
+    path = str(tmp_path / 'state.JSON')
+    with open(path, 'w') as file:
+        file.write('{"count": ')
+    assert StateStore(path).load() == {}
+    assert sorted(os.listdir(tmp_path)) == ['state.JSON', 'state.JSON.corrupt']
+
+
+def test_watcher_reloads_a_file_changed_on_disk(tmp_path):
+    path = str(tmp_path / 'state.JSON')
+    reloaded = []
+    changed = threading.Event()
+
+    def on_reload(state):
+        reloaded.append(state)
+        changed.set()
+
+    store = StateStore(path, on_reload=on_reload, debounce_ms=10, watch_interval_ms=20)
+    store.load()
+    store.start()
+    #The store's own writes are not reloaded.
+    store.save({'count': 1})
+    assert wait_for(lambda: store.counters['writes'] == 2)
+    time.sleep(0.1)
+    assert reloaded == []
+    with open(path, 'w') as file:
+        json.dump({'count': 2, 'edited': True}, file)
+    assert changed.wait(2)
+    assert reloaded == [{'count': 2, 'edited': True}]
+    assert store.counters['reloads'] == 1
+    store.close()
+
+
+def test_watcher_keeps_unsaved_changes_over_an_edit(tmp_path):
+    path = str(tmp_path / 'state.JSON')
+    reloaded = []
+    store = StateStore(path, on_reload=reloaded.append, debounce_ms=60000)
+    store.load()
+    store.save({'count': 1})
+    with open(path, 'w') as file:
+        json.dump({'count': 2, 'edited': True}, file)
+    store.check_for_changes()
+    assert reloaded == []
+    assert store.flush()
+    assert read(path) == {'count': 1}
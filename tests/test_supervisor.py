@@ -0,0 +1,46 @@
+from supervisor import HashRing
+
+CHANNELS = [f'channel{index}' for index in range(500)]
+
+
+def test_same_owner_across_rings():
+    assert HashRing(range(4)).assign(CHANNELS) == HashRing([3, 1, 0, 2]).assign(CHANNELS)
+
+
+def test_channels_spread_over_every_worker():
+    assignment = HashRing(range(4)).assign(CHANNELS)
+    assert set(assignment) == {0, 1, 2, 3}
+    assert sum(len(channels) for channels in assignment.values()) == len(CHANNELS)
+    assert min(len(channels) for channels in assignment.values()) > len(CHANNELS) / 4 / 2
+
+
+def test_adding_a_worker_only_moves_channels_to_it():
+    ring = HashRing(range(4))
+    before = {channel: ring.get(channel) for channel in CHANNELS}
+    ring.add(4)
+    after = {channel: ring.get(channel) for channel in CHANNELS}
+    moved = [channel for channel in CHANNELS if before[channel] != after[channel]]
+    assert moved
+    assert all(after[channel] == 4 for channel in moved)
+
+
+def test_removing_a_worker_only_moves_its_channels():
+    ring = HashRing(range(4))
+    before = {channel: ring.get(channel) for channel in CHANNELS}
+    ring.remove(2)
+    after = {channel: ring.get(channel) for channel in CHANNELS}
+    assert 2 not in ring
+    for channel in CHANNELS:
+        if before[channel] == 2:
+            assert after[channel] != 2
+        else:
+            assert after[channel] == before[channel]
+    #Once the worker is back, every channel returns to its old owner.
+    ring.add(2)
+    assert {channel: ring.get(channel) for channel in CHANNELS} == before
+
+
+def test_empty_ring():
+    ring = HashRing()
+    assert ring.get('channel0') is None
+    assert ring.assign(CHANNELS) == {}
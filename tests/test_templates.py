@@ -0,0 +1,80 @@
+import pytest
+from irc_parser import parse_message
+from templates import TemplateError, compile_template, MAX_FORMAT_WIDTH
+
+MESSAGE = parse_message(b':viewer1!viewer1@viewer1.tmi.twitch.tv PRIVMSG #channel :$boop viewer2 extra', '$')
+
+#The default template commands from Streamer.state_schema, and a few that use conversions and format specs.
+VALID_TEMPLATES = [
+    "{message.user} boops {message.text_args[0]}'s snoot!",
+    "Check out {message.text_args[0]}'s stream! Here's a link: https://www.twitch.tv/{message.text_args[0]}",
+    '{message.user} will be getting a pizza in the mail in a few years.',
+    '{message.user} gives {message.text_args[0]} headpats!',
+    '{message.user!r} in {message.channel} said {message.text}, {message.text_command}: {message.text_args}',
+    '[{message.user:>12}] [{message.text_args[1]:.3}] {message.user!a:^20}',
+    'Braces {{like this}} stay literal.',
+]
+
+
+@pytest.mark.parametrize('template', VALID_TEMPLATES)
+def test_renders_the_same_as_str_format(template):
+    assert compile_template(template).render(MESSAGE) == template.format(message=MESSAGE)
+
+
+@pytest.mark.parametrize('template', [
+    '{message.__class__}',
+    '{message.__class__.__init__.__globals__}',
+    '{message.user.__class__}',
+    '{message.tags}',
+    '{message.raw_tags}',
+    '{message.prefix}',
+    '{message}',
+    '{0}',
+    '{user}',
+    '{message.text_args.__len__}',
+])
+def test_attribute_walks_and_unknown_fields_are_rejected(template):
+    with pytest.raises(TemplateError):
+        compile_template(template)
+
+
+@pytest.mark.parametrize('template', ['{message.user[0]}', '{message.text[0]}', '{message.channel[1]}', "{message.text_args[-1]}", '{message.text_args[x]}'])
+def test_only_text_args_can_be_indexed(template):
+    with pytest.raises(TemplateError):
+        compile_template(template)
+
+
+@pytest.mark.parametrize('template', ['{message.user:{message.text}}', '{message.user:>{message.text_args[0]}}'])
+def test_nested_format_specs_are_rejected(template):
+    with pytest.raises(TemplateError):
+        compile_template(template)
+
+
+@pytest.mark.parametrize('template', [f'{{message.user:>{MAX_FORMAT_WIDTH + 1}}}', '{message.user:.100000}', '{message.user:099999999}'])
+def test_oversized_widths_are_rejected(template):
+    with pytest.raises(TemplateError):
+        compile_template(template)
+
+
+@pytest.mark.parametrize('template', ['{message.user!x}', '{message.user:zz}', '{message.user', 'unmatched }'])
+def test_bad_conversions_and_syntax_are_rejected(template):
+    with pytest.raises(TemplateError):
+        compile_template(template)
+
+
+def test_widest_allowed_format_renders():
+    template = f'{{message.user:>{MAX_FORMAT_WIDTH}}}'
+    assert len(compile_template(template).render(MESSAGE)) == MAX_FORMAT_WIDTH
+
+
+def test_missing_arguments_are_rejected_before_rendering():
+    plan = compile_template('{message.user} boops {message.text_args[2]}')
+    assert plan.required_args == 3
+    with pytest.raises(TemplateError):
+        plan.render(MESSAGE)
+
+
+def test_static_template_is_cached():
+    plan = compile_template('No placeholders here.')
+    assert plan.static == 'No placeholders here.'
+    assert plan.render(MESSAGE) == 'No placeholders here.'
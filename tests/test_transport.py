@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from transport import IrcTransport
+
+
+#Makes a transport that reads from a StreamReader the test feeds, with the queues open() would make.
+def make_transport(max_incoming):
+    irc = IrcTransport('test', 0, max_incoming)
+    irc.loop = asyncio.get_running_loop()
+    irc.loop_thread = threading.get_ident()
+    irc.reader = asyncio.StreamReader()
+    irc.incoming = asyncio.Queue(irc.max_incoming)
+    irc.control = asyncio.Queue()
+    irc.outgoing = asyncio.PriorityQueue()
+    irc.is_open = True
+    return irc
+
+
+def test_full_incoming_queue_drops_chat_but_keeps_control_lines():
+    async def main():
+        irc = make_transport(3)
+        chat = b''.join(b':viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #channel :%d\r\n' % index for index in range(6))
+        irc.reader.feed_data(chat + b'PING :tmi.twitch.tv\r\n')
+        irc.reader.feed_eof()
+        try:
+            await irc.read_loop()
+        except ConnectionError:
+            pass
+        return irc
+
+    irc = asyncio.run(main())
+    assert irc.incoming.qsize() == 3
+    assert irc.dropped == 3
+    assert irc.control.get_nowait() == b'PING :tmi.twitch.tv'
+    #The oldest lines are the ones kept.
+    assert irc.incoming.get_nowait().endswith(b':0')
@@ -0,0 +1,32 @@
+import chat4j_queries
+from viewer import Viewer
+
+
+def make_viewer(name):
+    queries = chat4j_queries.create_queries()
+    queries.Run_add_user('streamer')
+    queries.Run_onboard_viewers([name], 'streamer')
+    return Viewer(name, 'streamer')
+
+
+def test_points_change_is_saved_and_counted_once():
+    viewer = make_viewer('pointsviewer')
+    start = viewer.stats['points']
+    viewer.update_stat('points', 'add', 25)
+    assert viewer.stats['points'] == start + 25
+    #A viewer loaded again sees the change once, whether or not the ledger has flushed it.
+    assert Viewer('pointsviewer', 'streamer').stats['points'] == start + 25
+    chat4j_queries.get_points_ledger().flush()
+    assert Viewer('pointsviewer', 'streamer').stats['points'] == start + 25
+
+
+def test_points_are_not_changed_when_the_ledger_fails(monkeypatch):
+    viewer = make_viewer('failedviewer')
+    other = make_viewer('otherviewer')
+    start = viewer.stats['points']
+    ledger = chat4j_queries.get_points_ledger()
+    monkeypatch.setattr(ledger, 'record', lambda streamer, changes: False)
+    assert viewer.update_stat('points', 'subtract', 10) == False
+    assert viewer.transfer_points(other, 10) == False
+    assert viewer.stats['points'] == start
+    assert other.stats['points'] == start
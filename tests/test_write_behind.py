@@ -0,0 +1,101 @@
+from memory_queries import MemoryBotQueries
+from write_behind import FLUSH_ORDER, WriteBehindBatcher
+
+
+def make_queries(queries_class=MemoryBotQueries):
+    queries = queries_class()
+    queries.Run_add_user('streamer')
+    queries.Run_onboard_viewers(['viewer', 'friend'], 'streamer')
+    return queries
+
+
+#Memory queries that record the order the batches are written in.
+class RecordingQueries(MemoryBotQueries):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def Query_batch_increase_query_count(self, tx, rows):
+        self.batches.append('increase_query_count')
+        return super().Query_batch_increase_query_count(tx, rows)
+
+    def Query_batch_add_friendship(self, tx, rows):
+        self.batches.append('add_friendship')
+        return super().Query_batch_add_friendship(tx, rows)
+
+    def Query_batch_set_likes_genre(self, tx, rows):
+        self.batches.append('set_likes_genre')
+        return super().Query_batch_set_likes_genre(tx, rows)
+
+    def Query_batch_create_views(self, tx, rows):
+        self.batches.append('create_views')
+        return super().Query_batch_create_views(tx, rows)
+
+
+#Memory queries whose query count batches always fail.
+class FailingQueries(MemoryBotQueries):
+    def Query_batch_increase_query_count(self, tx, rows):
+        return False
+
+
+def test_writes_with_the_same_key_are_merged():
+    queries = make_queries()
+    start = queries.Run_get_stats('viewer', 'streamer')['query_count']
+    batcher = WriteBehindBatcher(queries)
+    for _ in range(3):
+        assert batcher.increase_query_count('viewer')
+    batcher.add_friendship('viewer', 'friend')
+    batcher.add_friendship('viewer', 'friend')
+    #The same users in the other direction are a different relationship.
+    batcher.add_friendship('friend', 'viewer')
+    assert batcher.get_pending() == 3
+    counters = batcher.get_counters()
+    assert counters['queued'] == 3
+    assert counters['merged'] == 3
+    batcher.flush()
+    #The merged counts are added together, so no increase is lost.
+    assert queries.Run_get_stats('viewer', 'streamer')['query_count'] == start + 3
+    assert batcher.get_counters()['written'] == 3
+    assert batcher.get_pending() == 0
+
+
+def test_batches_are_written_in_flush_order():
+    queries = make_queries(RecordingQueries)
+    batcher = WriteBehindBatcher(queries)
+    #Queued in the opposite order to FLUSH_ORDER.
+    batcher.set_likes_genre('viewer', 'rock')
+    batcher.add_friendship('viewer', 'friend')
+    batcher.increase_query_count('viewer')
+    batcher.create_views('viewer', 'friend')
+    batcher.flush()
+    assert queries.batches == list(FLUSH_ORDER)
+    assert batcher.get_counters()['batches'] == len(FLUSH_ORDER)
+
+
+def test_failed_batches_are_retried_then_dropped():
+    queries = make_queries(FailingQueries)
+    batcher = WriteBehindBatcher(queries, max_retries=2)
+    batcher.increase_query_count('viewer')
+    batcher.add_friendship('viewer', 'friend')
+    batcher.flush()
+    #The friendship is written, and the failed count is queued again.
+    assert batcher.get_pending() == 1
+    assert batcher.get_counters()['retried'] == 1
+    batcher.flush()
+    assert batcher.get_pending() == 1
+    batcher.flush()
+    counters = batcher.get_counters()
+    assert counters['pending'] == 0
+    assert counters['retried'] == 2
+    assert counters['dropped'] == 1
+    assert counters['written'] == 1
+
+
+def test_writes_are_dropped_when_the_queue_is_full():
+    batcher = WriteBehindBatcher(make_queries(), max_pending=2)
+    assert batcher.increase_query_count('viewer')
+    assert batcher.increase_query_count('friend')
+    assert batcher.increase_query_count('streamer') == False
+    #A write that merges into a queued one still fits.
+    assert batcher.increase_query_count('viewer')
+    assert batcher.get_counters()['dropped'] == 1
@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import ssl
+import threading
+import time
+from log import bot_function_logger
+from framing import LineFramer
+from irc_parser import get_command
+from metrics import metrics
+
+#Messages from the server that keep the connection working. They go on the control queue instead of the incoming queue, so they are never stuck behind chat.
+CONTROL_COMMANDS = frozenset((b'PING', b'PONG', b'RECONNECT', b'CAP'))
+
+#Lanes for outgoing lines. Control lines such as PONG, JOIN, and CAP are written before any waiting chat message.
+PRIORITY_LANE = 0
+CHAT_LANE = 1
+
+#Asyncio transport for the twitch IRC connection. Reading and sending run as their own coroutines so a slow handler never stops intake.
+class IrcTransport:
+    #Sets the server information. The connection itself is opened with open(). At most max_incoming lines wait on the incoming queue.
+    def __init__(self, server, port, max_incoming=1000):
+        self.logger = bot_function_logger
+        self.server = server
+        self.port = port
+        self.max_incoming = max_incoming
+        self.dropped = 0
+        self.reader = None
+        self.writer = None
+        self.loop = None
+        self.loop_thread = None
+        self.incoming = None
+        self.control = None
+        self.outgoing = None
+        self.sequence = itertools.count()
+        self.framer = LineFramer(encoding=None)
+        self.is_open = False
+        self.last_received = 0.0
+        self.ping_received_at = None
+        self.ping_sent_at = None
+
+    #Opens the TLS connection to the server. The queues are created on the first open and kept when the connection is opened again, so the bot's loops keep working across a reconnect.
+    async def open(self):
+        self.logger.info('Opening connection to %s:%s', self.server, self.port)
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        context = ssl.create_default_context()
+        self.reader, self.writer = await asyncio.open_connection(self.server, self.port, ssl=context)
+        if self.incoming is None:
+            self.incoming = asyncio.Queue(self.max_incoming)
+            self.control = asyncio.Queue()
+            self.outgoing = asyncio.PriorityQueue()
+        else:
+            self.drop_priority_lines()
+        #A partial line from the old connection cannot be finished by the new one.
+        self.framer = LineFramer(encoding=None)
+        self.last_received = time.monotonic()
+        self.ping_received_at = None
+        self.ping_sent_at = None
+        self.is_open = True
+        self.logger.info('Connection opened.')
+
+    #Drops the control lines left from the old connection, such as a PONG or JOIN, since the bot logs in again. Chat messages are kept.
+    def drop_priority_lines(self):
+        kept = []
+        while not self.outgoing.empty():
+            item = self.outgoing.get_nowait()
+            if item[0] != PRIORITY_LANE:
+                kept.append(item)
+        for item in kept:
+            self.outgoing.put_nowait(item)
+
+    #Queues a line to be sent to the server. This can be called from the event loop or from a worker thread.
+    def send(self, line, lane=CHAT_LANE):
+        #The sequence number keeps lines in the same lane in the order they were sent.
+        item = (lane, next(self.sequence), line)
+        if threading.get_ident() == self.loop_thread:
+            self.outgoing.put_nowait(item)
+        else:
+            self.loop.call_soon_threadsafe(self.outgoing.put_nowait, item)
+
+    #Queues a control line, which is written before any waiting chat message.
+    def send_priority(self, line):
+        self.send(line, PRIORITY_LANE)
+
+    #Reads from the server and puts every complete line on the incoming or control queue as bytes. Decoding is left to the parser.
+    #When the incoming queue is full, lines for it are dropped instead of waiting, so control lines such as PING are still read while the handlers catch up.
+    async def read_loop(self):
+        while self.is_open:
+            data = await self.reader.read(4096)
+            #An empty read means the server closed the connection.
+            if not data:
+                self.logger.critical('Connection closed by server.')
+                self.is_open = False
+                raise ConnectionError('Connection closed by server.')
+            now = time.monotonic()
+            self.last_received = now
+            overflows = self.framer.overflows
+            dropped = self.dropped
+            for received_msg in self.framer.feed(data):
+                command = get_command(received_msg)
+                if command not in CONTROL_COMMANDS:
+                    try:
+                        self.incoming.put_nowait(received_msg)
+                    except asyncio.QueueFull:
+                        self.dropped += 1
+                    continue
+                if command == b'PING':
+                    self.ping_received_at = now
+                elif command == b'PONG' and self.ping_sent_at is not None:
+                    metrics.observe('keepalive.rtt', now - self.ping_sent_at)
+                    self.ping_sent_at = None
+                self.control.put_nowait(received_msg)
+            if self.framer.overflows != overflows:
+                self.logger.warning('Dropped a line longer than the line length limit.')
+            if self.dropped != dropped:
+                self.logger.warning('Incoming queue is full. Dropped %s lines.', self.dropped - dropped)
+
+    #Sends every queued line to the server, control lines first.
+    async def write_loop(self):
+        while self.is_open:
+            lane, _, line = await self.outgoing.get()
+            self.writer.write((line + '\r\n').encode())
+            await self.writer.drain()
+            if lane == PRIORITY_LANE:
+                self.record_keepalive(line)
+
+    #Records how long the server waited for the PONG to its PING, and when the bot's own PING was sent.
+    def record_keepalive(self, line):
+        now = time.monotonic()
+        if line.startswith('PONG') and self.ping_received_at is not None:
+            metrics.observe('keepalive.pong', now - self.ping_received_at)
+            self.ping_received_at = None
+        elif line.startswith('PING'):
+            self.ping_sent_at = now
+
+    #Closes the connection.
+    async def close(self):
+        self.is_open = False
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception as e:
+                self.logger.error(e)
+        self.logger.info('Connection closed.')
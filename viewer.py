@@ -1,17 +1,64 @@
 import chat4j_queries
 from log import viewer_logger
+from hydration import NOT_LOADED, hydrate
 
-#Class for the Viewer object.
+#Class for the Viewer object. Viewers are kept in the ViewerRegistry, so the class uses __slots__ and shares one query driver and logger between every Viewer.
+#Stats, friends, and liked genres are loaded the first time they are used, so creating a Viewer costs no database work.
 class Viewer:
-    #Initialize the Viewer and all required variables.
+    __slots__ = ('username', 'streamer', '_stats', '_friends_list', '_liked_genres', 'is_online', 'registry')
+    logger = viewer_logger
+    shared_query_driver = None
+
+    #Initialize the Viewer and all required variables. The registry is set when the Viewer is added to one.
     def __init__(self, username, streamer):
-        self.QueryDriver = chat4j_queries.BotQueries()
-        self.logger = viewer_logger
         self.username = str(username)
-        self.stats = self.QueryDriver.Run_get_stats(self.username, streamer)
-        self.friends_list = self.QueryDriver.Run_get_friends(username)
-        self.liked_genres = self.QueryDriver.Run_get_liked_genres(username)
+        self.streamer = streamer
+        self._stats = NOT_LOADED
+        self._friends_list = NOT_LOADED
+        self._liked_genres = NOT_LOADED
         self.is_online = True
+        self.registry = None
+
+    #Gets the query driver shared by every Viewer.
+    @property
+    def QueryDriver(self):
+        if Viewer.shared_query_driver is None:
+            Viewer.shared_query_driver = chat4j_queries.create_queries()
+        return Viewer.shared_query_driver
+
+    #Lazily loaded state. Each one is loaded the first time it is used, and concurrent first uses share one query.
+    @property
+    def stats(self):
+        return self.hydrate('_stats', ('stats', self.username, self.streamer), self.load_stats)
+
+    @property
+    def friends_list(self):
+        return self.hydrate('_friends_list', ('friends', self.username), lambda: self.QueryDriver.Run_get_friends(self.username))
+
+    @property
+    def liked_genres(self):
+        return self.hydrate('_liked_genres', ('liked_genres', self.username), lambda: self.QueryDriver.Run_get_liked_genres(self.username))
+
+    #Loads an attribute the first time it is used, and has the registry measure the Viewer again once it has.
+    def hydrate(self, attribute, key, loader):
+        if getattr(self, attribute) is not NOT_LOADED:
+            return getattr(self, attribute)
+        value = hydrate(self, attribute, key, loader)
+        self.resize()
+        return value
+
+    #Has the registry measure the Viewer again after its loaded state changed size.
+    def resize(self):
+        if self.registry is not None:
+            self.registry.resize(self.username)
+
+    #Loads the stats. Points changes still waiting in the points ledger are added, since the database does not have them yet.
+    def load_stats(self):
+        return chat4j_queries.get_points_ledger().load_stats(lambda: self.QueryDriver.Run_get_stats(self.username, self.streamer), self.username, self.streamer)
+
+    #Gets the state that has already been loaded, without loading anything. Used to measure the Viewer.
+    def get_loaded_state(self):
+        return [value for value in (self._stats, self._friends_list, self._liked_genres) if value is not NOT_LOADED]
 
     #getters
     #get the username.
@@ -61,27 +108,43 @@ class Viewer:
     def update_stat(self, stat, operator=None, value=None):
         if stat == 'query_count':
             self.QueryDriver.Run_increase_query_count(self.username)
-            self.stats['query_count'] += 1
-            self.logger.info('Query_count for {user} updated to {query_count}.'.format(user = self.username, query_count=self.stats['query_count']))
+            #If the stats have not been loaded, there is nothing to update. They will include the new count when they are loaded.
+            if self._stats:
+                self._stats['query_count'] += 1
+                self.logger.info('Query_count for %s updated to %s.', self.username, self._stats['query_count'])
         elif stat == 'created_on':
             self.logger.error('Cannot change created_on date.')
             return False
         elif stat == 'points':
-            self.QueryDriver.Run_increase_query_count(self.username)
+            #Points are changed in memory and recorded in the points ledger, which saves them to the database.
             if operator == 'add':
-                self.stats['points'] += value
-                self.logger.info('Points for {user} updated to {points}.'.format(user = self.username, query_count=self.stats['points']))
+                delta = value
             elif operator == 'subtract':
-                self.stats['points'] -= value
-                self.logger.info('Points for {user} updated to {points}.'.format(user = self.username, query_count=self.stats['points']))
+                delta = -value
             else:
                 self.logger.error('Points can only be added or removed.')
                 return False
+            #The stats are loaded before the change is recorded, since loading adds the changes the ledger has not saved yet.
+            stats = self.stats
+            #Memory is only changed once the ledger has the change, so the balance never shows points that were not saved.
+            if chat4j_queries.get_points_ledger().add(self.username, self.streamer, delta) == False:
+                return False
+            stats['points'] += delta
+            self.logger.info('Points for %s updated to %s.', self.username, stats['points'])
+
+    #Moves points from this viewer to another viewer. Both changes are recorded together, so one is never saved without the other.
+    def transfer_points(self, other, points):
+        stats, other_stats = self.stats, other.stats
+        if chat4j_queries.get_points_ledger().transfer(self.username, other.username, self.streamer, points) == False:
+            return False
+        stats['points'] -= points
+        other_stats['points'] += points
+        self.logger.info('%s gave %s points to %s.', self.username, points, other.username)
 
     #Add a user to the friend list.
     def update_friends_list(self, new_friend):
         if new_friend in self.friends_list:
-            self.logger.warning(f"{new_friend} is already on {self.username}'s friend list. Ignoring")
+            self.logger.warning("%s is already on %s's friend list. Ignoring", new_friend, self.username)
             return False
         else:
             try:
@@ -89,21 +152,23 @@ class Viewer:
                 if query == False:
                     raise ValueError('Runn function returned false.')
                 self.update_stat('query_count')
-                self.logger.info(f"{new_friend} added to friend list for {self.username}")
+                self.logger.info('%s added to friend list for %s', new_friend, self.username)
                 self.friends_list.append(new_friend)
+                self.resize()
             except Exception as e:
                 self.logger.error(e)
-                self.logger.debug(f'Argument used: {new_friend}')
+                self.logger.debug('Argument used: %s', new_friend)
                 return False
 
     #Add a genre to the liked genre list.
     def update_liked_genres(self, new_genre):
         if new_genre in self.liked_genres:
-            self.logger.warning(f'{new_genre} is already in liked genres. Ignnoring.')
+            self.logger.warning('%s is already in liked genres. Ignnoring.', new_genre)
             return False
         else:
             self.QueryDriver.Run_set_likes_genre(self.username, new_genre)
             self.update_stat('query_count')
-            self.logger.info(f"{new_genre} added to liked genres for {self.username}")
+            self.logger.info('%s added to liked genres for %s', new_genre, self.username)
             self.liked_genres.append(new_genre)
+            self.resize()
 
@@ -0,0 +1,148 @@
+import atexit
+import threading
+import time
+from log import query_logger
+
+#The order the write types are flushed in. Views are written before the counts and relationships that may depend on them.
+FLUSH_ORDER = ('create_views', 'increase_query_count', 'add_friendship', 'set_likes_genre')
+
+#Collects single-row writes, merges them by type, and flushes them as one UNWIND transaction per type.
+#Writes are flushed every flush_interval_ms, or sooner once max_items are waiting. A background thread does the flushing.
+class WriteBehindBatcher:
+    def __init__(self, queries, flush_interval_ms=250, max_items=500, max_retries=3, max_pending=10000):
+        self.logger = query_logger
+        self.queries = queries
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_items = max_items
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+        self.pending = {kind: {} for kind in FLUSH_ORDER}
+        self.pending_count = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.counters = {'queued': 0, 'merged': 0, 'written': 0, 'batches': 0, 'retried': 0, 'dropped': 0}
+
+    #Starts the flush thread, and makes sure pending writes are flushed when the process exits.
+    def start(self):
+        self.thread = threading.Thread(target=self.flush_loop, name='write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    #Queues a write. Writes with the same kind and key are merged into one row. Returns False if the write was dropped.
+    def add(self, kind, key, row, attempts=0):
+        with self.lock:
+            rows = self.pending[kind]
+            if key in rows:
+                existing = rows[key]
+                #Counts are added together. For every other write, the newest row replaces the older one.
+                if 'count' in row:
+                    existing[0]['count'] += row['count']
+                else:
+                    existing[0] = row
+                self.counters['merged'] += 1
+                return True
+            if self.pending_count >= self.max_pending:
+                self.counters['dropped'] += 1
+                self.logger.warning('Write-behind queue full. Dropped %s write for %s.', kind, key)
+                return False
+            rows[key] = [row, attempts]
+            self.pending_count += 1
+            self.counters['queued'] += 1
+            if self.pending_count >= self.max_items:
+                self.wakeup.set()
+        return True
+
+    #Queues a query count increase for a user.
+    def increase_query_count(self, username):
+        return self.add('increase_query_count', username, {'username': username, 'count': 1})
+
+    #Queues an :IS_FRIENDS relationship from user1 to user2.
+    def add_friendship(self, username1, username2):
+        return self.add('add_friendship', (username1, username2), {'username1': username1, 'username2': username2})
+
+    #Queues a :LIKES_GENRE relationship from the user to the genre.
+    def set_likes_genre(self, username, genre):
+        return self.add('set_likes_genre', (username, genre), {'username': username, 'genre': genre})
+
+    #Queues a :VIEWS relationship from user1 to user2.
+    def create_views(self, username1, username2):
+        return self.add('create_views', (username1, username2), {'username1': username1, 'username2': username2})
+
+    #Gets the number of writes waiting to be flushed.
+    def get_pending(self):
+        with self.lock:
+            return self.pending_count
+
+    #Gets a copy of the counters.
+    def get_counters(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters['pending'] = self.pending_count
+            return counters
+
+    #Flushes every pending write. Batches that fail are queued again until they run out of retries.
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batches = self.pending
+                self.pending = {kind: {} for kind in FLUSH_ORDER}
+                self.pending_count = 0
+            for kind in FLUSH_ORDER:
+                entries = list(batches[kind].items())
+                if not entries:
+                    continue
+                rows = [row for _, (row, _) in entries]
+                try:
+                    with self.queries.open_session() as session:
+                        result = session.execute_write(getattr(self.queries, f'Query_batch_{kind}'), rows)
+                    #Query functions return False when the query fails.
+                    if result == False:
+                        raise ValueError(f'Batch {kind} query returned false.')
+                    with self.lock:
+                        self.counters['written'] += len(rows)
+                        self.counters['batches'] += 1
+                    #Drop the cached reads this batch changed.
+                    self.queries.invalidate_cache(kind)
+                except Exception as e:
+                    self.logger.error(e)
+                    self.retry(kind, entries)
+
+    #Queues the entries of a failed batch again, or drops the ones that are out of retries.
+    def retry(self, kind, entries):
+        for key, (row, attempts) in entries:
+            if attempts + 1 > self.max_retries:
+                with self.lock:
+                    self.counters['dropped'] += 1
+                self.logger.error('Dropped %s write for %s after %s attempts.', kind, key, attempts + 1)
+                continue
+            with self.lock:
+                self.counters['retried'] += 1
+            self.add(kind, key, row, attempts + 1)
+
+    #Flushes on the interval, or early when enough writes are waiting.
+    def flush_loop(self):
+        while not self.stopped:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(e)
+
+    #Stops the flush thread and flushes everything still pending. Safe to call more than once.
+    def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        #Keep flushing until the queue is empty or every write has run out of retries.
+        while self.get_pending():
+            self.flush()
+            if self.get_pending():
+                time.sleep(self.flush_interval)
+        self.logger.info('Write-behind queue closed. Counters: %s', self.get_counters())